@@ -1,9 +1,28 @@
 from django.contrib import admin
-from .models import Airplane, Seat
+from .models import Airplane, CabinLayout, CabinZone, Seat
+from .services.airplane_service import apply_cabin_layout_change, bump_layout_version
+
+
+class CabinZoneInline(admin.TabularInline):
+    model = CabinZone
+    extra = 1
+
+
+@admin.register(CabinLayout)
+class CabinLayoutAdmin(admin.ModelAdmin):
+    list_display = ('name', 'rows', 'columns', 'version')
+    readonly_fields = ('version',)
+    inlines = [CabinZoneInline]
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Las zonas se guardan acá: recién ahora la cabina está completa
+        if change:
+            apply_cabin_layout_change(form.instance)
 
 @admin.register(Airplane)
 class AirplaneAdmin(admin.ModelAdmin):
-    list_display = ('model', 'rows', 'columns')
+    list_display = ('model', 'rows', 'columns', 'cabin_layout')
     
     def has_delete_permission(self, request, obj=None):
         return False
@@ -12,6 +31,11 @@ class AirplaneAdmin(admin.ModelAdmin):
 class SeatAdmin(admin.ModelAdmin):
     list_display = ('number', 'airplane', 'row', 'column', 'type', 'status')
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # La grilla cacheada del avión (layout y HTML) depende de sus asientos
+        bump_layout_version(obj.airplane)
+
     def has_delete_permission(self, request, obj=None):
         return False
 
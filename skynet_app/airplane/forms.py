@@ -4,4 +4,4 @@ from .models import Airplane
 class AirplaneForm(forms.ModelForm):
     class Meta:
         model = Airplane
-        fields = ['model', 'rows', 'columns']
\ No newline at end of file
+        fields = ['model', 'rows', 'columns', 'cabin_layout']
\ No newline at end of file
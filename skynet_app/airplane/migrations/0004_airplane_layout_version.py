@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("airplane", "0003_remove_airplane_capacity"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="airplane",
+            name="layout_version",
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airplane', '0004_airplane_layout_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CabinLayout',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('rows', models.PositiveIntegerField()),
+                ('columns', models.PositiveIntegerField()),
+                ('aisles', models.JSONField(blank=True, default=list)),
+                ('blocked', models.JSONField(blank=True, default=list)),
+                ('version', models.PositiveIntegerField(default=1)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='airplane',
+            name='cabin_layout',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='airplanes', to='airplane.cabinlayout'),
+        ),
+        migrations.CreateModel(
+            name='CabinZone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seat_class', models.CharField(choices=[('economy', 'Economy'), ('premium_economy', 'Premium Economy'), ('business', 'Business'), ('first', 'First')], default='economy', max_length=20)),
+                ('first_row', models.PositiveIntegerField()),
+                ('last_row', models.PositiveIntegerField()),
+                ('price_multiplier', models.DecimalField(decimal_places=2, default=1, max_digits=4)),
+                ('layout', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='zones', to='airplane.cabinlayout')),
+            ],
+            options={
+                'ordering': ['first_row'],
+            },
+        ),
+    ]
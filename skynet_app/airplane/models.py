@@ -1,16 +1,70 @@
 from django.db import models
 
+
+class CabinLayout(models.Model):
+    """Configuración de cabina compartida por muchos aviones: grilla, pasillos,
+    asientos bloqueados y zonas de clase (ver CabinZone)."""
+    name = models.CharField(max_length=100, unique=True)
+    rows = models.PositiveIntegerField()
+    columns = models.PositiveIntegerField()
+    # Columnas (1, 2, ...) después de las cuales hay un pasillo, ej. [3] para un 3-3
+    aisles = models.JSONField(default=list, blank=True)
+    # Números de asiento que no se venden, ej. ["1A", "1F"]
+    blocked = models.JSONField(default=list, blank=True)
+    # Se incrementa en cada cambio (invalida la geometría y las grillas cacheadas)
+    version = models.PositiveIntegerField(default=1)
+
+    def __str__(self):
+        return self.name
+
+
+class CabinZone(models.Model):
+    SEAT_CLASSES = [
+        ('economy', 'Economy'),
+        ('premium_economy', 'Premium Economy'),
+        ('business', 'Business'),
+        ('first', 'First'),
+    ]
+
+    layout = models.ForeignKey(CabinLayout, on_delete=models.CASCADE, related_name='zones')
+    seat_class = models.CharField(max_length=20, choices=SEAT_CLASSES, default='economy')
+    first_row = models.PositiveIntegerField()
+    last_row = models.PositiveIntegerField()
+    # Se aplica sobre el base_price del vuelo
+    price_multiplier = models.DecimalField(max_digits=4, decimal_places=2, default=1)
+
+    class Meta:
+        ordering = ['first_row']
+
+    def __str__(self):
+        return f"{self.get_seat_class_display()} ({self.first_row}-{self.last_row})"
+
+
 class Airplane(models.Model):
     model = models.CharField(max_length=100)
     rows = models.IntegerField()
     columns = models.IntegerField()
     enabled = models.BooleanField(default=True)
+    # Se incrementa cada vez que se regenera la grilla de asientos (invalida el layout cacheado)
+    layout_version = models.PositiveIntegerField(default=1)
+    # Opcional: con cabina compartida, rows/columns salen de ella y los asientos se crean al asignarle un vuelo
+    cabin_layout = models.ForeignKey(CabinLayout, on_delete=models.PROTECT, related_name='airplanes',
+                                     null=True, blank=True)
 
     def __str__(self):
         return f"{self.model} "
 
 
+class SeatQuerySet(models.QuerySet):
+    def active(self):
+        # Los asientos retirados quedan solo para no desprender segmentos ya vendidos
+        return self.exclude(status=Seat.RETIRED)
+
+
 class Seat(models.Model):
+    # Posición que salió de la grilla pero tiene segmentos: no se borra ni se ofrece
+    RETIRED = "retired"
+
     airplane = models.ForeignKey(Airplane, on_delete=models.CASCADE, related_name='seats')
     number = models.CharField(max_length=10)
     row = models.IntegerField()
@@ -18,5 +72,7 @@ class Seat(models.Model):
     type = models.CharField(max_length=50, blank=True, null=True)
     status = models.CharField(max_length=50, blank=True, null=True)
 
+    objects = SeatQuerySet.as_manager()
+
     def __str__(self):
         return f"Seat {self.number} - Airplane {self.airplane.model}"
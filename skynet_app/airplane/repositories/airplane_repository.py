@@ -2,11 +2,12 @@ from ..models import Airplane
 from django.shortcuts import get_object_or_404
 from ..models import Seat
 
-def create_airplane(model, rows, columns):
+def create_airplane(model, rows, columns, cabin_layout=None):
     return Airplane.objects.create(
         model=model,
         rows=rows,
-        columns=columns
+        columns=columns,
+        cabin_layout=cabin_layout
     )
 
 def get_all_airplanes():
@@ -20,11 +21,12 @@ def delete_airplane(airplane):
     airplane.save()
 
 def get_seats_by_airplane(airplane_id):
-    return Seat.objects.filter(airplane_id=airplane_id)
+    return Seat.objects.active().filter(airplane_id=airplane_id)
 
 def update_airplane(airplane, data):
     airplane.model = data['model']
     airplane.rows = data['rows']
     airplane.columns = data['columns']
+    airplane.cabin_layout = data.get('cabin_layout')
     airplane.save()
     return airplane
\ No newline at end of file
@@ -1,35 +1,109 @@
 from ..repositories import airplane_repository
 from django.core.exceptions import ValidationError
 
-from airplane.models import Seat
+from django.db import transaction
+from django.db.models import F
+
+from airplane.models import Airplane, CabinLayout, Seat
+from airplane.services.cabin_layout import get_cabin_geometry
+from reservations.models import FlightSegment
+from reservations.services.inventory import FlightInventoryService
 from django.core.exceptions import ValidationError
 from ..repositories import airplane_repository
 
 def create_airplane_service(data):
     model = data['model']
-    rows = data['rows']
-    columns = data['columns']
+    cabin_layout = data.get('cabin_layout')
+    rows, columns = _dimensions(data, cabin_layout)
 
     if rows <= 0 or columns <= 0:
         raise ValidationError("Rows and columns must be positive integers.")
 
-    # Crear el avión
-    airplane = airplane_repository.create_airplane(model, rows, columns)
+    with transaction.atomic():
+        # Crear el avión
+        airplane = airplane_repository.create_airplane(model, rows, columns, cabin_layout)
 
-    # Crear los asientos
-    for row in range(1, rows + 1):
-        for col in range(1, columns + 1):
-            column_letter = chr(64 + col)  # A, B, C...
-            Seat.objects.create(
-                airplane=airplane,
-                number=f"{row}{column_letter}",
-                row=row,
-                column=column_letter
-            )
+        # Crear los asientos en un solo INSERT; con cabina compartida se crean al asignarle un vuelo
+        if cabin_layout is None:
+            Seat.objects.bulk_create([_new_seat(airplane, *position) for position in _seat_positions(airplane)])
 
     return airplane
 
 
+def _dimensions(data, cabin_layout):
+    # Con cabina compartida la grilla la define el layout
+    if cabin_layout is not None:
+        return cabin_layout.rows, cabin_layout.columns
+    return data['rows'], data['columns']
+
+
+def _seat_positions(airplane):
+    """(fila, letra, clase) de cada asiento vendible, en orden de lectura."""
+    if airplane.cabin_layout_id:
+        return get_cabin_geometry(airplane.cabin_layout).seats()
+    return [(row, chr(64 + col), None)  # A = 65
+            for row in range(1, airplane.rows + 1) for col in range(1, airplane.columns + 1)]
+
+
+def _new_seat(airplane, row, letter, seat_class=None):
+    return Seat(airplane=airplane, number=f"{row}{letter}", row=row, column=letter, type=seat_class)
+
+
+def sync_airplane_seats(airplane):
+    """Reconcilia los asientos con la grilla del avión (o su cabina) sin reescribirla:
+    los que siguen conservan su id, las posiciones nuevas se insertan en bloque y las que salen
+    se borran (o quedan retiradas si tienen segmentos). Devuelve True si la grilla cambió."""
+    with transaction.atomic():
+        # Avión y asientos bloqueados hasta el commit: dos reconciliaciones no se pisan y un segmento
+        # nuevo (su FK bloquea el asiento) no puede colarse entre leer los reservados y borrar
+        Airplane.objects.select_for_update().only("id").get(pk=airplane.pk)
+        existing = {(seat.row, seat.column): seat
+                    for seat in (Seat.objects.select_for_update().filter(airplane=airplane)
+                                 .only("id", "row", "column", "type", "status"))}
+        wanted = {(row, letter): seat_class for row, letter, seat_class in _seat_positions(airplane)}
+
+        to_create = [_new_seat(airplane, row, letter, seat_class)
+                     for (row, letter), seat_class in wanted.items() if (row, letter) not in existing]
+        to_restore = [seat.id for pos, seat in existing.items() if pos in wanted and seat.status == Seat.RETIRED]
+        removed = [seat.id for pos, seat in existing.items() if pos not in wanted and seat.status != Seat.RETIRED]
+
+        # Con cabina compartida la clase del asiento la define su zona
+        reclassified = []
+        if airplane.cabin_layout_id:
+            for pos, seat in existing.items():
+                if pos in wanted and seat.type != wanted[pos]:
+                    seat.type = wanted[pos]
+                    reclassified.append(seat)
+
+        # Un asiento con segmentos no se borra: el SET_NULL dejaría al pasajero sin asiento
+        booked = (set(FlightSegment.objects.filter(seat_id__in=removed).values_list("seat_id", flat=True))
+                  if removed else set())
+
+        if to_create:
+            Seat.objects.bulk_create(to_create)
+        if to_restore:
+            Seat.objects.filter(id__in=to_restore).update(status=None)
+        if reclassified:
+            Seat.objects.bulk_update(reclassified, ["type"])
+        if booked:
+            Seat.objects.filter(id__in=booked).update(status=Seat.RETIRED)
+        if len(booked) < len(removed):
+            Seat.objects.filter(id__in=[sid for sid in removed if sid not in booked]).delete()
+
+    return bool(to_create or to_restore or removed or reclassified)
+
+
+def ensure_airplane_seats(airplane):
+    """Crea los asientos de un avión con cabina compartida la primera vez que se lo asigna a un vuelo.
+    Las filas de Seat siguen siendo por avión (FlightSegment.seat es una FK); la cabina solo define
+    qué posiciones se crean y con qué clase."""
+    if not airplane.cabin_layout_id or Seat.objects.filter(airplane=airplane).exists():
+        return False
+    sync_airplane_seats(airplane)
+    bump_layout_version(airplane)
+    return True
+
+
 def get_all_airplanes_service():
     return airplane_repository.get_all_airplanes()
 
@@ -47,27 +121,50 @@ def get_airplane(airplane_id):
 def update_airplane_service(airplane_id, data):
     airplane = airplane_repository.get_airplane_by_id(airplane_id)
 
-    if data['rows'] <= 0 or data['columns'] <= 0:
+    cabin_layout = data.get('cabin_layout', airplane.cabin_layout)
+    rows, columns = _dimensions(data, cabin_layout)
+
+    if rows <= 0 or columns <= 0:
         raise ValidationError("Rows and columns must be positive integers.")
 
-    # Actualizar datos del avión
-    airplane = airplane_repository.update_airplane(airplane, data)
+    with transaction.atomic():
+        # Actualizar datos del avión
+        airplane = airplane_repository.update_airplane(
+            airplane, {**data, 'rows': rows, 'columns': columns, 'cabin_layout': cabin_layout}
+        )
+
+        # Agregar/retirar solo las posiciones que cambiaron (una cabina compartida sin asientos todavía no se materializa)
+        changed = False
+        if cabin_layout is None or Seat.objects.filter(airplane=airplane).exists():
+            changed = sync_airplane_seats(airplane)
 
-    # Borrar los asientos existentes
-    Seat.objects.filter(airplane=airplane).delete()
+    if changed:
+        # La grilla cambió: los layouts cacheados de la versión anterior dejan de usarse
+        bump_layout_version(airplane)
 
-    # Crear nuevos asientos
-    for row in range(1, airplane.rows + 1):
-        for col in range(1, airplane.columns + 1):
-            column_letter = chr(64 + col)  # A = 65
-            Seat.objects.create(
-                airplane=airplane,
-                number=f"{row}{column_letter}",
-                row=row,
-                column=column_letter
-            )
+        # La capacidad de los vuelos de este avión cambió
+        FlightInventoryService.sync_capacity(airplane.flights.values_list("id", flat=True))
 
     return airplane
 
+def bump_layout_version(airplane):
+    """Invalida el layout y el HTML de la grilla cacheados (las claves incluyen la versión)."""
+    Airplane.objects.filter(pk=airplane.pk).update(layout_version=F("layout_version") + 1)
+    airplane.refresh_from_db(fields=["layout_version"])
+
+def apply_cabin_layout_change(cabin_layout):
+    """Tras editar una cabina compartida: nueva versión y reconciliación de los aviones que ya tienen asientos."""
+    CabinLayout.objects.filter(pk=cabin_layout.pk).update(version=F("version") + 1)
+    cabin_layout.refresh_from_db(fields=["version"])
+
+    airplanes = Airplane.objects.filter(cabin_layout=cabin_layout)
+    airplanes.update(rows=cabin_layout.rows, columns=cabin_layout.columns)
+    for airplane in airplanes.filter(seats__isnull=False).distinct().select_related("cabin_layout"):
+        with transaction.atomic():
+            changed = sync_airplane_seats(airplane)
+        if changed:
+            bump_layout_version(airplane)
+            FlightInventoryService.sync_capacity(airplane.flights.values_list("id", flat=True))
+
 def get_airplane_seats(airplane_id):
     return airplane_repository.get_seats_by_airplane(airplane_id)
\ No newline at end of file
@@ -0,0 +1,102 @@
+from decimal import Decimal
+from typing import Dict, Tuple
+
+from airplane.models import CabinZone
+from airplane.services.versioned_cache import VersionedCache
+
+LOCAL_CACHE_SIZE = 64
+DEFAULT_CLASS = "economy"
+
+
+class CabinGeometry:
+    """Forma compacta de una cabina: dimensiones, pasillos, bloqueados y zonas.
+    Es la misma para todos los aviones que comparten el CabinLayout."""
+
+    __slots__ = ("layout_id", "version", "rows", "columns", "aisles", "blocked", "zones", "row_zone")
+
+    def __init__(self, layout_id: int, version: int, rows: int, columns: int, aisles, blocked, zones):
+        """zones: iterable de (seat_class, first_row, last_row, price_multiplier)."""
+        self.layout_id = layout_id
+        self.version = version
+        self.rows = rows
+        self.columns = columns
+        self.aisles = tuple(sorted({int(col) for col in aisles}))
+        self.blocked = frozenset(str(number).strip().upper() for number in blocked)
+        self.zones = tuple((seat_class, first, last, Decimal(mult)) for seat_class, first, last, mult in zones)
+        self._index()
+
+    def _index(self):
+        # Clase y multiplicador por fila (si dos zonas se pisan, gana la primera)
+        self.row_zone: Dict[int, Tuple[str, Decimal]] = {}
+        for seat_class, first, last, mult in self.zones:
+            for row in range(first, min(last, self.rows) + 1):
+                self.row_zone.setdefault(row, (seat_class, mult))
+
+    def __getstate__(self):
+        return (self.layout_id, self.version, self.rows, self.columns, self.aisles, self.blocked, self.zones)
+
+    def __setstate__(self, state):
+        (self.layout_id, self.version, self.rows, self.columns,
+         self.aisles, self.blocked, self.zones) = state
+        self._index()
+
+    @staticmethod
+    def seat_number(row: int, column: int) -> str:
+        return f"{row}{chr(64 + column)}"  # A = 65
+
+    def seat_class(self, row: int) -> str:
+        return self.row_zone.get(row, (DEFAULT_CLASS, None))[0]
+
+    def price_multiplier(self, row: int) -> Decimal:
+        return self.row_zone.get(row, (None, Decimal(1)))[1]
+
+    def is_blocked(self, row: int, column: int) -> bool:
+        return self.seat_number(row, column) in self.blocked
+
+    def seats(self):
+        """(fila, letra, clase) de cada asiento vendible, en orden de lectura."""
+        return [(row, chr(64 + col), self.seat_class(row))
+                for row in range(1, self.rows + 1)
+                for col in range(1, self.columns + 1)
+                if not self.is_blocked(row, col)]
+
+    def grid(self):
+        """Filas para dibujar: un dict por asiento, más una celda {"aisle": True} en cada pasillo."""
+        rows = []
+        for row in range(1, self.rows + 1):
+            seat_class = self.seat_class(row)
+            cells = []
+            for col in range(1, self.columns + 1):
+                cells.append({
+                    "number": self.seat_number(row, col),
+                    "seat_class": seat_class,
+                    "blocked": self.is_blocked(row, col),
+                })
+                if col in self.aisles and col < self.columns:
+                    cells.append({"aisle": True})
+            rows.append(cells)
+        return rows
+
+    @classmethod
+    def build(cls, layout) -> "CabinGeometry":
+        zones = (CabinZone.objects
+                 .filter(layout_id=layout.id)
+                 .order_by("first_row", "id")
+                 .values_list("seat_class", "first_row", "last_row", "price_multiplier"))
+        return cls(layout.id, layout.version, layout.rows, layout.columns, layout.aisles, layout.blocked, zones)
+
+
+_geometries = VersionedCache("cabin_layout", LOCAL_CACHE_SIZE)
+
+
+def get_cabin_geometry(layout) -> CabinGeometry:
+    """Geometría del layout para su versión actual: memoria del proceso → cache compartido → base."""
+    return _geometries.get(layout.id, layout.version, lambda: CabinGeometry.build(layout))
+
+
+def seat_price(base_price, airplane, seat):
+    """Precio del asiento: base_price del vuelo × multiplicador de la zona de su fila."""
+    if base_price is None or not airplane.cabin_layout_id:
+        return base_price
+    multiplier = get_cabin_geometry(airplane.cabin_layout).price_multiplier(seat.row)
+    return (Decimal(base_price) * multiplier).quantize(Decimal("0.01"))
@@ -0,0 +1,76 @@
+from collections import OrderedDict
+from typing import Dict, Iterable
+
+from airplane.models import Seat
+from airplane.services.versioned_cache import VersionedCache
+
+LOCAL_CACHE_SIZE = 256
+
+
+class SeatLayout:
+    """Grilla inmutable de asientos de un avión (filas ordenadas, columnas y números).
+    No tiene estado por vuelo: cada pedido solo superpone el estado de los asientos.
+    Es por avión aunque comparta cabina: indexa ids de Seat, y los Seat son de cada avión porque
+    FlightSegment (y las retenciones) apuntan al asiento por id. Lo compartido por cabina es la
+    CabinGeometry (clases, pasillos, bloqueados, multiplicadores) y el esqueleto de seat_grid."""
+
+    __slots__ = ("airplane_id", "version", "rows", "cells", "seat_ids", "index")
+
+    def __init__(self, airplane_id: int, version: int, seats):
+        """seats: iterable de (id, row, column, number) ya ordenado por fila y columna."""
+        rows = OrderedDict()
+        for seat_id, row, column, number in seats:
+            rows.setdefault(row, []).append((seat_id, column, number))
+
+        self.airplane_id = airplane_id
+        self.version = version
+        # ((row, ((seat_id, col, num), ...)), ...)
+        self.rows = tuple((row, tuple(seats)) for row, seats in rows.items())
+        self._index()
+
+    def _index(self):
+        # Posición de cada asiento en la grilla (orden de lectura fila → columna)
+        self.cells = tuple((seat_id, row, col, num) for row, seats in self.rows for seat_id, col, num in seats)
+        self.seat_ids = tuple(cell[0] for cell in self.cells)
+        self.index: Dict[int, int] = {seat_id: pos for pos, seat_id in enumerate(self.seat_ids)}
+
+    def __len__(self):
+        return len(self.seat_ids)
+
+    def __getstate__(self):
+        return (self.airplane_id, self.version, self.rows)
+
+    def __setstate__(self, state):
+        self.airplane_id, self.version, self.rows = state
+        self._index()
+
+    @classmethod
+    def build(cls, airplane_id: int, version: int) -> "SeatLayout":
+        return cls.build_many({airplane_id: version})[airplane_id]
+
+    @classmethod
+    def build_many(cls, versions: Dict[int, int]) -> Dict[int, "SeatLayout"]:
+        """Layouts de varios aviones ({airplane_id: version}) con una sola query de Seat."""
+        seats = {airplane_id: [] for airplane_id in versions}
+        rows = (Seat.objects
+                .filter(airplane_id__in=list(versions))
+                .active()
+                .order_by("airplane_id", "row", "column", "id")
+                .values_list("airplane_id", "id", "row", "column", "number"))
+        for airplane_id, *seat in rows:
+            seats[airplane_id].append(seat)
+        return {airplane_id: cls(airplane_id, versions[airplane_id], seats[airplane_id]) for airplane_id in versions}
+
+
+_layouts = VersionedCache("seat_layout", LOCAL_CACHE_SIZE)
+
+
+def get_seat_layout(airplane) -> SeatLayout:
+    """Layout del avión para su layout_version actual: memoria del proceso → cache compartido → base."""
+    return get_seat_layouts([airplane])[airplane.id]
+
+
+def get_seat_layouts(airplanes: Iterable) -> Dict[int, SeatLayout]:
+    """{airplane_id: layout} para varios aviones; los que no estén cacheados salen de una sola query de Seat."""
+    return _layouts.get_many({airplane.id: airplane.layout_version for airplane in airplanes},
+                             SeatLayout.build_many)
@@ -0,0 +1,61 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict
+
+from django.core.cache import cache
+
+
+class VersionedCache:
+    """Cache en dos niveles para objetos inmutables identificados por (id, versión):
+    LRU en memoria del proceso → cache compartido → build.
+    La versión forma parte de la clave: al cambiar, las entradas viejas simplemente dejan de pedirse."""
+
+    def __init__(self, prefix: str, size: int):
+        self.prefix = prefix
+        self.size = size
+        self._lock = threading.Lock()
+        self._local: "OrderedDict[tuple, Any]" = OrderedDict()
+
+    def _cache_key(self, obj_id: int, version: int) -> str:
+        return f"{self.prefix}:{obj_id}:{version}"
+
+    def get(self, obj_id: int, version: int, build: Callable[[], Any]) -> Any:
+        return self.get_many({obj_id: version}, lambda versions: {obj_id: build()})[obj_id]
+
+    def get_many(self, versions: Dict[int, int], build_many: Callable[[Dict[int, int]], Dict[int, Any]]) -> Dict[int, Any]:
+        """{id: objeto} para {id: versión}: lo que falte en memoria se pide al cache compartido de una vez,
+        y lo que falte ahí se arma con una sola llamada a build_many({id: versión})."""
+        found = {}
+        with self._lock:
+            for obj_id, version in versions.items():
+                obj = self._local.get((obj_id, version))
+                if obj is not None:
+                    self._local.move_to_end((obj_id, version))
+                    found[obj_id] = obj
+
+        missing = {obj_id: version for obj_id, version in versions.items() if obj_id not in found}
+        if not missing:
+            return found
+
+        keys = {self._cache_key(obj_id, version): obj_id for obj_id, version in missing.items()}
+        shared = {keys[key]: obj for key, obj in cache.get_many(keys).items()}
+        found.update(shared)
+        to_build = {obj_id: version for obj_id, version in missing.items() if obj_id not in shared}
+        if to_build:
+            built = build_many(to_build)
+            cache.set_many({self._cache_key(obj_id, to_build[obj_id]): obj for obj_id, obj in built.items()},
+                           timeout=None)
+            found.update(built)
+
+        with self._lock:
+            for obj_id, version in missing.items():
+                self._local[(obj_id, version)] = found[obj_id]
+                self._local.move_to_end((obj_id, version))
+            while len(self._local) > self.size:
+                self._local.popitem(last=False)
+        return found
+
+    def clear(self) -> None:
+        """Vacía solo la memoria del proceso (el cache compartido se limpia con cache.clear())."""
+        with self._lock:
+            self._local.clear()
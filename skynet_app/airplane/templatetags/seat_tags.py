@@ -1,10 +1,66 @@
 from django import template
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from airplane.models import Seat
+from airplane.services.cabin_layout import get_cabin_geometry
+from airplane.services.versioned_cache import VersionedCache
 
 register = template.Library()
 
-@register.simple_tag
-def get_seat(seats, row, column):
+
+def _column_letter(column):
+    # Las vistas iteran columnas como números (1, 2, ...) y Seat.column guarda la letra
+    return chr(64 + column) if isinstance(column, int) else column
+
+
+def build_seat_grid(seats):
+    """{row: {column: seat}} armado en una sola pasada."""
+    grid = {}
     for seat in seats:
-        if seat.row == row and seat.column == column:
-            return seat
-    return None
\ No newline at end of file
+        grid.setdefault(seat.row, {})[seat.column] = seat
+    return grid
+
+
+_cabin_grids = VersionedCache("seat_grid:cabin", 64)
+_airplane_grids = VersionedCache("seat_grid", 256)
+
+
+def _airplane_rows(airplane):
+    grid = build_seat_grid(Seat.objects.active().filter(airplane=airplane))
+    rows = []
+    for row in range(1, airplane.rows + 1):
+        cells = []
+        for col in range(1, airplane.columns + 1):
+            seat = grid.get(row, {}).get(_column_letter(col))
+            cells.append({"number": seat.number, "seat_class": None, "blocked": False} if seat else None)
+        rows.append(cells)
+    return rows
+
+
+def _grid_skeleton(airplane):
+    """Filas de la grilla sin estado (número, clase, bloqueado, pasillos): solo dependen del layout,
+    así que se cachean por (avión, layout_version) o, con cabina compartida, por (cabina, versión)
+    para toda la flota."""
+    if airplane.cabin_layout_id:
+        geometry = get_cabin_geometry(airplane.cabin_layout)
+        return _cabin_grids.get(geometry.layout_id, geometry.version, geometry.grid)
+    return _airplane_grids.get(airplane.id, airplane.layout_version, lambda: _airplane_rows(airplane))
+
+
+@register.simple_tag
+def seat_grid(airplane):
+    """HTML de la grilla del avión: el esqueleto sale del cache y el estado de cada asiento
+    (Seat.status) se lee en cada render, una sola query por avión."""
+    statuses = dict(
+        Seat.objects.active()
+        .filter(airplane=airplane, status__isnull=False)
+        .exclude(status="")
+        .values_list("number", "status")
+    )
+    rows = [
+        [{**cell, "status": statuses.get(cell["number"])} if cell and not cell.get("aisle") else cell
+         for cell in row]
+        for row in _grid_skeleton(airplane)
+    ]
+    return mark_safe(render_to_string("airplane/seat_grid.html", {"rows": rows}))
@@ -1,3 +1,235 @@
+import pickle
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from airplane.models import Airplane, CabinLayout, CabinZone, Seat
+from airplane.services import cabin_layout, seat_layout
+from airplane.services.airplane_service import (
+    apply_cabin_layout_change, create_airplane_service, ensure_airplane_seats, sync_airplane_seats,
+    update_airplane_service,
+)
+from airplane.services.cabin_layout import get_cabin_geometry, seat_price
+from airplane.services.seat_layout import get_seat_layout, get_seat_layouts
+from airplane.services.versioned_cache import VersionedCache
+from airplane.templatetags import seat_tags
+from airplane.templatetags.seat_tags import seat_grid
+from flight.models import Airport, Flight, Route
+from reservations.models import FlightInventory, FlightSegment, Itinerary, Passenger
+
+
+class AirplaneCacheTestCase(TestCase):
+    """Cada test arranca sin layouts, geometrías ni grillas cacheadas (ni en el proceso ni compartidas)."""
+
+    def setUp(self):
+        cache.clear()
+        seat_layout._layouts.clear()
+        cabin_layout._geometries.clear()
+        seat_tags._cabin_grids.clear()
+        seat_tags._airplane_grids.clear()
+
+    def _flight(self, airplane):
+        origin = Airport.objects.create(name="AEP", code="AEP", city="AEP", country="AR")
+        destination = Airport.objects.create(name="COR", code="COR", city="COR", country="AR")
+        route = Route.objects.create(origin_airport=origin, destination_airport=destination, estimated_duration=75)
+        departure = timezone.now() + timedelta(days=30)
+        return Flight.objects.create(airplane=airplane, route=route, status="active", base_price=Decimal("100.00"),
+                                     departure_time=departure, arrival_time=departure + timedelta(minutes=75))
+
+
+class VersionedCacheTest(AirplaneCacheTestCase):
+    def test_builds_once_then_serves_from_process_then_shared_cache(self):
+        built = []
+
+        def build_many(versions):
+            built.append(dict(versions))
+            return {obj_id: f"{obj_id}@{version}" for obj_id, version in versions.items()}
+
+        versioned = VersionedCache("test", 8)
+        self.assertEqual(versioned.get_many({1: 1, 2: 1}, build_many), {1: "1@1", 2: "2@1"})
+        self.assertEqual(versioned.get_many({1: 1, 2: 1, 3: 1}, build_many), {1: "1@1", 2: "2@1", 3: "3@1"})
+        self.assertEqual(built, [{1: 1, 2: 1}, {3: 1}])
+
+        versioned.clear()  # otro proceso: el cache compartido ya tiene las entradas
+        self.assertEqual(versioned.get(2, 1, lambda: "rebuilt"), "2@1")
+        self.assertEqual(versioned.get(2, 2, lambda: "2@2"), "2@2")  # versión nueva, entrada nueva
+
+    def test_process_lru_is_bounded(self):
+        versioned = VersionedCache("test", 2)
+        for obj_id in (1, 2, 3):
+            versioned.get(obj_id, 1, lambda: obj_id)
+        self.assertEqual(list(versioned._local), [(2, 1), (3, 1)])
+
+
+class SeatLayoutCacheTest(AirplaneCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.airplane = Airplane.objects.get(pk=create_airplane_service({"model": "E190", "rows": 3, "columns": 2}).pk)
+
+    def test_layout_is_read_once_per_version(self):
+        layout = get_seat_layout(self.airplane)
+        self.assertEqual([num for _, _, _, num in layout.cells], ["1A", "1B", "2A", "2B", "3A", "3B"])
+        with self.assertNumQueries(0):
+            self.assertIs(get_seat_layouts([self.airplane])[self.airplane.id], layout)
+
+        seat_layout._layouts.clear()
+        with self.assertNumQueries(0):  # desde el cache compartido
+            self.assertEqual(get_seat_layout(self.airplane).index, layout.index)
+
+    def test_grid_change_bumps_the_version(self):
+        before = get_seat_layout(self.airplane)
+        update_airplane_service(self.airplane.pk, {"model": "E190", "rows": 2, "columns": 3})
+        airplane = Airplane.objects.get(pk=self.airplane.pk)
+        self.assertGreater(airplane.layout_version, before.version)
+        self.assertEqual([num for _, _, _, num in get_seat_layout(airplane).cells],
+                         ["1A", "1B", "1C", "2A", "2B", "2C"])
+
+    def test_layout_survives_pickling(self):
+        layout = get_seat_layout(self.airplane)
+        restored = pickle.loads(pickle.dumps(layout))
+        self.assertEqual((restored.rows, restored.index), (layout.rows, layout.index))
+
+
+class SeatGridRenderingTest(AirplaneCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.airplane = create_airplane_service({"model": "E190", "rows": 3, "columns": 2})
+
+    def _detail(self):
+        return self.client.get(f"/es/airplanes/{self.airplane.id}/").content.decode()
+
+    def test_grid_is_rendered_from_the_cached_skeleton(self):
+        self.assertEqual(self._detail().count("text-success"), 6)
+        with self.assertNumQueries(2):  # avión + estados de sus asientos
+            self._detail()
+
+        update_airplane_service(self.airplane.id, {"model": "E190", "rows": 4, "columns": 3})
+        self.assertEqual(self._detail().count("text-success"), 12)
+
+    def test_seat_status_is_applied_on_every_render(self):
+        self._detail()
+        Seat.objects.filter(airplane=self.airplane, number="1A").update(status="occupied")
+        Seat.objects.filter(airplane=self.airplane, number="2B").update(status="reserved")
+        html = self._detail()
+        self.assertEqual((html.count("text-danger"), html.count("text-warning"), html.count("text-success")), (1, 1, 4))
+
+    def test_shared_cabin_grid_shows_seat_status(self):
+        layout = CabinLayout.objects.create(name="A320", rows=2, columns=4, aisles=[2], blocked=["1A"])
+        airplanes = [create_airplane_service({"model": f"A320-{i}", "rows": 0, "columns": 0, "cabin_layout": layout})
+                     for i in range(2)]
+        ensure_airplane_seats(airplanes[0])
+        Seat.objects.filter(airplane=airplanes[0], number="1B").update(status="occupied")
+
+        first = seat_grid(Airplane.objects.get(pk=airplanes[0].pk))
+        second = seat_grid(Airplane.objects.get(pk=airplanes[1].pk))
+        self.assertEqual(first.count("text-danger"), 1)
+        self.assertEqual(second.count("text-danger"), 0)
+        self.assertEqual(first.count("px-2"), 2)  # un pasillo por fila
+        self.assertEqual(first.count("text-secondary"), 1)  # 1A bloqueado
+
+
+class SeatGenerationTest(AirplaneCacheTestCase):
+    def _seat_ids(self, airplane):
+        return dict(Seat.objects.filter(airplane=airplane).values_list("number", "id"))
+
+    def test_seats_are_inserted_in_bulk(self):
+        with CaptureQueriesContext(connection) as small:
+            create_airplane_service({"model": "S", "rows": 2, "columns": 2})
+        with CaptureQueriesContext(connection) as large:
+            airplane = create_airplane_service({"model": "L", "rows": 20, "columns": 2})
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+        self.assertEqual(Seat.objects.filter(airplane=airplane).count(), 40)
+
+    def test_grid_change_keeps_ids_and_retires_booked_seats(self):
+        airplane = create_airplane_service({"model": "E190", "rows": 3, "columns": 2})
+        flight = self._flight(airplane)
+        before = self._seat_ids(airplane)
+        passenger = Passenger.objects.create(name="Ana", document="30111222", email="ana@example.com")
+        itinerary = Itinerary.objects.create(passenger=passenger, reservation_code="GEN001")
+        segment = FlightSegment.objects.create(itinerary=itinerary, flight=flight, seat_id=before["3B"],
+                                               price=Decimal("100.00"), status="confirmed")
+
+        version = Airplane.objects.get(pk=airplane.pk).layout_version
+        update_airplane_service(airplane.id, {"model": "E190", "rows": 3, "columns": 2})
+        self.assertEqual(Airplane.objects.get(pk=airplane.pk).layout_version, version)
+
+        update_airplane_service(airplane.id, {"model": "E190", "rows": 2, "columns": 3})
+        after = self._seat_ids(airplane)
+        self.assertEqual({n: after[n] for n in ("1A", "1B", "2A", "2B")}, {n: before[n] for n in ("1A", "1B", "2A", "2B")})
+        self.assertNotIn("3A", after)
+        self.assertEqual(Seat.objects.get(id=before["3B"]).status, Seat.RETIRED)
+        segment.refresh_from_db()
+        self.assertEqual(segment.seat_id, before["3B"])
+        self.assertEqual(FlightInventory.objects.get(flight=flight).capacity, 6)
+        self.assertGreater(Airplane.objects.get(pk=airplane.pk).layout_version, version)
+
+        update_airplane_service(airplane.id, {"model": "E190", "rows": 3, "columns": 2})
+        self.assertIsNone(Seat.objects.get(id=before["3B"]).status)
+
+
+    def test_booked_seats_are_read_inside_the_locked_transaction(self):
+        airplane = create_airplane_service({"model": "E190", "rows": 3, "columns": 2})
+        Airplane.objects.filter(pk=airplane.pk).update(rows=2)
+        airplane.refresh_from_db()
+
+        with CaptureQueriesContext(connection) as ctx:
+            sync_airplane_seats(airplane)
+
+        sql = [q["sql"] for q in ctx.captured_queries]
+        booked = next(i for i, q in enumerate(sql) if "reservations_flightsegment" in q)
+        self.assertTrue(sql[0].startswith("SAVEPOINT"))
+        self.assertTrue(any("airplane_seat" in q for q in sql[:booked]))  # asientos leídos (y bloqueados) antes
+        self.assertTrue(sql[-1].startswith("RELEASE SAVEPOINT"))
+        self.assertEqual(Seat.objects.filter(airplane=airplane).count(), 4)
+
+
+class SharedCabinLayoutTest(AirplaneCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.layout = CabinLayout.objects.create(name="A320", rows=4, columns=4, aisles=[2], blocked=["1A"])
+        CabinZone.objects.create(layout=self.layout, seat_class="business", first_row=1, last_row=1,
+                                 price_multiplier=Decimal("2.50"))
+        self.airplanes = [
+            create_airplane_service({"model": f"A320-{i}", "rows": 0, "columns": 0, "cabin_layout": self.layout})
+            for i in range(2)
+        ]
+
+    def test_seats_are_materialized_on_first_flight(self):
+        self.assertEqual((self.airplanes[0].rows, self.airplanes[0].columns), (4, 4))
+        self.assertFalse(Seat.objects.exists())
+
+        flight = self._flight(self.airplanes[0])
+        self.assertEqual(Seat.objects.filter(airplane=self.airplanes[0]).count(), 15)
+        self.assertFalse(Seat.objects.filter(airplane=self.airplanes[1]).exists())
+        self.assertEqual(FlightInventory.objects.get(flight=flight).capacity, 15)
+
+        business = Seat.objects.get(airplane=self.airplanes[0], number="1B")
+        self.assertEqual(business.type, "business")
+        self.assertEqual(seat_price(Decimal("100"), self.airplanes[0], business), Decimal("250.00"))
+        economy = Seat.objects.get(airplane=self.airplanes[0], number="2A")
+        self.assertEqual(seat_price(Decimal("100"), self.airplanes[0], economy), Decimal("100.00"))
+
+    def test_geometry_is_shared_by_the_fleet(self):
+        first = get_cabin_geometry(Airplane.objects.get(pk=self.airplanes[0].pk).cabin_layout)
+        with self.assertNumQueries(1):  # solo el layout: la geometría ya está cacheada
+            second = get_cabin_geometry(Airplane.objects.select_related("cabin_layout")
+                                        .get(pk=self.airplanes[1].pk).cabin_layout)
+        self.assertIs(first, second)
+
+    def test_layout_change_reconciles_airplanes_with_seats(self):
+        flight = self._flight(self.airplanes[0])
+        CabinZone.objects.filter(layout=self.layout).update(last_row=2)
+        self.layout.rows = 5
+        self.layout.save()
+        apply_cabin_layout_change(self.layout)
 
-# Create your tests here.
+        self.assertEqual(Seat.objects.get(airplane=self.airplanes[0], number="2A").type, "business")
+        self.assertEqual(Seat.objects.filter(airplane=self.airplanes[0]).count(), 19)
+        self.assertEqual(FlightInventory.objects.get(flight=flight).capacity, 19)
+        self.assertFalse(Seat.objects.filter(airplane=self.airplanes[1]).exists())
+        self.assertEqual(Airplane.objects.get(pk=self.airplanes[1].pk).rows, 5)
@@ -59,17 +59,11 @@ def edit_airplane_view(request, airplane_id):
     })
 def view_airplane_view(request, airplane_id):
     airplane = airplane_service.get_airplane(airplane_id)
-    seats = airplane_service.get_airplane_seats(airplane_id)
-    
-    row_range = range(1, airplane.rows + 1)
-    col_range = range(1, airplane.columns + 1)
 
+    # La grilla de asientos la arma (y cachea por layout_version) el tag seat_grid
     return render(request, 'airplane/airplane_detail.html', {
         'airplane': airplane,
-        'seats': seats,
-        'row_range': row_range,
-        'col_range': col_range
     })
 
 def get_seats_by_airplane(airplane_id):
-    return Seat.objects.filter(airplane_id=airplane_id)
\ No newline at end of file
+    return Seat.objects.active().filter(airplane_id=airplane_id)
\ No newline at end of file
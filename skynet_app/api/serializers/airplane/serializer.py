@@ -11,4 +11,4 @@ class AirplaneSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Airplane
-        fields = ['id', 'model', 'rows', 'columns', 'enabled', 'seats']
\ No newline at end of file
+        fields = ['id', 'model', 'rows', 'columns', 'cabin_layout', 'enabled', 'seats']
\ No newline at end of file
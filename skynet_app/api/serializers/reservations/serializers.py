@@ -1,12 +1,32 @@
 from rest_framework import serializers
 from datetime import date
 from ...utils.token_store import  get_itineraries
+from reservations.services.route_finder import MAX_LEGS_LIMIT, MAX_RESULTS_LIMIT
 
 class SearchRouteSerializer(serializers.Serializer):
     origin = serializers.CharField(max_length=10)
     destination = serializers.CharField(max_length=10)
     date = serializers.DateField()
     passengers = serializers.IntegerField(min_value=1)
+    max_legs = serializers.IntegerField(min_value=1, max_value=MAX_LEGS_LIMIT, required=False)
+    k = serializers.IntegerField(min_value=1, max_value=MAX_RESULTS_LIMIT, required=False)
+    stream = serializers.ChoiceField(choices=["ndjson", "sse"], required=False)
+
+    def validate(self, attrs):
+        if attrs["origin"] == attrs["destination"]:
+            raise serializers.ValidationError("El origen y destino no pueden ser iguales.")
+        if attrs["date"] < date.today():
+            raise serializers.ValidationError("La fecha no puede ser en el pasado.")
+        return attrs
+
+class FareCalendarSerializer(serializers.Serializer):
+    origin = serializers.CharField(max_length=10)
+    destination = serializers.CharField(max_length=10)
+    date = serializers.DateField()
+    passengers = serializers.IntegerField(min_value=1, default=1)
+    days = serializers.IntegerField(min_value=0, max_value=7, default=7)
+    max_legs = serializers.IntegerField(min_value=1, max_value=MAX_LEGS_LIMIT, required=False)
+    k = serializers.IntegerField(min_value=1, max_value=MAX_RESULTS_LIMIT, required=False)
 
     def validate(self, attrs):
         if attrs["origin"] == attrs["destination"]:
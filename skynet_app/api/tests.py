@@ -1,3 +1,333 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from airplane.models import Airplane, Seat
+from flight.models import Airport, Flight, Route
+from reservations.models import FlightInventory, FlightSegment, Itinerary, Passenger, Ticket
+from reservations.services.inventory import FlightInventoryService
+from reservations.services.seat_events import get_broker
+from reservations.tests import NetworkTestCase
+
+
+class ItinerarySearchStreamingTest(NetworkTestCase):
+    URL = "/api/reservations/itineraries/search/"
+
+    def setUp(self):
+        super().setUp()
+        self._flight("AEP", "COR", 8, price="50")
+        self._flight("COR", "BRC", 11, price="30")
+        self._flight("AEP", "BRC", 9, price="90")
+        self.api = APIClient()
+        self.body = {"origin": "AEP", "destination": "BRC", "date": str(self.SEARCH_DATE), "passengers": 2, "k": 5}
+
+    def _lines(self, response):
+        return [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines() if line]
+
+    def test_ndjson_stream_matches_the_plain_response(self):
+        plain = self.api.post(self.URL, self.body, format="json").json()
+        response = self.api.post(self.URL, dict(self.body, stream="ndjson"), format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+
+        *itineraries, done = self._lines(response)
+        self.assertEqual([i["event"] for i in itineraries], ["itinerary", "itinerary"])
+        self.assertEqual([i["route_ids"] for i in itineraries], [i["route_ids"] for i in plain["itineraries"]])
+        self.assertEqual(done["event"], "done")
+        self.assertEqual(done["count"], 2)
+
+        # El token del evento final sirve igual que el de la respuesta en bloque
+        choose = self.api.post(f"/api/reservations/itineraries/{done['tokenItineraries']}/choose/",
+                               {"idItinerarie": 1}, format="json")
+        self.assertIn(choose.status_code, (200, 201))
+
+    def test_streamed_token_works_for_a_fresh_anonymous_client(self):
+        response = self.api.post(self.URL, dict(self.body, stream="ndjson"), format="json")
+        done = self._lines(response)[-1]
+
+        choose = self.api.post(f"/api/reservations/itineraries/{done['tokenItineraries']}/choose/",
+                               {"idItinerarie": 1}, format="json")
+        self.assertIn(choose.status_code, (200, 201), choose.content)
+
+    def test_server_sent_events_by_accept_header(self):
+        response = self.api.post(self.URL, self.body, format="json", HTTP_ACCEPT="text/event-stream")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = [line[len("event: "):] for line in b"".join(response.streaming_content).decode().splitlines()
+                  if line.startswith("event: ")]
+        self.assertEqual(events, ["itinerary", "itinerary", "done"])
+
+    def test_stream_reports_errors_when_nothing_is_found(self):
+        response = self.api.post(self.URL, dict(self.body, destination="USH", stream="ndjson"), format="json")
+        lines = self._lines(response)
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(lines[0]["event"], "error")
+        self.assertTrue(lines[0]["errors"])
+
+
+class SeatApiTestCase(NetworkTestCase):
+    """Flujo de la API hasta el paso de asientos: búsqueda → elección → pasajeros."""
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+
+    def _seat_token(self, passengers=2, origin="AEP", destination="BRC", pick=1):
+        response = self.api.post("/api/reservations/itineraries/search/", {
+            "origin": origin, "destination": destination, "date": str(self.SEARCH_DATE), "passengers": passengers,
+        }, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        response = self.api.post(f"/api/reservations/itineraries/{response.json()['tokenItineraries']}/choose/",
+                                 {"idItinerarie": pick}, format="json")
+        self.assertIn(response.status_code, (200, 201), response.content)
+        passengers_data = [
+            {"name": f"P{i}", "document": f"D{i}", "email": f"p{i}@example.com", "phone": "123",
+             "birth_date": "1990-01-01", "document_type": "dni"}
+            for i in range(passengers)
+        ]
+        response = self.api.post(
+            f"/api/reservations/itineraries/{response.json()['tokenItinerariesSelected']}/passengers/",
+            passengers_data, format="json")
+        self.assertIn(response.status_code, (200, 201), response.content)
+        return response.json()["token"]
+
+    def _segment(self, flight, seat, status="reserved", document="X1"):
+        passenger, _ = Passenger.objects.get_or_create(document=document,
+                                                       defaults={"name": document, "email": "x@example.com"})
+        itinerary = Itinerary.objects.create(passenger=passenger, reservation_code=f"R{FlightSegment.objects.count()}")
+        with self.captureOnCommitCallbacks(execute=True):
+            return FlightSegment.objects.create(itinerary=itinerary, flight=flight, seat=seat,
+                                                price=Decimal("100.00"), status=status)
+
+
+class SeatMapVersioningTest(SeatApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = self._flight("AEP", "COR", 8, price="50")
+        self.second = self._flight("COR", "BRC", 11, price="30")
+        self.url = f"/api/reservations/itineraries/{self._seat_token()}/seat/"
+        self.seats = list(Seat.objects.filter(airplane=self.airplane).order_by("row", "column"))
+
+    def test_conditional_get_until_a_seat_changes(self):
+        response = self.api.get(self.url)
+        etag = response["ETag"]
+        self.assertEqual(self.api.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self._segment(self.first, self.seats[0])
+        response = self.api.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_delta_since_version(self):
+        versions = {f["id"]: f["seat_map"]["version"] for f in self.api.get(self.url).json()["flights"]}
+        segment = self._segment(self.first, self.seats[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            segment.seat = self.seats[3]
+            segment.save()
+
+        response = self.api.get(self.url, {"since_version": f"{self.first.id}:{versions[self.first.id]},"
+                                                            f"{self.second.id}:{versions[self.second.id]}"})
+        maps = {f["id"]: f["seat_map"] for f in response.json()["flights"]}
+        self.assertTrue(maps[self.first.id]["delta"])
+        self.assertNotIn("rows", maps[self.first.id])
+        self.assertEqual({(c["num"], c["status"]) for c in maps[self.first.id]["changes"]},
+                         {("1A", "available"), ("2B", "held")})
+        self.assertEqual(maps[self.second.id]["changes"], [])
+
+    def test_non_seat_change_falls_back_to_the_full_map(self):
+        version = self.api.get(self.url).json()["flights"][0]["seat_map"]["version"]
+        FlightInventory.objects.filter(flight=self.first).update(held=4)
+        with self.captureOnCommitCallbacks(execute=True):
+            FlightInventoryService.rebuild([self.first.id])
+        seat_map = self.api.get(self.url, {"since_version": f"{self.first.id}:{version}"}).json()["flights"][0]["seat_map"]
+        self.assertIn("rows", seat_map)
+
+    def test_invalid_since_version(self):
+        self.assertEqual(self.api.get(self.url, {"since_version": "x:1"}).status_code, 400)
+
+
+@override_settings(SEAT_EVENTS_KEEPALIVE_SECONDS=0.05, SEAT_EVENTS_STREAM_MAX_SECONDS=0.3)
+class SeatEventsStreamTest(SeatApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.flight = self._flight("AEP", "COR", 8)
+        self.url = f"/api/reservations/flights/{self.flight.id}/seats/events/"
+
+    @staticmethod
+    def _events(chunks):
+        return [line[len("event: "):] for line in "".join(chunks).splitlines() if line.startswith("event: ")]
+
+    def test_stream_pushes_seat_changes(self):
+        response = self.api.get(self.url)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = iter(response.streaming_content)
+        self.assertEqual(self._events([next(stream).decode()]), ["hello"])
+
+        segment = self._segment(self.flight, self.airplane.seats.first())
+        with self.captureOnCommitCallbacks(execute=True):
+            segment.status = "confirmed"
+            segment.save()
+        rest = b"".join(stream).decode()
+        self.assertEqual(self._events([rest]), ["seats", "seats"])
+        self.assertIn('"status": "confirmed"', rest)
+        self.assertEqual(get_broker().subscriber_count(self.flight.id), 0)
+
+    def test_subscription_opens_with_the_first_read(self):
+        response = self.api.get(self.url)
+        self.assertEqual(get_broker().subscriber_count(self.flight.id), 0)
+        next(iter(response.streaming_content))
+        self.assertEqual(get_broker().subscriber_count(self.flight.id), 1)
+        response.close()
+        self.assertEqual(get_broker().subscriber_count(self.flight.id), 0)
+
+    def test_unknown_flight(self):
+        self.assertEqual(self.api.get("/api/reservations/flights/999999/seats/events/").status_code, 404)
+
+
+@override_settings(SEAT_EVENTS_KEEPALIVE_SECONDS=0.05, SEAT_EVENTS_STREAM_MAX_SECONDS=0.3)
+class SeatEventsConnectionTest(TransactionTestCase):
+    def test_stream_holds_no_connection_while_waiting(self):
+        origin = Airport.objects.create(name="Aeroparque", code="AEP", city="Buenos Aires", country="AR")
+        destination = Airport.objects.create(name="Córdoba", code="COR", city="Córdoba", country="AR")
+        route = Route.objects.create(origin_airport=origin, destination_airport=destination, estimated_duration=75)
+        airplane = Airplane.objects.create(model="E190", rows=1, columns=2)
+        departure = timezone.now() + timedelta(days=30)
+        flight = Flight.objects.create(airplane=airplane, route=route, departure_time=departure,
+                                       arrival_time=departure + timedelta(minutes=75), base_price=100,
+                                       status="active")
+
+        response = APIClient().get(f"/api/reservations/flights/{flight.id}/seats/events/")
+        stream = iter(response.streaming_content)
+        # SQLite en memoria ignora close(): se verifica que se llame y que la espera no use la base
+        with mock.patch.object(connection, "close", wraps=connection.close) as close:
+            self.assertIn(b"event: hello", next(stream))
+            close.assert_called_once_with()
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(next(stream), b": keepalive\n\n")
+                self.assertEqual(next(stream), b": keepalive\n\n")
+            self.assertEqual(ctx.captured_queries, [])
+        response.close()
+
+
+class SeatHoldApiTest(SeatApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.flight = self._flight("AEP", "BRC", 8)
+        self.seats = list(Seat.objects.filter(airplane=self.airplane).order_by("row", "column").values_list("id", flat=True))
+
+    def _open(self, passengers=1):
+        token = self._seat_token(passengers=passengers)
+        self.api.get(f"/api/reservations/itineraries/{token}/seat/")
+        return token
+
+    def _choose(self, token, document, seat_id):
+        return self.api.post(f"/api/reservations/itineraries/{token}/seat/",
+                             {"passenger_document": document, "flight_id": self.flight.id, "seat_id": seat_id},
+                             format="json")
+
+    def test_passengers_of_one_group_cannot_share_a_seat(self):
+        token = self._open(passengers=2)
+        self.assertEqual(self._choose(token, "D0", self.seats[0]).status_code, 200)
+        self.assertEqual(self._choose(token, "D1", self.seats[0]).status_code, 409)
+        self.assertEqual(self._choose(token, "D1", self.seats[1]).status_code, 200)
+
+        # D1 cambia de asiento: solo suelta el suyo, el de D0 sigue retenido
+        self.assertEqual(self._choose(token, "D1", self.seats[2]).status_code, 200)
+        self.assertEqual(self._choose(token, "D1", self.seats[0]).status_code, 409)
+        self.assertEqual(self._choose(token, "D1", self.seats[1]).status_code, 200)
+
+    def test_other_buyers_see_the_hold_and_confirm_requires_it(self):
+        first, second = APIClient(), APIClient()
+        first.force_authenticate(User.objects.create_user("first", password="x"))
+        second.force_authenticate(User.objects.create_user("second", password="x"))
+        self.api = first
+        first_token = self._open()
+        self.api = second
+        second_token = self._open()
+
+        self.api = first
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self._choose(first_token, "D0", self.seats[0]).status_code, 200)
+        self.api = second
+        self.assertEqual(self._choose(second_token, "D0", self.seats[0]).status_code, 409)
+        seat_map = self.api.get(f"/api/reservations/itineraries/{second_token}/seat/").json()["flights"][0]["seat_map"]
+        self.assertEqual(seat_map["rows"][0]["seats"][0]["status"], "held")
+
+        self.assertEqual(self._choose(second_token, "D0", self.seats[1]).status_code, 200)
+        cache.delete(f"seathold:{self.flight.id}:{self.seats[1]}")  # venció la retención
+        response = self.api.post(f"/api/reservations/itineraries/{second_token}/confirm/", {}, format="json")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["seats"], [{"flight_id": self.flight.id, "seat_id": self.seats[1]}])
+
+        self.api = first
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.api.post(f"/api/reservations/itineraries/{first_token}/confirm/", {}, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIsNone(cache.get(f"seathold:{self.flight.id}:{self.seats[0]}"))
+
+
+class ConfirmSeatConflictTest(SeatApiTestCase):
+    def test_taken_seat_rolls_back_the_whole_group(self):
+        flight = self._flight("AEP", "BRC", 8)
+        seats = list(Seat.objects.filter(airplane=self.airplane).order_by("row", "column"))
+        self.api.force_authenticate(User.objects.create_user("buyer", password="x"))
+        token = self._seat_token(passengers=2)
+        url = f"/api/reservations/itineraries/{token}/seat/"
+        self.api.get(url)
+        for i, seat in enumerate(seats[:2]):
+            self.api.post(url, {"passenger_document": f"D{i}", "flight_id": flight.id, "seat_id": seat.id},
+                          format="json")
+        # Otro canal ocupa el asiento de D1 sin pasar por las retenciones
+        self._segment(flight, seats[1], status="confirmed")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.api.post(f"/api/reservations/itineraries/{token}/confirm/", {}, format="json")
+
+        self.assertEqual(response.status_code, 409, response.content)
+        self.assertEqual((response.json()["flight_id"], response.json()["seat_id"]), (flight.id, seats[1].id))
+        self.assertFalse(Passenger.objects.filter(document__in=["D0", "D1"]).exists())
+        self.assertEqual(FlightSegment.objects.count(), 1)
+        inventory = FlightInventory.objects.get(flight=flight)
+        self.assertEqual((inventory.held, inventory.confirmed), (0, 1))
+
+
+class GroupConfirmApiTest(SeatApiTestCase):
+    def test_large_group_confirms_in_bounded_queries(self):
+        wide = Airplane.objects.create(model="A320", rows=4, columns=3)
+        Seat.objects.bulk_create([
+            Seat(airplane=wide, number=f"{row}{col}", row=row, column=col)
+            for row in range(1, 5) for col in "ABC"
+        ])
+        flights = [self._flight("NQN", "AEP", 6, airplane=wide), self._flight("AEP", "BRC", 10, airplane=wide),
+                   self._flight("BRC", "USH", 15, airplane=wide)]
+        self.api.force_authenticate(User.objects.create_user("buyer", password="x"))
+        token = self._seat_token(passengers=9, origin="NQN", destination="USH")
+        url = f"/api/reservations/itineraries/{token}/seat/"
+        seat_maps = self.api.get(url).json()["flights"]
+        self.assertEqual([fl["id"] for fl in seat_maps], [f.id for f in flights])
+        for fl in seat_maps:
+            seats = [seat for row in fl["seat_map"]["rows"] for seat in row["seats"]]
+            for i in range(9):
+                self.api.post(url, {"passenger_document": f"D{i}", "flight_id": fl["id"], "seat_id": seats[i]["id"]},
+                              format="json")
+
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            response = self.api.post(f"/api/reservations/itineraries/{token}/confirm/", {}, format="json")
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertLessEqual(len(ctx.captured_queries), 30)
+        group = response.json()["group_itineraries"]
+        self.assertEqual(len(group), 9)
+        self.assertEqual(FlightSegment.objects.count(), 27)
+        self.assertEqual(Ticket.objects.count(), 9)
+        self.assertEqual(Itinerary.objects.get(pk=group[0]["id"]).total_price, Decimal("300.00"))
+        for flight in flights:
+            self.assertEqual(FlightInventory.objects.get(flight=flight).confirmed, 9)
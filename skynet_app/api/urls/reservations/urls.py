@@ -1,18 +1,25 @@
 from django.urls import path
 from api.views.reservations.itinerary_views import (
     SearchAndCreateItineraryAPI,
+    SearchCacheStatsAPI,
+    ReachableDestinationsAPI,
     ChooseItineraryAPI
     )
 from api.views.reservations.passenger_views import LoadPassengersAPI
-from api.views.reservations.seat_views import ChooseSeatNormalizedViewAPI
+from api.views.reservations.seat_views import ChooseSeatNormalizedViewAPI, SeatEventsStreamAPI
 from api.views.reservations.summary_views import GroupSummaryPreviewAPI
 from api.views.reservations.confirm_api import ConfirmItineraryAPI
+from api.views.reservations.calendar_views import FareCalendarAPI
 
 urlpatterns = [
     path("itineraries/search/", SearchAndCreateItineraryAPI.as_view(), name="itineraries-search"),
+    path("itineraries/search/stats/", SearchCacheStatsAPI.as_view(), name="itineraries-search-stats"),
+    path("airports/<str:code>/destinations/", ReachableDestinationsAPI.as_view(), name="reachable-destinations"),
+    path("itineraries/calendar/", FareCalendarAPI.as_view(), name="itineraries-calendar"),
     path("itineraries/<str:token>/choose/", ChooseItineraryAPI.as_view(), name="itineraries-choose"),
     path("itineraries/<str:token>/passengers/", LoadPassengersAPI.as_view(), name="itineraries-passengers"),
     path("itineraries/<str:token>/seat/", ChooseSeatNormalizedViewAPI.as_view(), name="itineraries-seat"),
+    path("flights/<int:flight_id>/seats/events/", SeatEventsStreamAPI.as_view(), name="flight-seat-events"),
     path("itineraries/<str:token>/summary/", GroupSummaryPreviewAPI.as_view(), name="group-summary-preview"),
     path("itineraries/<str:token>/confirm/", ConfirmItineraryAPI.as_view(), name="confirm-itinerary"),
 ]
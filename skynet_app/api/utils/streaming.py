@@ -0,0 +1,40 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Formatos de streaming soportados → content type de la respuesta
+STREAM_CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+
+def requested_stream_format(request, explicit: str = None) -> str | None:
+    """Formato pedido: el explícito del body/query, o el que indique el header Accept."""
+    if explicit:
+        return explicit
+    accept = request.META.get("HTTP_ACCEPT", "")
+    for fmt, content_type in STREAM_CONTENT_TYPES.items():
+        if content_type in accept:
+            return fmt
+    return None
+
+
+class StreamingNegotiationMixin:
+    """Accept: text/event-stream / application/x-ndjson no tienen renderer DRF; no responder 406."""
+
+    def perform_content_negotiation(self, request, force=False):
+        return super().perform_content_negotiation(request, force=True)
+
+
+def frame(fmt: str, event: str, data: dict, event_id=None) -> str:
+    """Un mensaje del stream: una línea JSON (NDJSON) o un evento SSE."""
+    if fmt == "sse":
+        return sse_frame(event, json.dumps(data, cls=DjangoJSONEncoder), event_id)
+    return json.dumps({"event": event, **data}, cls=DjangoJSONEncoder) + "\n"
+
+
+def sse_frame(event: str, data: str, event_id=None) -> str:
+    """Evento SSE con data ya serializada (para reenviar el mismo texto a muchos clientes)."""
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {data}\n\n"
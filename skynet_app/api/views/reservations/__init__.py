@@ -3,3 +3,4 @@ from .passenger_views import *
 from .seat_views import *
 from .confirm_api import *
 from .summary_views import *
+from .calendar_views import *
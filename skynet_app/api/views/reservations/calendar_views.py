@@ -0,0 +1,87 @@
+from datetime import date, timedelta
+
+from rest_framework.views import APIView
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.permissions import AllowAny
+from drf_yasg.utils import swagger_auto_schema
+from drf_yasg import openapi
+
+from api.serializers.reservations.serializers import FareCalendarSerializer
+from reservations.services.reservations import RouteService
+
+
+def _query_param(name, type_, description, required=False):
+    return openapi.Parameter(name, openapi.IN_QUERY, description=description, type=type_, required=required)
+
+
+class FareCalendarAPI(APIView):
+    permission_classes = [AllowAny]
+    """
+    GET /api/reservations/itineraries/calendar/?origin=AEP&destination=BRC&date=2025-11-06&passengers=2&days=7
+    """
+
+    @swagger_auto_schema(
+        operation_id="fare_calendar",
+        operation_summary="Calendario de precios (± días)",
+        operation_description=(
+            "Devuelve el **precio más bajo por día** para la búsqueda, desde `date - days` hasta `date + days` "
+            "(sin fechas pasadas). El precio de cada día es el del itinerario factible más barato, con las "
+            "mismas reglas de conexión que la búsqueda. Las rutas se calculan una sola vez y los vuelos "
+            "de todo el rango se cargan con una única consulta."
+        ),
+        manual_parameters=[
+            _query_param("origin", openapi.TYPE_STRING, "Código del aeropuerto de origen", required=True),
+            _query_param("destination", openapi.TYPE_STRING, "Código del aeropuerto de destino", required=True),
+            _query_param("date", openapi.TYPE_STRING, "Fecha central (YYYY-MM-DD)", required=True),
+            _query_param("passengers", openapi.TYPE_INTEGER, "Cantidad de pasajeros (default 1)"),
+            _query_param("days", openapi.TYPE_INTEGER, "Días hacia cada lado (0 a 7, default 7)"),
+            _query_param("max_legs", openapi.TYPE_INTEGER, "Cantidad máxima de tramos"),
+            _query_param("k", openapi.TYPE_INTEGER, "Cantidad de cadenas de rutas a evaluar"),
+        ],
+        responses={
+            200: openapi.Response(
+                description="OK",
+                examples={
+                    "application/json": {
+                        "origin": "AEP",
+                        "destination": "BRC",
+                        "passenger_count": 2,
+                        "days": [
+                            {"date": "2025-11-05", "lowest_price": None, "route_ids": None},
+                            {"date": "2025-11-06", "lowest_price": "220000.00", "route_ids": [1, 4]},
+                        ],
+                    }
+                },
+            ),
+            400: openapi.Response(description="Error de validación"),
+        },
+        tags=["Reservations"],
+    )
+    def get(self, request):
+        serializer = FareCalendarSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response({"errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        start_date = max(data["date"] - timedelta(days=data["days"]), date.today())
+        end_date = data["date"] + timedelta(days=data["days"])
+
+        calendar = RouteService.fare_calendar(
+            data["origin"], data["destination"], start_date, end_date, data["passengers"],
+            max_legs=data.get("max_legs"), k=data.get("k"),
+        )
+
+        return Response({
+            "origin": data["origin"],
+            "destination": data["destination"],
+            "passenger_count": data["passengers"],
+            "days": [
+                {
+                    "date": str(day["date"]),
+                    "lowest_price": f"{day['lowest_price']:.2f}" if day["lowest_price"] is not None else None,
+                    "route_ids": day["route_ids"],
+                }
+                for day in calendar
+            ],
+        }, status=status.HTTP_200_OK)
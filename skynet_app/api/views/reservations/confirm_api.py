@@ -1,18 +1,16 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from django.core.exceptions import ValidationError
 from django.db import transaction
-from django.utils.crypto import get_random_string
 
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
 from flight.models import Flight
 from airplane.models import Seat
-from reservations.services.reservations import (
-    PassengerService, ItineraryService, FlightSegmentService, TicketService
-)
-from reservations.models import Passenger, FlightSegment
+from reservations.services.seat_holds import SeatHoldRegistry
+from reservations.services.reservations import ReservationService, SeatConflictError
 from ...utils.token_store import get_itineraries, delete_itineraries
 
 
@@ -95,8 +93,9 @@ class ConfirmItineraryAPI(APIView):
         operation_summary="Confirmar itinerario y emitir tickets",
         operation_description=(
             "Lee desde el cache (`passengers`, `flights`, `selections`), valida que todos los asientos "
-            "estén asignados, crea los registros en base de datos (Passenger, Itinerary, FlightSegment, Ticket) "
-            "y devuelve los itinerarios emitidos con tickets generados. Si hay conflicto de asiento, devuelve 409."
+            "estén asignados y sigan retenidos por este token, crea los registros en base de datos "
+            "(Passenger, Itinerary, FlightSegment, Ticket) y devuelve los itinerarios emitidos con tickets generados. "
+            "Si una retención venció o hay conflicto de asiento, devuelve 409."
         ),
         manual_parameters=[token_param],
         responses={
@@ -144,7 +143,7 @@ class ConfirmItineraryAPI(APIView):
         flights_db = {
             f.id: f
             for f in Flight.objects.select_related(
-                "route__origin_airport", "route__destination_airport"
+                "airplane__cabin_layout", "route__origin_airport", "route__destination_airport"
             ).filter(id__in=flight_ids, status="active")
         }
 
@@ -153,86 +152,58 @@ class ConfirmItineraryAPI(APIView):
             key = (s["passenger_document"], int(s["flight_id"]))
             sel_idx[key] = int(s["seat_id"]) if s["seat_id"] is not None else None
 
-        group_payload = []
-
-        for p in passengers:
-            doc = p.get("document")
-            if not doc:
-                return Response({"detail": "Pasajero sin documento."}, status=400)
-
-            passenger_obj = Passenger.objects.filter(document=doc).first()
-            if not passenger_obj:
-                try:
-                    passenger_obj = PassengerService.create({
-                        "name": p.get("name"),
-                        "document": doc,
-                        "email": p.get("email"),
-                        "phone": p.get("phone"),
-                        "birth_date": p.get("birth_date"),
-                        "document_type": p.get("document_type", "dni"),
-                    })
-                except Exception as e:
-                    return Response({"detail": f"Error creando pasajero {doc}: {e}"}, status=400)
-
-            try:
-                itinerary = ItineraryService.create(passenger=passenger_obj)
-            except Exception as e:
-                return Response({"detail": f"Error creando itinerario para {doc}: {e}"}, status=400)
-
-            flights_data = []
-
-            for f in flights_payload:
-                fid = int(f["id"])
-                fl = flights_db.get(fid)
-                if not fl:
-                    return Response({"detail": f"Vuelo {fid} no disponible."}, status=400)
-
-                seat_id = sel_idx.get((doc, fid))
-                if seat_id is None:
-                    return Response({"detail": f"Asiento faltante para {doc} en vuelo {fid}."}, status=400)
-
-                seat = Seat.objects.filter(id=seat_id, airplane=fl.airplane).first()
-                if not seat:
-                    return Response({"detail": f"Asiento {seat_id} inválido para el vuelo {fid}."}, status=400)
-
-                if FlightSegment.objects.filter(flight=fl, seat=seat).exists():
-                    return Response(
-                        {
-                            "detail": f"Conflicto: asiento {seat.row}{seat.column} ya está ocupado en vuelo {fid}.",
-                            "flight_id": fid,
-                            "seat_id": seat_id
-                        },
-                        status=status.HTTP_409_CONFLICT
-                    )
-
-                try:
-                    _ = FlightSegmentService.create(
-                        itinerary=itinerary,
-                        flight=fl,
-                        seat=seat,
-                        price=getattr(fl, "base_price", 0),
-                        status="confirmed"
-                    )
-                except Exception as e:
-                    return Response({"detail": f"Error creando segmento {fid} ({doc}): {e}"}, status=400)
+        # Los asientos elegidos tienen que seguir retenidos por su pasajero en este token (SeatHoldRegistry):
+        # una sola lectura del cache en vez de revalidar asiento por asiento
+        chosen = [(doc, fid, sid) for (doc, fid), sid in sel_idx.items() if sid is not None]
+        lost = SeatHoldRegistry.not_held_by(token, chosen)
+        if lost:
+            return Response(
+                {
+                    "detail": "La retención de uno o más asientos venció o la tomó otro pasajero.",
+                    "seats": [{"flight_id": fid, "seat_id": sid} for fid, sid in lost],
+                },
+                status=status.HTTP_409_CONFLICT
+            )
 
-                flights_data.append({
-                    "flight_number": fl.id,
-                    "origin": f"{fl.route.origin_airport.name} - {fl.route.origin_airport.city}",
-                    "destination": f"{fl.route.destination_airport.name} - {fl.route.destination_airport.city}",
-                    "departure_time": to_iso(fl.departure_time),
-                    "arrival_time": to_iso(fl.arrival_time),
-                    "duration": safe_duration_minutes_from_flight(fl),
-                    "seat": f"{seat.row}{seat.column}",
-                    "price": getattr(fl, "base_price", 0),
-                })
+        missing_flights = [fid for fid in flight_ids if fid not in flights_db]
+        if missing_flights:
+            return Response({"detail": f"Vuelo {missing_flights[0]} no disponible."}, status=400)
+        flights = [flights_db[fid] for fid in flight_ids]
 
-            try:
-                barcode = f"{itinerary.reservation_code}-{get_random_string(6).upper()}"
-                ticket = TicketService.create(itinerary=itinerary, barcode=barcode, status="issued")
-            except Exception as e:
-                return Response({"detail": f"Error emitiendo ticket: {e}"}, status=400)
+        # Todo el grupo en una sola pasada (ReservationService.confirm_group_reservations): si algo falla
+        # se deshace completo, nunca quedan pasajeros o itinerarios a medio crear
+        try:
+            confirmed = ReservationService.confirm_group_reservations(passengers, flights, sel_idx)
+        except SeatConflictError as e:
+            seat = Seat.objects.filter(id=e.seat_id).first()
+            label = f"{seat.row}{seat.column}" if seat else e.seat_id
+            return Response(
+                {
+                    "detail": f"Conflicto: asiento {label} ya está ocupado en vuelo {e.flight_id}.",
+                    "flight_id": e.flight_id,
+                    "seat_id": e.seat_id
+                },
+                status=status.HTTP_409_CONFLICT
+            )
+        except ValidationError as e:
+            return Response({"detail": " | ".join(e.messages)}, status=400)
 
+        group_payload = []
+        for itinerary, segments, ticket in confirmed:
+            passenger_obj = itinerary.passenger
+            flights_data = [
+                {
+                    "flight_number": seg.flight.id,
+                    "origin": f"{seg.flight.route.origin_airport.name} - {seg.flight.route.origin_airport.city}",
+                    "destination": f"{seg.flight.route.destination_airport.name} - {seg.flight.route.destination_airport.city}",
+                    "departure_time": to_iso(seg.flight.departure_time),
+                    "arrival_time": to_iso(seg.flight.arrival_time),
+                    "duration": safe_duration_minutes_from_flight(seg.flight),
+                    "seat": f"{seg.seat.row}{seg.seat.column}",
+                    "price": seg.price,
+                }
+                for seg in segments
+            ]
             group_payload.append({
                 "id": itinerary.id,
                 "reservation_code": itinerary.reservation_code,
@@ -244,7 +215,7 @@ class ConfirmItineraryAPI(APIView):
                     "birth_date": passenger_obj.birth_date,
                 },
                 "flights": flights_data,
-                "total_price": sum(f["price"] for f in flights_data),
+                "total_price": itinerary.total_price,
                 "ticket": {
                     "barcode": ticket.barcode,
                     "status": ticket.status,
@@ -252,5 +223,7 @@ class ConfirmItineraryAPI(APIView):
             })
 
         delete_itineraries(request, token)
+        # Los asientos ya quedaron confirmados: las retenciones se sueltan solo si la transacción confirma
+        transaction.on_commit(lambda: SeatHoldRegistry.release_many(token, chosen))
 
         return Response({"group_itineraries": group_payload, "preview": False}, status=200)
@@ -1,7 +1,8 @@
+from django.http import StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework import status
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
@@ -10,9 +11,11 @@ from api.serializers.reservations.serializers import (
     ChooseItinerarySerializer,
 )
 from reservations.services.reservations import RouteService
+from reservations.services.search_cache import SearchCache
 from flight.models import Flight, Route
 from services.calculate_data_route_chain import calc_route_chain
-from ...utils.token_store import save_itineraries
+from ...utils.token_store import save_itineraries, get_namespace
+from ...utils.streaming import STREAM_CONTENT_TYPES, StreamingNegotiationMixin, requested_stream_format, frame
 
 
 token_param = openapi.Parameter(
@@ -24,7 +27,7 @@ token_param = openapi.Parameter(
 )
 
 
-class SearchAndCreateItineraryAPI(APIView):
+class SearchAndCreateItineraryAPI(StreamingNegotiationMixin, APIView):
     permission_classes = [AllowAny]
 
     @swagger_auto_schema(
@@ -32,7 +35,12 @@ class SearchAndCreateItineraryAPI(APIView):
         operation_summary="Buscar itinerarios disponibles",
         operation_description=(
             "Busca itinerarios (con escalas posibles) desde un **origen** a un **destino** "
-            "en una **fecha** para una cantidad de **pasajeros**. Devuelve opciones y un token para continuar el flujo."
+            "en una **fecha** para una cantidad de **pasajeros**. Devuelve opciones y un token para continuar el flujo.\n"
+            "- `max_legs` (opcional): cantidad máxima de tramos por itinerario.\n"
+            "- `k` (opcional): cantidad máxima de itinerarios, ordenados por duración total.\n"
+            "- `stream` (opcional, `ndjson` o `sse`; también vale el header `Accept`): la respuesta se envía "
+            "de a un itinerario (`event: itinerary`) apenas se valida, y un último mensaje `done` "
+            "trae el token, origen y destino (o `error` si no hubo resultados)."
         ),
         request_body=SearchRouteSerializer,
         responses={
@@ -78,19 +86,41 @@ class SearchAndCreateItineraryAPI(APIView):
         destination = serializer.validated_data["destination"]
         fecha = serializer.validated_data["date"]
         passengers_count = serializer.validated_data["passengers"]
+        max_legs = serializer.validated_data.get("max_legs")
+        k = serializer.validated_data.get("k")
+
+        stream_format = requested_stream_format(request, serializer.validated_data.get("stream"))
+        if stream_format:
+            # La sesión anónima tiene que existir antes de armar la respuesta: el cuerpo se genera
+            # después de que SessionMiddleware ya mandó los headers (y con ellos la cookie)
+            get_namespace(request)
+            response = StreamingHttpResponse(
+                self._stream(request, stream_format, origin, destination, fecha, passengers_count, max_legs, k),
+                content_type=STREAM_CONTENT_TYPES[stream_format],
+            )
+            response["Cache-Control"] = "no-cache"
+            response["X-Accel-Buffering"] = "no"  # que el proxy no junte los mensajes
+            return response
 
         try:
-            route_chains, errores = RouteService.find_available_routes(
-                origin, destination, fecha, passengers_count
+            found, errores = RouteService.find_available_itineraries(
+                origin, destination, fecha, passengers_count, max_legs=max_legs, k=k
             )
 
-            if not route_chains:
+            if not found:
                 return Response(
                     {"errors": errores or ["No se encontraron itinerarios disponibles."]},
                     status=status.HTTP_404_NOT_FOUND,
                 )
 
-            options = calc_route_chain(route_chains, Route.objects, Flight.objects)
+            # Dos queries para todas las opciones: rutas y los vuelos elegidos por la búsqueda
+            options = calc_route_chain(
+                [it["route_ids"] for it in found],
+                Route.objects,
+                Flight.objects,
+                search_date=fecha,
+                flight_chains_ids=[it["flight_ids"] for it in found],
+            )
 
             tokenItineraries = save_itineraries(
                 request,
@@ -116,6 +146,105 @@ class SearchAndCreateItineraryAPI(APIView):
             )
 
 
+    @staticmethod
+    def _stream(request, fmt, origin, destination, fecha, passengers_count, max_legs, k):
+        """Emite cada itinerario con su precio apenas la búsqueda lo acepta; el último mensaje trae el token."""
+        errores = []
+        options = []
+        try:
+            found = RouteService.iter_available_itineraries(
+                origin, destination, fecha, passengers_count, errores, max_legs=max_legs, k=k
+            )
+            for it in found:
+                option = calc_route_chain(
+                    [it["route_ids"]], Route.objects, Flight.objects,
+                    search_date=fecha, flight_chains_ids=[it["flight_ids"]],
+                )["itineraries"][0]
+                option["id"] = len(options) + 1
+                options.append(option)
+                yield frame(fmt, "itinerary", option)
+
+            if not options:
+                yield frame(fmt, "error", {"errors": errores or ["No se encontraron itinerarios disponibles."]})
+                return
+
+            tokenItineraries = save_itineraries(
+                request,
+                payload_itinerary=options,
+                passengers_count=passengers_count,
+            )
+            codes = options[0]["route_summary"].split(" → ")
+            yield frame(fmt, "done", {
+                "tokenItineraries": tokenItineraries,
+                "search_date": str(fecha),
+                "origin": codes[0],
+                "destination": codes[-1],
+                "passenger_count": passengers_count,
+                "count": len(options),
+            })
+
+        except Exception as e:
+            yield frame(fmt, "error", {"errors": [f"Error buscando rutas: {str(e)}"]})
+
+
+class SearchCacheStatsAPI(APIView):
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_id="search_cache_stats",
+        operation_summary="Estadísticas del cache de búsquedas",
+        operation_description="Devuelve los contadores de aciertos/fallos del cache compartido de búsquedas.",
+        responses={
+            200: openapi.Response(
+                description="OK",
+                examples={"application/json": {"hits": 120, "misses": 30, "hit_ratio": 0.8}},
+            ),
+        },
+        security=[{"Bearer": []}],
+        tags=["Reservations"],
+    )
+    def get(self, request):
+        return Response(SearchCache.stats(), status=status.HTTP_200_OK)
+
+
+class ReachableDestinationsAPI(APIView):
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        operation_id="reachable_destinations",
+        operation_summary="Destinos alcanzables desde un aeropuerto",
+        operation_description=(
+            "Lista los aeropuertos a los que se puede llegar desde `code` con la mínima cantidad de tramos. "
+            "Sale de la matriz de alcanzabilidad precalculada: no recorre el grafo por pedido."
+        ),
+        manual_parameters=[
+            openapi.Parameter("code", openapi.IN_PATH, description="Código del aeropuerto de origen",
+                              type=openapi.TYPE_STRING, required=True),
+        ],
+        responses={
+            200: openapi.Response(
+                description="OK",
+                examples={
+                    "application/json": {
+                        "origin": "AEP",
+                        "destinations": [
+                            {"id": 2, "code": "COR", "name": "Ing. Taravella", "city": "Córdoba", "min_legs": 1},
+                            {"id": 5, "code": "BRC", "name": "Bariloche", "city": "Bariloche", "min_legs": 2},
+                        ],
+                    }
+                },
+            ),
+        },
+        tags=["Reservations"],
+    )
+    def get(self, request, code):
+        code = code.strip().upper()
+        return Response(
+            {"origin": code, "destinations": RouteService.reachable_destinations(code)},
+            status=status.HTTP_200_OK,
+        )
+
+
 class ChooseItineraryAPI(APIView):
     permission_classes = [AllowAny]
 
@@ -2,15 +2,32 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from rest_framework import status
-from django.utils import timezone
+import hashlib
+import json
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+
 from django.core.cache import cache
+from django.utils.http import parse_etags
 
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
+from reservations.services.reservations import SeatService
 from reservations.services.seat_read import SeatReadService
-from flight.models import Flight, Route
+from reservations.services.seat_changes import SeatChangeLog
+from reservations.services.seat_events import get_broker
+from reservations.services.inventory import FlightInventoryService
+from reservations.services.seat_holds import SeatHoldRegistry
+from reservations.models import FlightSegment
+from flight.models import Flight
 from ...utils.token_store import get_itineraries, get_namespace, _key
+from ...utils.streaming import StreamingNegotiationMixin, sse_frame, frame
 
 
 def _cast_int(val):
@@ -36,6 +53,41 @@ def _ensure_flights_in_cache(request, token, payload):
     cache.set(_key(user_type, user_id, token), current, timeout=600)
 
 
+def _parse_since_versions(raw, flights):
+    """since_version: "12" (para todos los vuelos) o "flight_id:version,..." → {flight_id: version}.
+    Devuelve None si el formato es inválido."""
+    if not raw:
+        return {}
+    raw = raw.strip()
+    if raw.isdigit():
+        return {f.id: int(raw) for f in flights}
+    since = {}
+    for part in raw.split(","):
+        fid, sep, version = part.strip().partition(":")
+        if not sep or not fid.isdigit() or not version.isdigit():
+            return None
+        since[int(fid)] = int(version)
+    return since
+
+
+def _seat_maps_etag(itinerary, passengers, flights, inventory_by_flight, hold_marks, registry_holds):
+    """ETag débil del GET: cambia si cambia la versión de algún vuelo, vence un hold (de la base
+    o del SeatHoldRegistry), o cambia lo que el token aporta a la respuesta (itinerario y pasajeros)."""
+    state = {
+        "itinerary": itinerary,
+        "passengers": passengers,
+        "flights": [
+            (f.id,
+             getattr(inventory_by_flight.get(f.id), "version", None),
+             hold_marks.get(f.id),
+             sorted((sid, hold["until"]) for sid, hold in registry_holds.get(f.id, {}).items()))
+            for f in flights
+        ],
+    }
+    digest = hashlib.sha1(json.dumps(state, sort_keys=True, default=str).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
 def _fill_missing_selections(passenger_docs, flights, selections):
     """Asegura una entrada por (pasajero × vuelo), seat_id=None si no eligió todavía."""
     seen = {(s["passenger_document"], s["flight_id"]) for s in selections}
@@ -105,6 +157,7 @@ choose_seat_ok_example = {
         "duration": 225,
         "total_price": "220000.00",
         "route_ids": [1, 4],
+        "flight_ids": [1, 4],
     },
     "passengers": [
         {"name": "Juan Pérez", "document": "32123456", "email": "juan.perez@example.com",
@@ -138,9 +191,22 @@ class ChooseSeatNormalizedViewAPI(APIView):
         operation_summary="Obtener grillas de asientos por vuelo del itinerario",
         operation_description=(
             "Devuelve grillas normalizadas por vuelo, asientos confirmados/retenidos, "
-            "selecciones existentes por (pasajero × vuelo) y locks activos."
+            "selecciones existentes por (pasajero × vuelo) y locks activos.\n"
+            "- Responde con `ETag`; si se envía en `If-None-Match` y nada cambió, responde **304** sin cuerpo.\n"
+            "- `since_version` (`12` o `1:12,4:7` por vuelo): la grilla de cada vuelo viene como delta "
+            "(`delta: true`, `changes` con los asientos que cambiaron). Si la versión es muy vieja, "
+            "viene la grilla completa (`rows`)."
         ),
-        manual_parameters=[token_param],
+        manual_parameters=[
+            token_param,
+            openapi.Parameter(
+                name="since_version",
+                in_=openapi.IN_QUERY,
+                description="Última versión de grilla que tiene el cliente (global o flight_id:version,...)",
+                type=openapi.TYPE_STRING,
+                required=False,
+            ),
+        ],
         responses={
             200: openapi.Response(
                 description="OK",
@@ -152,6 +218,7 @@ class ChooseSeatNormalizedViewAPI(APIView):
                             "duration": 225,
                             "total_price": "220000.00",
                             "route_ids": [1, 4],
+                            "flight_ids": [1, 4],
                         },
                         "passengers": [
                             {"name": "Juan Pérez", "document": "32123456", "email": "juan.perez@example.com",
@@ -173,7 +240,8 @@ class ChooseSeatNormalizedViewAPI(APIView):
                     }
                 },
             ),
-            400: openapi.Response(description="Token válido pero datos mal formados (route_ids inválido)"),
+            304: openapi.Response(description="Sin cambios desde el ETag enviado en If-None-Match"),
+            400: openapi.Response(description="Token válido pero datos mal formados (flight_ids o since_version inválido)"),
             404: openapi.Response(description="Itinerario no encontrado"),
         },
         tags=["Reservations"],
@@ -185,32 +253,81 @@ class ChooseSeatNormalizedViewAPI(APIView):
 
         itinerary = (data.get("itinerary") or {}).get("itinerary") or {}
         route_ids = itinerary.get("route_ids") or []
-        if not isinstance(route_ids, list):
-            return Response({"error": "route_ids inválido"}, status=status.HTTP_400_BAD_REQUEST)
+        # Los vuelos que eligió la búsqueda (fecha, conexión y asientos ya validados), uno por tramo
+        flight_ids = itinerary.get("flight_ids")
+        if not isinstance(flight_ids, list) or len(flight_ids) != len(route_ids):
+            return Response({"error": "flight_ids inválido"}, status=status.HTTP_400_BAD_REQUEST)
 
         passengers = data.get("passengers") or []
         passenger_docs = [p.get("document") for p in passengers if p.get("document")]
 
-        routes = Route.objects.filter(id__in=route_ids)
-        flights_qs = Flight.objects.filter(route__in=routes, status="active").order_by("id")
-        flights = list(flights_qs)
-
-        confirmed_by_flight, held_by_flight = SeatReadService.get_status_sets_by_flight(flights)
-
-
-        flights_payload = []
+        flights = SeatService.get_flights_in_order([_cast_int(fid) for fid in flight_ids])
+        if None in flights:
+            return Response({"error": "Alguno de los vuelos del itinerario ya no está activo."},
+                            status=status.HTTP_409_CONFLICT)
+
+        since_versions = _parse_since_versions(request.query_params.get("since_version"), flights)
+        if since_versions is None:
+            return Response({"error": "since_version inválido"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Versión persistida + hold vigente más antiguo por vuelo: alcanza para saber si algo cambió
+        inventory_by_flight = SeatReadService.get_inventory_by_flight(flights)
+        hold_marks = SeatReadService.get_live_hold_marks(flights)
+        registry_holds = SeatReadService.get_registry_holds(flights)
+        itinerary_payload = {
+            "id": itinerary.get("id"),
+            "route_summary": itinerary.get("route_summary"),
+            "duration": itinerary.get("duration"),
+            "total_price": itinerary.get("total_price"),
+            "route_ids": route_ids,
+            "flight_ids": flight_ids,
+        }
+        etag = _seat_maps_etag(itinerary_payload, passengers, flights, inventory_by_flight, hold_marks, registry_holds)
+        if etag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", "")):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            response["ETag"] = etag
+            return response
+
+        occupancy_by_flight, held_by_flight, lapsed_by_flight = SeatReadService.get_occupancy_by_flight(
+            flights, registry_holds, inventory_by_flight
+        )
+        # Las retenciones que vencen no cambian la versión: el delta repite las que se mostraron la vez anterior
+        previous_locks = defaultdict(set)
+        for lock in data.get("locks") or []:
+            previous_locks[_cast_int(lock.get("flight_id"))].add(_cast_int(lock.get("seat_id")))
+        # Todas las grillas juntas: los layouts de todos los aviones salen de una sola query (o del cache)
+        seat_maps = SeatReadService.build_seat_maps(flights, occupancy_by_flight, inventory_by_flight)
+
+        flights_payload = []   # lo que se guarda en el token: siempre la grilla completa
+        response_flights = []  # lo que se responde: delta si el cliente mandó su versión y se puede armar
         for fl in flights:
-            seat_map = SeatReadService.build_seat_map(
-                flight=fl,
-                confirmed_ids=confirmed_by_flight.get(fl.id, set()),
-                held_ids=set(held_by_flight.get(fl.id, {}).keys()),
-            )
+            inventory = inventory_by_flight.get(fl.id)
+            occupancy = occupancy_by_flight[fl.id]
             flights_payload.append({
                 "id": fl.id,
                 "code": getattr(fl, "code", str(fl.id)),
-                "seat_map": seat_map,
+                "seat_map": seat_maps[fl.id],
             })
 
+            since = since_versions.get(fl.id)
+            changed = None
+            if since is not None and inventory is not None:
+                changed = SeatChangeLog.changed_since(fl.id, since, inventory.version)
+            if changed is None:
+                response_flights.append(flights_payload[-1])
+                continue
+            response_flights.append({
+                "id": fl.id,
+                "code": getattr(fl, "code", str(fl.id)),
+                "seat_map": SeatReadService.build_seat_map_delta(
+                    flight=fl,
+                    occupancy=occupancy,
+                    changed_ids=(changed | lapsed_by_flight.get(fl.id, set())
+                                 | previous_locks[fl.id] | set(held_by_flight.get(fl.id, {}))),
+                    since_version=since,
+                    inventory=inventory,
+                ),
+            })
 
         selections_payload = SeatReadService.get_selections_for_itinerary_docs(passenger_docs, flights)
 
@@ -219,13 +336,7 @@ class ChooseSeatNormalizedViewAPI(APIView):
         locks_payload = SeatReadService.locks_payload_from_held(held_by_flight)
 
         payload = {
-            "itinerary": {
-                "id": itinerary.get("id"),
-                "route_summary": itinerary.get("route_summary"),
-                "duration": itinerary.get("duration"),
-                "total_price": itinerary.get("total_price"),
-                "route_ids": route_ids,
-            },
+            "itinerary": itinerary_payload,
             "passengers": passengers,
             "flights": flights_payload,
             "selections": selections_payload,
@@ -234,15 +345,19 @@ class ChooseSeatNormalizedViewAPI(APIView):
 
         _ensure_flights_in_cache(request, token, payload)
 
-        return Response(payload, status=status.HTTP_200_OK)
+        payload["flights"] = response_flights
+        response = Response(payload, status=status.HTTP_200_OK)
+        response["ETag"] = etag
+        return response
 
     @swagger_auto_schema(
         operation_id="choose_seat",
         operation_summary="Elegir / actualizar asiento para un pasajero en un vuelo",
         operation_description=(
             "Asigna o actualiza el **asiento** de un **pasajero** para un **vuelo** del itinerario.\n"
-            "- Si `seat_id` es `null`, desasigna.\n"
-            "- Valida que el asiento exista y esté disponible.\n"
+            "- Si `seat_id` es `null`, desasigna (libera la retención).\n"
+            "- Valida que el asiento exista y esté disponible, y lo retiene para este token "
+            "(`SEAT_HOLD_TTL_SECONDS`); volver a enviarlo renueva la retención.\n"
             "- Responde con el estado de asignación por vuelo e itinerario."
         ),
         manual_parameters=[token_param],
@@ -257,7 +372,7 @@ class ChooseSeatNormalizedViewAPI(APIView):
             ),
             400: openapi.Response(description="Body inválido / pasajero o vuelo fuera del token"),
             404: openapi.Response(description="Token inválido o expirado"),
-            409: openapi.Response(description="Asiento no disponible"),
+            409: openapi.Response(description="Asiento no disponible o retenido por otro pasajero"),
         },
         tags=["Reservations"],
     )
@@ -285,6 +400,7 @@ class ChooseSeatNormalizedViewAPI(APIView):
         flight = next((f for f in flights if _cast_int(f.get("id")) == flight_id), None)
         if not flight:
             return Response({"detail": "Vuelo inválido para este token."}, status=400)
+        owner = SeatHoldRegistry.owner(token, doc)
 
 
         prev_seat_id = None
@@ -304,7 +420,15 @@ class ChooseSeatNormalizedViewAPI(APIView):
                     break
             if not target_seat:
                 return Response({"detail": "Asiento no existe en este vuelo."}, status=400)
-            if target_seat.get("status") != "available" and seat_id != prev_seat_id:
+            if target_seat.get("status") == "confirmed" and seat_id != prev_seat_id:
+                return Response({"detail": "Asiento no disponible."}, status=409)
+
+            # Retención compartida por pasajero: si la tiene otro (de otro token o de este mismo grupo),
+            # el conflicto aparece acá y no al confirmar
+            if not SeatHoldRegistry.acquire(flight_id, seat_id, owner=owner):
+                return Response({"detail": "Asiento retenido por otro pasajero."}, status=409)
+            if seat_id != prev_seat_id and FlightSegment.objects.live().filter(flight_id=flight_id, seat_id=seat_id).exists():
+                SeatHoldRegistry.release(flight_id, seat_id, owner=owner)
                 return Response({"detail": "Asiento no disponible."}, status=409)
 
         data["selections"] = [
@@ -318,6 +442,7 @@ class ChooseSeatNormalizedViewAPI(APIView):
         })
 
         if prev_seat_id and prev_seat_id != seat_id:
+            SeatHoldRegistry.release(flight_id, _cast_int(prev_seat_id), owner=owner)
             for row in flight["seat_map"]["rows"]:
                 for s in row["seats"]:
                     if _cast_int(s["id"]) == prev_seat_id and s.get("status") == "held":
@@ -325,9 +450,6 @@ class ChooseSeatNormalizedViewAPI(APIView):
         if seat_id is not None:
             target_seat["status"] = "held"
 
-        flight["seat_map"]["version"] = int(flight["seat_map"]["version"]) + 1
-        flight["seat_map"]["updated_at"] = timezone.now().isoformat().replace("+00:00", "Z")
-
         user_type, user_id = get_namespace(request)
         cache.set(_key(user_type, user_id, token), data, timeout=600)
 
@@ -353,3 +475,65 @@ class ChooseSeatNormalizedViewAPI(APIView):
         }
 
         return Response(payload, status=200)
+
+
+class SeatEventsStreamAPI(StreamingNegotiationMixin, APIView):
+    permission_classes = [AllowAny]
+    """
+    GET /api/reservations/flights/{flight_id}/seats/events/
+    """
+
+    @swagger_auto_schema(
+        operation_id="seat_events_stream",
+        operation_summary="Cambios de asientos de un vuelo en vivo (SSE)",
+        operation_description=(
+            "Stream `text/event-stream` con los cambios de estado de los asientos del vuelo, "
+            "a medida que se retienen, confirman o liberan.\n"
+            "- `hello`: versión actual de la grilla al conectarse.\n"
+            "- `seats`: `{flight_id, version, seats: [{id, status}]}`; el `id` del evento es la versión.\n"
+            "- `reset`: cambió algo que no es por asiento (ej. capacidad); pedir la grilla completa.\n"
+            "Al reconectar, ponerse al día con `GET .../seat/?since_version=<último id>`."
+        ),
+        manual_parameters=[
+            openapi.Parameter("flight_id", openapi.IN_PATH, description="ID del vuelo",
+                              type=openapi.TYPE_INTEGER, required=True),
+        ],
+        responses={200: openapi.Response(description="Stream de eventos (text/event-stream)")},
+        tags=["Reservations"],
+    )
+    def get(self, request, flight_id):
+        flight = get_object_or_404(Flight, pk=flight_id)
+        response = StreamingHttpResponse(
+            _seat_event_stream(flight.id),
+            content_type="text/event-stream",
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+def _seat_event_stream(flight_id):
+    # La suscripción se abre con el primer next(): si el cliente se va antes de empezar a leer,
+    # el generador nunca arranca y no queda un suscriptor colgado en el broker
+    keepalive = settings.SEAT_EVENTS_KEEPALIVE_SECONDS
+    deadline = time.monotonic() + settings.SEAT_EVENTS_STREAM_MAX_SECONDS
+    with get_broker().subscribe(flight_id) as subscription:
+        # Suscribirse antes de leer la versión: ningún cambio queda entre medio sin enviarse
+        inventory = FlightInventoryService.get_by_flight([flight_id]).get(flight_id)
+        version = inventory.version if inventory else None
+        # La base solo hacía falta para la versión: la conexión se devuelve antes de esperar, si no cada
+        # cliente mirando la grilla retiene una hasta SEAT_EVENTS_STREAM_MAX_SECONDS
+        # (dentro de una transacción, como en los tests, no se puede cerrar)
+        if not connection.in_atomic_block:
+            connection.close()
+        yield frame("sse", "hello", {"flight_id": flight_id, "version": version}, event_id=version)
+        while time.monotonic() < deadline:
+            event = subscription.get(timeout=keepalive)
+            if subscription.overflowed:
+                # Cliente demasiado lento: que se ponga al día con la grilla
+                yield frame("sse", "reset", {"flight_id": flight_id})
+                return
+            if event is None:
+                yield ": keepalive\n\n"
+                continue
+            yield sse_frame(event["event"], event["data"], event["id"])
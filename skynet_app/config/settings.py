@@ -147,6 +147,31 @@ MESSAGE_TAGS = {
 CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
 
 
+# --- BÚSQUEDA DE RUTAS ---
+ROUTE_SEARCH_MAX_LEGS = 3       # tramos máximos por itinerario
+ROUTE_SEARCH_MAX_RESULTS = 5    # cadenas (k) devueltas por búsqueda
+MIN_CONNECTION_MINUTES = 45     # tiempo mínimo entre la llegada de un tramo y la salida del siguiente
+ITINERARY_SEARCH_WINDOW_HOURS = 24  # horas extra (después del día buscado) para los tramos de conexión
+SEARCH_CACHE_TIMEOUT = 300      # segundos que vive un resultado de búsqueda en cache
+
+# --- EVENTOS DE ASIENTOS (SSE) ---
+# Broker de cambios de asientos; reemplazable por uno compartido (ej. Redis pub/sub) con la misma interfaz
+SEAT_EVENTS_BROKER = "reservations.services.seat_events.InProcessSeatBroker"
+SEAT_EVENTS_KEEPALIVE_SECONDS = 15      # comentario ": keepalive" para que proxies no corten la conexión
+SEAT_EVENTS_STREAM_MAX_SECONDS = 300    # el cliente (EventSource) se reconecta solo al cerrarse
+
+# --- RETENCIÓN DE ASIENTOS ---
+SEAT_HOLD_TTL_SECONDS = 300     # vida de una retención (seat POST) sin renovar; igual al vencimiento de los reserved
+
+# --- VENCIMIENTO DE RESERVAS ---
+# Un "reserved" vencido queda libre en cuanto vence (lecturas, disponibilidad y nuevas reservas, que lo
+# borran si toman su asiento); el barredor solo limpia la base de lo que nadie volvió a ocupar
+RESERVATION_HOLD_MINUTES = 5            # un segmento "reserved" vence a los N minutos de reserved_at
+EXPIRY_SWEEP_BATCH_SIZE = 500           # segmentos borrados por transacción
+EXPIRY_SWEEP_INTERVAL_SECONDS = 60      # frecuencia del hilo barredor
+EXPIRY_SWEEPER_THREAD = False           # True: barrer desde un hilo del proceso web (si no, cron + sweep_expired_reservations)
+
+
 # --- DJANGO REST FRAMEWORK ---
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
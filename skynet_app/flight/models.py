@@ -32,6 +32,16 @@ class Flight(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES)
     base_price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Avión con el que se cargó: el inventario solo se recalcula si cambia
+        instance._loaded_airplane_id = instance.airplane_id
+        return instance
+
+    def airplane_changed(self) -> bool:
+        return getattr(self, "_loaded_airplane_id", None) != self.airplane_id
+
     def __str__(self):
         return f"Flight {self.id} - {self.route} "
 
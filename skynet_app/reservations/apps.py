@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class ReservationsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "reservations"
+
+    def ready(self):
+        from reservations import signals  # noqa: F401
+
+        from django.conf import settings
+        if settings.EXPIRY_SWEEPER_THREAD:
+            from reservations.services.expiry import start_expiry_scheduler
+            start_expiry_scheduler()
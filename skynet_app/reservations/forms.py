@@ -1,12 +1,25 @@
 from django import forms
 from reservations.models import Passenger
 from flight.models import Airport 
+from reservations.services.route_finder import MAX_LEGS_LIMIT, MAX_RESULTS_LIMIT
+from reservations.services.route_graph import get_route_graph
 
 class SearchRouteForm(forms.Form):
     origin = forms.ModelChoiceField(queryset=Airport.objects.all())
     destination = forms.ModelChoiceField(queryset=Airport.objects.all())
     date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
     passengers = forms.IntegerField(min_value=1, max_value=10)
+    max_legs = forms.IntegerField(min_value=1, max_value=MAX_LEGS_LIMIT, required=False)
+    k = forms.IntegerField(min_value=1, max_value=MAX_RESULTS_LIMIT, required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Con un origen elegido, el destino solo ofrece aeropuertos alcanzables desde ahí
+        origin_id = self.data.get(self.add_prefix('origin')) if self.is_bound else self.initial.get('origin')
+        origin = Airport.objects.filter(pk=origin_id).first() if str(origin_id or '').isdigit() else None
+        if origin is not None:
+            reachable = get_route_graph().reachable_from(origin.code)
+            self.fields['destination'].queryset = Airport.objects.filter(code__in=reachable.keys())
 
 class PassengerForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from reservations.services.inventory import FlightInventoryService
+
+
+class Command(BaseCommand):
+    help = "Recalcula y verifica los contadores de FlightInventory a partir de Seat y FlightSegment."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--flight", type=int, action="append", dest="flights",
+                            help="ID de vuelo a reconciliar (se puede repetir). Por defecto, todos.")
+        parser.add_argument("--check", action="store_true",
+                            help="Solo verificar: no corrige y falla si hay diferencias.")
+
+    def handle(self, *args, **options):
+        flights = options["flights"]
+
+        if options["check"]:
+            with transaction.atomic():
+                mismatches = FlightInventoryService.rebuild(flights)
+                transaction.set_rollback(True)
+        else:
+            mismatches = FlightInventoryService.rebuild(flights)
+
+        for m in mismatches:
+            self.stdout.write(f"Vuelo {m['flight_id']}: guardado={m['stored']} real={m['expected']}")
+
+        if options["check"] and mismatches:
+            raise CommandError(f"{len(mismatches)} vuelo(s) con inventario inconsistente.")
+
+        action = "verificado" if options["check"] else "reconciliado"
+        self.stdout.write(self.style.SUCCESS(f"Inventario {action}: {len(mismatches)} diferencia(s)."))
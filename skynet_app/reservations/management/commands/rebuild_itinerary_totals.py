@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from reservations.services.itinerary_totals import ItineraryTotalsService
+
+
+class Command(BaseCommand):
+    help = "Recalcula y verifica Itinerary.total_price a partir de los precios de sus FlightSegment."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--itinerary", type=int, action="append", dest="itineraries",
+                            help="ID de itinerario a reconciliar (se puede repetir). Por defecto, todos.")
+        parser.add_argument("--check", action="store_true",
+                            help="Solo verificar: no corrige y falla si hay diferencias.")
+
+    def handle(self, *args, **options):
+        itineraries = options["itineraries"]
+
+        if options["check"]:
+            with transaction.atomic():
+                mismatches = ItineraryTotalsService.rebuild(itineraries)
+                transaction.set_rollback(True)
+        else:
+            mismatches = ItineraryTotalsService.rebuild(itineraries)
+
+        for m in mismatches:
+            self.stdout.write(f"Itinerario {m['itinerary_id']}: guardado={m['stored']} real={m['expected']}")
+
+        if options["check"] and mismatches:
+            raise CommandError(f"{len(mismatches)} itinerario(s) con total inconsistente.")
+
+        action = "verificados" if options["check"] else "reconciliados"
+        self.stdout.write(self.style.SUCCESS(f"Totales {action}: {len(mismatches)} diferencia(s)."))
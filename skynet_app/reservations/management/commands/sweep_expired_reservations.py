@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from reservations.services.expiry import ExpirySweeper
+
+
+class Command(BaseCommand):
+    help = "Borra en lotes los segmentos reservados vencidos y los itinerarios que quedan vacíos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None,
+                            help=f"Segmentos por transacción (por defecto {settings.EXPIRY_SWEEP_BATCH_SIZE}).")
+        parser.add_argument("--loop", action="store_true",
+                            help="No terminar: barrer cada --interval segundos.")
+        parser.add_argument("--interval", type=int, default=settings.EXPIRY_SWEEP_INTERVAL_SECONDS,
+                            help="Segundos entre barridos con --loop.")
+        parser.add_argument("--stats", action="store_true",
+                            help="Solo mostrar métricas (último barrido, totales y vencidos pendientes).")
+
+    def handle(self, *args, **options):
+        if options["stats"]:
+            for key, value in ExpirySweeper.stats().items():
+                self.stdout.write(f"{key}: {value}")
+            return
+
+        while True:
+            stats = ExpirySweeper.sweep(batch_size=options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(
+                f"Barrido: {stats['segments']} segmento(s), {stats['itineraries']} itinerario(s), "
+                f"{stats['batches']} lote(s) en {stats['duration_ms']} ms."
+            ))
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
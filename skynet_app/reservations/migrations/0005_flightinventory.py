@@ -0,0 +1,55 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_inventory(apps, schema_editor):
+    Flight = apps.get_model('flight', 'Flight')
+    Seat = apps.get_model('airplane', 'Seat')
+    FlightSegment = apps.get_model('reservations', 'FlightSegment')
+    FlightInventory = apps.get_model('reservations', 'FlightInventory')
+
+    capacity = {}
+    for airplane_id in Seat.objects.values_list('airplane_id', flat=True):
+        capacity[airplane_id] = capacity.get(airplane_id, 0) + 1
+
+    counts = {}
+    for flight_id, status in FlightSegment.objects.filter(seat__isnull=False).values_list('flight_id', 'status'):
+        held, confirmed = counts.get(flight_id, (0, 0))
+        counts[flight_id] = (held + 1, confirmed) if status == 'reserved' else (held, confirmed + 1)
+
+    FlightInventory.objects.bulk_create([
+        FlightInventory(
+            flight_id=flight_id,
+            capacity=capacity.get(airplane_id, 0),
+            held=counts.get(flight_id, (0, 0))[0],
+            confirmed=counts.get(flight_id, (0, 0))[1],
+        )
+        for flight_id, airplane_id in Flight.objects.values_list('id', 'airplane_id')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flight', '0005_alter_airport_city_alter_airport_code_and_more'),
+        ('reservations', '0004_flightsegment_reserved_at'),
+        ('airplane', '0003_remove_airplane_capacity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlightInventory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('capacity', models.IntegerField(default=0)),
+                ('held', models.IntegerField(default=0)),
+                ('confirmed', models.IntegerField(default=0)),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('flight', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='inventory', to='flight.flight')),
+            ],
+        ),
+        migrations.RunPython(build_inventory, migrations.RunPython.noop),
+    ]
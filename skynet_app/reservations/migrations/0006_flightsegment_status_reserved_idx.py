@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airplane', '0005_cabin_layout'),
+        ('flight', '0005_alter_airport_city_alter_airport_code_and_more'),
+        ('reservations', '0005_flightinventory'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flightsegment',
+            index=models.Index(fields=['status', 'reserved_at'], name='segment_status_reserved_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:22
+
+import sys
+
+from django.db import migrations, models
+from django.db.models import Count, F
+
+
+def release_duplicate_seats(apps, schema_editor):
+    """Antes de la restricción: si un (vuelo, asiento) tiene varios segmentos, se queda el asiento
+    el confirmado más antiguo (o el reserved más antiguo si no hay confirmados); al resto se le
+    quita el asiento, conservando la reserva, y se listan para reasignarlos a mano."""
+    FlightSegment = apps.get_model('reservations', 'FlightSegment')
+    FlightInventory = apps.get_model('reservations', 'FlightInventory')
+
+    duplicated = (FlightSegment.objects.filter(seat__isnull=False)
+                  .values('flight_id', 'seat_id').annotate(n=Count('id')).filter(n__gt=1))
+    for dup in duplicated:
+        segments = sorted(
+            FlightSegment.objects.filter(flight_id=dup['flight_id'], seat_id=dup['seat_id'])
+            .values_list('id', 'status'),
+            key=lambda seg: (seg[1] == 'reserved', seg[0]),
+        )
+        losers = segments[1:]
+        FlightSegment.objects.filter(id__in=[seg_id for seg_id, _ in losers]).update(seat=None)
+
+        # Los contadores del inventario solo cuentan segmentos con asiento
+        held = sum(1 for _, status in losers if status == 'reserved')
+        FlightInventory.objects.filter(flight_id=dup['flight_id']).update(
+            held=F('held') - held, confirmed=F('confirmed') - (len(losers) - held))
+
+        sys.stdout.write(
+            f"\n  Vuelo {dup['flight_id']}, asiento {dup['seat_id']}: se conserva el segmento {segments[0][0]}; "
+            f"quedan sin asiento los segmentos {', '.join(str(seg_id) for seg_id, _ in losers)}"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airplane', '0005_cabin_layout'),
+        ('flight', '0005_alter_airport_city_alter_airport_code_and_more'),
+        ('reservations', '0006_flightsegment_status_reserved_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(release_duplicate_seats, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='flightsegment',
+            constraint=models.UniqueConstraint(fields=('flight', 'seat'), name='unique_flight_seat', violation_error_message='Este asiento ya está asignado en este vuelo.'),
+        ),
+    ]
@@ -1,9 +1,10 @@
-from django.db import models
-from django.core.exceptions import ValidationError
+from django.conf import settings
+from django.db import models, transaction
 from airplane.models import Seat
 from flight.models import Flight
 from django.utils import timezone
 from datetime import timedelta
+from decimal import Decimal
 
 class Passenger(models.Model):
     STATUS_CHOICES = [
@@ -30,6 +31,15 @@ class Itinerary(models.Model): #Este vendria a ser reservation pero para varios
     def __str__(self):
         return f"Itinerary {self.reservation_code} - {self.passenger.name}"
     
+class FlightSegmentQuerySet(models.QuerySet):
+    def lapsed(self, now=None):
+        # "reserved" vencidos que el barredor todavía no borró: ya no ocupan el asiento
+        return self.filter(status="reserved", reserved_at__lt=FlightSegment.hold_cutoff(now))
+
+    def live(self, now=None):
+        return self.exclude(status="reserved", reserved_at__lt=FlightSegment.hold_cutoff(now))
+
+
 class FlightSegment(models.Model):#Esta es la tabla intermedia de la que hablamos, donde cargamos varios vuelos a la misma reserva o intinerario
     itinerary = models.ForeignKey(Itinerary, on_delete=models.CASCADE, related_name='segments')
     flight = models.ForeignKey(Flight, on_delete=models.CASCADE)
@@ -38,28 +48,78 @@ class FlightSegment(models.Model):#Esta es la tabla intermedia de la que hablamo
     price = models.DecimalField(max_digits=10, decimal_places=2)
     reserved_at = models.DateTimeField(null=True, blank=True)
 
-    def clean(self):
-        if self.seat and self.flight:
-            conflict = FlightSegment.objects.filter(
-                seat=self.seat,
-                flight=self.flight
-            ).exclude(id=self.id)
+    objects = FlightSegmentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # El barredor de vencidos filtra status="reserved" y reserved_at < corte
+            models.Index(fields=["status", "reserved_at"], name="segment_status_reserved_idx"),
+        ]
+        constraints = [
+            # Un asiento por vuelo lo garantiza la base: dos confirmaciones simultáneas no pueden duplicarlo
+            # (los segmentos sin asiento, seat=NULL, no chocan entre sí)
+            models.UniqueConstraint(
+                fields=["flight", "seat"],
+                name="unique_flight_seat",
+                violation_error_message="Este asiento ya está asignado en este vuelo.",
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Recordamos cómo estaba el segmento para ajustar el inventario del vuelo al guardarlo/borrarlo
+        instance._inventory_state = instance.inventory_state()
+        instance._total_state = instance.total_state()
+        return instance
+
+    @staticmethod
+    def hold_cutoff(now=None):
+        """Los "reserved" con reserved_at anterior a este momento están vencidos."""
+        return (now or timezone.now()) - timedelta(minutes=settings.RESERVATION_HOLD_MINUTES)
 
-            if conflict.exists():
-                raise ValidationError("Este asiento ya está asignado en este vuelo.")
+    def inventory_state(self):
+        """(flight_id, "held" | "confirmed", seat_id) que ocupa este segmento en FlightInventory, o None."""
+        if not self.flight_id or not self.seat_id:
+            return None
+        return (self.flight_id, "held" if self.status == "reserved" else "confirmed", self.seat_id)
+
+    def total_state(self):
+        """(itinerary_id, precio) que este segmento suma al total del itinerario, o None."""
+        if not self.itinerary_id or self.price is None:
+            return None
+        return (self.itinerary_id, Decimal(str(self.price)))
 
     def save(self, *args, **kwargs):
-        self.clean()
+        # Sin consulta previa de asiento ocupado: unique_flight_seat rechaza el INSERT (IntegrityError)
         # Si está reservado, actualizá la marca de tiempo
         if self.status == "reserved" and not self.reserved_at:
             self.reserved_at = timezone.now()
-        super().save(*args, **kwargs)
-        self.itinerary.total_price = sum(seg.price for seg in self.itinerary.segments.all())
-        self.itinerary.save()
+        with transaction.atomic():
+            # post_save ajusta FlightInventory y el total del itinerario (con F(), solo la diferencia)
+            # dentro de esta transacción
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Segment: {self.flight} - Itinerary {self.itinerary.reservation_code}"
 
+class FlightInventory(models.Model): # Contadores de asientos por vuelo, se actualizan con cada cambio de FlightSegment
+    flight = models.OneToOneField(Flight, on_delete=models.CASCADE, related_name='inventory')
+    capacity = models.IntegerField(default=0)
+    held = models.IntegerField(default=0)       # segmentos "reserved"
+    confirmed = models.IntegerField(default=0)  # cualquier otro segmento con asiento
+    version = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def available(self):
+        # lapsed: reserved vencidos que siguen contados en held hasta el próximo barrido
+        # (lo anota FlightInventoryService.get_by_flight); cuentan como libres
+        return max(0, self.capacity - self.held - self.confirmed + getattr(self, "lapsed", 0))
+
+    def __str__(self):
+        return f"Inventory {self.flight_id}: {self.available}/{self.capacity} (v{self.version})"
+
 class Ticket(models.Model):
     itinerary = models.OneToOneField(Itinerary, on_delete=models.CASCADE, related_name='ticket')
     barcode = models.CharField(max_length=100, unique=True)
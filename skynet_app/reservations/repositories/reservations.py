@@ -1,5 +1,6 @@
-from typing import Optional, List
-from django.db.models import Q
+from typing import Optional, List, Dict, Iterable
+from django.db.models import Q, Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from reservations.models import Passenger, Itinerary, FlightSegment, Ticket
 from flight.models import Flight
 from airplane.models import Seat
@@ -102,6 +103,49 @@ class FlightSegmentRepository:
         return list(itinerary.segments.select_related('flight', 'seat'))
 
 
+class SeatAvailabilityRepository:
+    @staticmethod
+    def counts_by_flight(flight_ids: Iterable[int] = None) -> Dict[int, tuple]:
+        """(capacidad, held, confirmed) por vuelo, calculado desde Seat y FlightSegment en una sola query.
+        Sin flight_ids, calcula todos los vuelos."""
+        flights = Flight.objects.all()
+        if flight_ids is not None:
+            flight_ids = set(flight_ids)
+            if not flight_ids:
+                return {}
+            flights = flights.filter(id__in=flight_ids)
+
+        capacity_sq = (Seat.objects
+                       .active()
+                       .filter(airplane_id=OuterRef("airplane_id"))
+                       .order_by()
+                       .values("airplane_id")
+                       .annotate(total=Count("id"))
+                       .values("total"))
+
+        def segments_sq(held: bool):
+            segments = FlightSegment.objects.filter(flight_id=OuterRef("pk"), seat__isnull=False)
+            segments = segments.filter(status="reserved") if held else segments.exclude(status="reserved")
+            return (segments
+                    .order_by()
+                    .values("flight_id")
+                    .annotate(total=Count("id"))
+                    .values("total"))
+
+        rows = (flights
+                .annotate(capacity=Coalesce(Subquery(capacity_sq), Value(0)),
+                          held=Coalesce(Subquery(segments_sq(True)), Value(0)),
+                          confirmed=Coalesce(Subquery(segments_sq(False)), Value(0)))
+                .values_list("id", "capacity", "held", "confirmed"))
+        return {fid: (capacity, held, confirmed) for fid, capacity, held, confirmed in rows}
+
+    @staticmethod
+    def available_by_flight(flight_ids: Iterable[int]) -> Dict[int, int]:
+        """Asientos libres por vuelo (capacidad - ocupados) para todos los vuelos en una sola query."""
+        counts = SeatAvailabilityRepository.counts_by_flight(flight_ids)
+        return {fid: capacity - held - confirmed for fid, (capacity, held, confirmed) in counts.items()}
+
+
 class TicketRepository:
     @staticmethod
     def create(itinerary: Itinerary, barcode: str, status: str = 'issued') -> Ticket:
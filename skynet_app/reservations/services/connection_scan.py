@@ -0,0 +1,174 @@
+from collections import defaultdict, namedtuple
+from datetime import datetime, time, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from flight.models import Flight
+from reservations.services.inventory import FlightInventoryService
+
+# Conexión = un vuelo activo, con lo justo para el escaneo en memoria
+Connection = namedtuple(
+    "Connection",
+    ["flight_id", "route_id", "airplane_id", "departure", "arrival", "base_price"],
+)
+
+
+def search_window(fecha) -> Tuple[datetime, datetime, datetime]:
+    """Devuelve (inicio del día, límite para el primer tramo, fin de la ventana de búsqueda)."""
+    start = timezone.make_aware(datetime.combine(fecha, time.min))
+    first_leg_deadline = start + timedelta(days=1)
+    end = first_leg_deadline + timedelta(hours=settings.ITINERARY_SEARCH_WINDOW_HOURS)
+    return start, first_leg_deadline, end
+
+
+def load_connections(route_ids, start: datetime, end: datetime) -> List[Connection]:
+    """Una sola query: vuelos activos de las rutas candidatas, ordenados por salida."""
+    rows = (Flight.objects
+            .filter(route_id__in=set(route_ids), status="active",
+                    departure_time__gte=start, departure_time__lt=end)
+            .order_by("departure_time", "id")
+            .values_list("id", "route_id", "airplane_id", "departure_time", "arrival_time", "base_price"))
+    return [Connection(*row) for row in rows]
+
+
+def scan_chains(chains: List[List[int]], connections: List[Connection], first_leg_deadline: datetime,
+                min_connection: timedelta) -> Tuple[List[Optional[Tuple[Connection, ...]]], Dict]:
+    """
+    Connection scan sobre cadenas de rutas fijas: una sola pasada por las conexiones
+    (ya ordenadas por salida) calcula, para cada cadena, el itinerario de llegada más temprana
+    respetando el tiempo mínimo de conexión.
+
+    Devuelve (journeys, reached) donde journeys[i] es la tupla de conexiones de la cadena i
+    (o None si no es factible) y reached[(i, pos)] la llegada más temprana a ese tramo.
+    """
+    positions = defaultdict(list)  # route_id -> [(cadena, posición)]
+    for chain_idx, chain in enumerate(chains):
+        for pos, route_id in enumerate(chain):
+            positions[route_id].append((chain_idx, pos))
+
+    reached: Dict[Tuple[int, int], datetime] = {}
+    journeys: Dict[Tuple[int, int], Tuple[Connection, ...]] = {}
+
+    for conn in connections:
+        for chain_idx, pos in positions.get(conn.route_id, ()):
+            if pos == 0:
+                # el primer tramo tiene que salir el día buscado
+                if conn.departure >= first_leg_deadline:
+                    continue
+                prefix = ()
+            else:
+                # Toda conexión previa que llegue a tiempo ya fue escaneada (sale antes que esta)
+                prev_arrival = reached.get((chain_idx, pos - 1))
+                if prev_arrival is None or prev_arrival + min_connection > conn.departure:
+                    continue
+                prefix = journeys[(chain_idx, pos - 1)]
+
+            key = (chain_idx, pos)
+            if key not in reached or conn.arrival < reached[key]:
+                reached[key] = conn.arrival
+                journeys[key] = prefix + (conn,)
+
+    result = [journeys.get((idx, len(chain) - 1)) if chain else None for idx, chain in enumerate(chains)]
+    return result, reached
+
+
+def cheapest_chains(chains: List[List[int]], connections: List[Connection], first_leg_deadline: datetime,
+                    min_connection: timedelta) -> List[Optional[Tuple[Connection, ...]]]:
+    """
+    Variante de scan_chains que minimiza precio en vez de hora de llegada: con las mismas reglas
+    (primer tramo antes del límite, tiempo mínimo de conexión, conexiones de la ventana dada),
+    devuelve para cada cadena el itinerario factible de menor suma de base_price (o None).
+    """
+    positions = defaultdict(list)  # route_id -> [(cadena, posición)]
+    for chain_idx, chain in enumerate(chains):
+        for pos, route_id in enumerate(chain):
+            positions[route_id].append((chain_idx, pos))
+
+    # (cadena, posición) -> [(llegada, precio acumulado, journey)] de todos los tramos alcanzables
+    labels: Dict[Tuple[int, int], List[Tuple[datetime, object, Tuple[Connection, ...]]]] = defaultdict(list)
+
+    for conn in connections:
+        for chain_idx, pos in positions.get(conn.route_id, ()):
+            if pos == 0:
+                if conn.departure >= first_leg_deadline:
+                    continue
+                best_cost, best_prefix = 0, ()
+            else:
+                # Igual que en scan_chains, los tramos previos que llegan a tiempo ya fueron escaneados
+                best_cost, best_prefix = None, None
+                for arrival, cost, journey in labels.get((chain_idx, pos - 1), ()):
+                    if arrival + min_connection <= conn.departure and (best_cost is None or cost < best_cost):
+                        best_cost, best_prefix = cost, journey
+                if best_prefix is None:
+                    continue
+            labels[(chain_idx, pos)].append((conn.arrival, best_cost + conn.base_price, best_prefix + (conn,)))
+
+    result = []
+    for chain_idx, chain in enumerate(chains):
+        finals = labels.get((chain_idx, len(chain) - 1)) if chain else None
+        result.append(min(finals, key=lambda label: label[1])[2] if finals else None)
+    return result
+
+
+def find_connections(chains: List[List[int]], fecha, min_connection_minutes: int = None,
+                     passenger_count: int = None,
+                     on_loaded: Callable[[List[Connection]], None] = None):
+    """Carga (1 query) y escanea los vuelos de todas las cadenas para la fecha dada.
+    Si se indica passenger_count, descarta antes del escaneo los vuelos sin asientos suficientes
+    (1 query más, para todos los vuelos a la vez).
+    on_loaded recibe los vuelos cargados antes de leer su disponibilidad (ej. sellos de SearchCache)."""
+    if min_connection_minutes is None:
+        min_connection_minutes = settings.MIN_CONNECTION_MINUTES
+
+    start, first_leg_deadline, end = search_window(fecha)
+    connections = load_connections({rid for chain in chains for rid in chain}, start, end)
+    if on_loaded:
+        on_loaded(connections)
+
+    availability = {}
+    usable = connections
+    if passenger_count:
+        availability = FlightInventoryService.available_by_flight(c.flight_id for c in connections)
+        usable = [c for c in connections if availability.get(c.flight_id, 0) >= passenger_count]
+
+    journeys, reached = scan_chains(chains, usable, first_leg_deadline,
+                                    timedelta(minutes=min_connection_minutes))
+    return journeys, reached, connections, availability
+
+
+def iter_connections(chains: List[List[int]], fecha, min_connection_minutes: int = None,
+                     passenger_count: int = None,
+                     on_loaded: Callable[[List[Connection]], None] = None) -> Iterator[tuple]:
+    """Versión incremental de find_connections para respuestas en streaming: escanea cadena por cadena
+    y solo carga los vuelos (y su disponibilidad) de las rutas que todavía no se habían cargado.
+    Produce, por cadena y en orden, (journey, reached, connections, availability)."""
+    if min_connection_minutes is None:
+        min_connection_minutes = settings.MIN_CONNECTION_MINUTES
+    min_connection = timedelta(minutes=min_connection_minutes)
+
+    start, first_leg_deadline, end = search_window(fecha)
+    by_route: Dict[int, List[Connection]] = {}
+    availability: Dict[int, int] = {}
+
+    for chain in chains:
+        new_routes = set(chain) - by_route.keys()
+        if new_routes:
+            loaded = load_connections(new_routes, start, end)
+            if on_loaded:
+                on_loaded(loaded)
+            by_route.update({rid: [] for rid in new_routes})
+            for conn in loaded:
+                by_route[conn.route_id].append(conn)
+            if passenger_count and loaded:
+                availability.update(FlightInventoryService.available_by_flight(c.flight_id for c in loaded))
+
+        connections = sorted((c for rid in set(chain) for c in by_route[rid]),
+                             key=lambda c: (c.departure, c.flight_id))
+        usable = connections
+        if passenger_count:
+            usable = [c for c in connections if availability.get(c.flight_id, 0) >= passenger_count]
+
+        journeys, reached = scan_chains([chain], usable, first_leg_deadline, min_connection)
+        yield journeys[0], reached, connections, availability
@@ -0,0 +1,146 @@
+import logging
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from reservations.models import FlightSegment, Itinerary
+from reservations.services.inventory import FlightInventoryService
+
+logger = logging.getLogger(__name__)
+
+LAST_RUN_KEY = "expiry:sweeper:last"
+TOTAL_SEGMENTS_KEY = "expiry:sweeper:segments"
+TOTAL_ITINERARIES_KEY = "expiry:sweeper:itineraries"
+
+_scheduler_lock = threading.Lock()
+_scheduler = None
+
+
+def _add(key: str, amount: int) -> None:
+    if not amount:
+        return
+    if not cache.add(key, amount, timeout=None):
+        try:
+            cache.incr(key, amount)
+        except ValueError:
+            cache.set(key, amount, timeout=None)
+
+
+class ExpirySweeper:
+    """Borra en lotes los segmentos "reserved" vencidos (y los itinerarios que quedan vacíos).
+    Corre fuera del camino de lectura: comando sweep_expired_reservations o el hilo opcional."""
+
+    @staticmethod
+    def cutoff(now=None):
+        return FlightSegment.hold_cutoff(now)
+
+    @staticmethod
+    def _delete(rows) -> tuple:
+        """Borra los segmentos [(id, itinerary_id)] y los itinerarios que quedan vacíos.
+        Devuelve (segmentos, itinerarios) borrados."""
+        # Borrado en bloque: el inventario se descuenta con un UPDATE por vuelo
+        segments = FlightInventoryService.delete_segments(
+            FlightSegment.objects.filter(id__in=[seg_id for seg_id, _ in rows])
+        )
+        _, by_model = (Itinerary.objects
+                       .filter(id__in={itinerary_id for _, itinerary_id in rows}, segments__isnull=True)
+                       .delete())
+        return segments, by_model.get(Itinerary._meta.label, 0)
+
+    @staticmethod
+    def reclaim(seats) -> int:
+        """Borra los "reserved" vencidos que siguen ocupando estos (flight_id, seat_id), para poder
+        volver a vender el asiento sin esperar al próximo barrido. Devuelve cuántos segmentos borró."""
+        seats = set(seats)
+        if not seats:
+            return 0
+        rows = [(seg_id, itinerary_id) for seg_id, itinerary_id, flight_id, seat_id in (
+            FlightSegment.objects.lapsed()
+            .filter(flight_id__in={f for f, _ in seats}, seat_id__in={s for _, s in seats})
+            .values_list("id", "itinerary_id", "flight_id", "seat_id")
+        ) if (flight_id, seat_id) in seats]
+        if not rows:
+            return 0
+        with transaction.atomic():
+            return ExpirySweeper._delete(rows)[0]
+
+    @staticmethod
+    def sweep(batch_size: int = None, max_batches: int = None, now=None) -> dict:
+        """Un pase completo (o hasta max_batches lotes). Cada lote es su propia transacción:
+        los bloqueos duran poco y un corte a mitad de camino no deshace lo ya barrido."""
+        batch_size = batch_size or settings.EXPIRY_SWEEP_BATCH_SIZE
+        started = time.monotonic()
+        stats = {"segments": 0, "itineraries": 0, "batches": 0}
+
+        while max_batches is None or stats["batches"] < max_batches:
+            with transaction.atomic():
+                # Usa el índice (status, reserved_at): solo se leen los vencidos
+                rows = list(FlightSegment.objects
+                            .lapsed(now)
+                            .order_by("reserved_at")
+                            .values_list("id", "itinerary_id")[:batch_size])
+                if not rows:
+                    break
+                segments, itineraries = ExpirySweeper._delete(rows)
+                stats["segments"] += segments
+                stats["itineraries"] += itineraries
+                stats["batches"] += 1
+            if len(rows) < batch_size:
+                break
+
+        stats["duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+        stats["at"] = timezone.now().isoformat()
+        cache.set(LAST_RUN_KEY, stats, timeout=None)
+        _add(TOTAL_SEGMENTS_KEY, stats["segments"])
+        _add(TOTAL_ITINERARIES_KEY, stats["itineraries"])
+        if stats["segments"]:
+            logger.info("Barrido de reservas vencidas: %(segments)s segmentos, %(itineraries)s itinerarios, "
+                        "%(batches)s lotes en %(duration_ms)s ms", stats)
+        return stats
+
+    @staticmethod
+    def stats() -> dict:
+        """Último barrido, totales acumulados y cuántos vencidos esperan el próximo pase."""
+        values = cache.get_many([LAST_RUN_KEY, TOTAL_SEGMENTS_KEY, TOTAL_ITINERARIES_KEY])
+        pending = FlightSegment.objects.lapsed()
+        return {
+            "last_run": values.get(LAST_RUN_KEY),
+            "total_segments": values.get(TOTAL_SEGMENTS_KEY, 0),
+            "total_itineraries": values.get(TOTAL_ITINERARIES_KEY, 0),
+            "pending": pending.count(),
+        }
+
+
+class ExpiryScheduler(threading.Thread):
+    """Hilo daemon que barre cada interval segundos (para despliegues sin cron)."""
+
+    def __init__(self, interval: int):
+        super().__init__(name="expiry-sweeper", daemon=True)
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                close_old_connections()
+                ExpirySweeper.sweep()
+            except Exception:
+                logger.exception("Falló el barrido de reservas vencidas")
+            finally:
+                close_old_connections()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def start_expiry_scheduler(interval: int = None) -> ExpiryScheduler:
+    """Arranca el hilo una sola vez por proceso."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None or not _scheduler.is_alive():
+            _scheduler = ExpiryScheduler(interval or settings.EXPIRY_SWEEP_INTERVAL_SECONDS)
+            _scheduler.start()
+        return _scheduler
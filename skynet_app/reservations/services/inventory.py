@@ -0,0 +1,170 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Now
+
+from reservations.models import FlightInventory, FlightSegment
+from reservations.repositories.reservations import SeatAvailabilityRepository
+from reservations.services.itinerary_totals import ItineraryTotalsService
+from reservations.services.seat_changes import SeatChangeLog
+from reservations.services.seat_events import publish_seat_changes
+from reservations.services.occupancy import STATUS_AVAILABLE, STATUS_HELD, STATUS_CONFIRMED
+
+
+class FlightInventoryService:
+    """Contadores persistentes de asientos por vuelo (capacidad, held, confirmed, versión)."""
+
+    @staticmethod
+    def apply_deltas(deltas: Dict[int, Dict[str, int]], seats: Dict[int, Dict[int, str]] = None) -> None:
+        """Suma/resta held y confirmed por vuelo con expresiones F (atómico en la base) y sube la versión
+        de la grilla; seats indica el nuevo estado de cada asiento que cambió ({flight_id: {seat_id: status}})."""
+        seats = seats or {}
+        for flight_id in set(deltas) | set(seats):
+            delta = deltas.get(flight_id, {})
+            held, confirmed = delta.get("held", 0), delta.get("confirmed", 0)
+            changed = seats.get(flight_id, ())
+            if not held and not confirmed and not changed:
+                continue
+            with transaction.atomic():
+                version = (FlightInventory.objects.select_for_update()
+                           .filter(flight_id=flight_id)
+                           .values_list("version", flat=True)
+                           .first())
+                if version is None:
+                    # Sin registro todavía: lo armamos desde los datos reales (ya incluye este cambio) al confirmar,
+                    # así un vuelo que se borra en la misma transacción no recibe un registro huérfano
+                    transaction.on_commit(lambda flight_id=flight_id: FlightInventoryService.rebuild([flight_id]))
+                    continue
+                FlightInventory.objects.filter(flight_id=flight_id).update(
+                    held=F("held") + held,
+                    confirmed=F("confirmed") + confirmed,
+                    version=F("version") + 1,
+                    updated_at=Now(),
+                )
+                FlightInventoryService._record_change(flight_id, version + 1, changed)
+
+    @staticmethod
+    def _record_change(flight_id: int, version: int, seats: Optional[Dict[int, str]]) -> None:
+        # Solo si la transacción confirma: una versión revertida no puede aparecer en un delta ni en un evento
+        seats = dict(seats) if seats is not None else None
+
+        def record():
+            SeatChangeLog.record(flight_id, version, seats)
+            publish_seat_changes(flight_id, version, seats)
+
+        transaction.on_commit(record)
+
+    @staticmethod
+    def apply_transition(old_state: Optional[tuple], new_state: Optional[tuple]) -> None:
+        """Ajusta el inventario cuando un segmento pasa de old_state a new_state
+        (ver FlightSegment.inventory_state)."""
+        if old_state == new_state:
+            return
+        deltas = defaultdict(lambda: {"held": 0, "confirmed": 0})
+        seats = defaultdict(dict)
+        for state, sign in ((old_state, -1), (new_state, 1)):
+            if state:
+                flight_id, bucket, seat_id = state
+                deltas[flight_id][bucket] += sign
+                # el asiento que se deja queda libre; el que se ocupa toma el estado nuevo
+                seats[flight_id][seat_id] = (STATUS_AVAILABLE if sign < 0
+                                             else STATUS_HELD if bucket == "held" else STATUS_CONFIRMED)
+        FlightInventoryService.apply_deltas(deltas, seats)
+
+    @staticmethod
+    def delete_segments(segments) -> int:
+        """Borra un queryset de FlightSegment en bloque, descuenta el inventario con un UPDATE
+        por vuelo y recalcula los totales de los itinerarios afectados con un solo UPDATE."""
+        with transaction.atomic():
+            deltas = defaultdict(lambda: {"held": 0, "confirmed": 0})
+            seats = defaultdict(dict)
+            itinerary_ids = set()
+            rows = (segments
+                    .order_by()
+                    .values_list("flight_id", "status", "seat_id", "itinerary_id"))
+            for flight_id, status, seat_id, itinerary_id in rows:
+                itinerary_ids.add(itinerary_id)
+                if seat_id is None:
+                    continue
+                bucket = "held" if status == "reserved" else "confirmed"
+                deltas[flight_id][bucket] -= 1
+                seats[flight_id][seat_id] = STATUS_AVAILABLE
+
+            # los receivers de post_delete no vuelven a descontar inventario ni totales
+            segments._inventory_synced = True
+            segments._totals_synced = True
+            deleted, _ = segments.delete()
+            FlightInventoryService.apply_deltas(deltas, seats)
+            ItineraryTotalsService.recompute(itinerary_ids)
+        return deleted
+
+    @staticmethod
+    def rebuild(flight_ids: Iterable[int] = None) -> List[dict]:
+        """Recalcula los contadores desde Seat/FlightSegment, crea los que falten
+        y devuelve las diferencias encontradas [{flight_id, expected, stored}]."""
+        with transaction.atomic():
+            counts = SeatAvailabilityRepository.counts_by_flight(flight_ids)
+            inventories = FlightInventory.objects.select_for_update().filter(flight_id__in=counts.keys())
+            stored = {inv.flight_id: inv for inv in inventories}
+
+            mismatches = []
+            to_create = []
+            for flight_id, (capacity, held, confirmed) in counts.items():
+                expected = {"capacity": capacity, "held": held, "confirmed": confirmed}
+                inv = stored.get(flight_id)
+                if inv is None:
+                    to_create.append(FlightInventory(flight_id=flight_id, **expected))
+                    mismatches.append({"flight_id": flight_id, "expected": expected, "stored": None})
+                    continue
+
+                current = {"capacity": inv.capacity, "held": inv.held, "confirmed": inv.confirmed}
+                if current != expected:
+                    mismatches.append({"flight_id": flight_id, "expected": expected, "stored": current})
+                    FlightInventory.objects.filter(pk=inv.pk).update(
+                        version=F("version") + 1, updated_at=Now(), **expected
+                    )
+                    # No se sabe qué asientos cambiaron: los deltas de la grilla arrancan de cero
+                    FlightInventoryService._record_change(flight_id, inv.version + 1, None)
+
+            FlightInventory.objects.bulk_create(to_create, ignore_conflicts=True)
+        return mismatches
+
+    @staticmethod
+    def sync_capacity(flight_ids: Iterable[int]) -> None:
+        """Recalcula la capacidad (ej. se cambió el avión o su grilla de asientos)."""
+        FlightInventoryService.rebuild(flight_ids)
+
+    @staticmethod
+    def _with_lapsed(inventories):
+        """Anota cuántos "reserved" vencidos (todavía sin barrer) tiene cada vuelo, en la misma query:
+        FlightInventory.available los cuenta como libres."""
+        lapsed = (FlightSegment.objects.lapsed()
+                  .filter(flight_id=OuterRef("flight_id"), seat__isnull=False)
+                  .order_by()
+                  .values("flight_id")
+                  .annotate(total=Count("id"))
+                  .values("total"))
+        return inventories.annotate(lapsed=Coalesce(Subquery(lapsed), Value(0)))
+
+    @staticmethod
+    def get_by_flight(flight_ids: Iterable[int]) -> Dict[int, FlightInventory]:
+        """Inventario por vuelo: una lectura, y se crea solo lo que falte."""
+        flight_ids = set(flight_ids)
+        if not flight_ids:
+            return {}
+        inventories = FlightInventoryService._with_lapsed(FlightInventory.objects.filter(flight_id__in=flight_ids))
+        inventories = {inv.flight_id: inv for inv in inventories}
+        missing = flight_ids - inventories.keys()
+        if missing:
+            FlightInventoryService.rebuild(missing)
+            inventories.update({
+                inv.flight_id: inv
+                for inv in FlightInventoryService._with_lapsed(FlightInventory.objects.filter(flight_id__in=missing))
+            })
+        return inventories
+
+    @staticmethod
+    def available_by_flight(flight_ids: Iterable[int]) -> Dict[int, int]:
+        return {fid: inv.available for fid, inv in FlightInventoryService.get_by_flight(flight_ids).items()}
@@ -0,0 +1,74 @@
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from reservations.models import FlightSegment, Itinerary
+
+
+def _segments_total():
+    """Subquery con la suma de precios de los segmentos del itinerario de afuera (0 si no tiene)."""
+    total = (FlightSegment.objects
+             .filter(itinerary_id=OuterRef("pk"))
+             .order_by()
+             .values("itinerary_id")
+             .annotate(total=Sum("price"))
+             .values("total"))
+    return Coalesce(Subquery(total), Value(Decimal(0)),
+                    output_field=DecimalField(max_digits=10, decimal_places=2))
+
+
+class ItineraryTotalsService:
+    """Itinerary.total_price mantenido en forma incremental: cada alta, cambio de precio o baja
+    de un segmento suma o resta su diferencia con una expresión F (sin releer los demás segmentos)."""
+
+    @staticmethod
+    def apply_deltas(deltas: Dict[int, Decimal]) -> None:
+        """Suma amount al total de cada itinerario ({itinerary_id: amount}), atómico en la base."""
+        for itinerary_id, amount in deltas.items():
+            if amount:
+                Itinerary.objects.filter(id=itinerary_id).update(total_price=F("total_price") + amount)
+
+    @staticmethod
+    def apply_transition(old_state: Optional[tuple], new_state: Optional[tuple]) -> None:
+        """Ajusta los totales cuando un segmento pasa de old_state a new_state
+        (ver FlightSegment.total_state)."""
+        if old_state == new_state:
+            return
+        deltas = defaultdict(Decimal)
+        for state, sign in ((old_state, -1), (new_state, 1)):
+            if state:
+                itinerary_id, price = state
+                deltas[itinerary_id] += sign * price
+        ItineraryTotalsService.apply_deltas(deltas)
+
+    @staticmethod
+    def recompute(itinerary_ids: Iterable[int] = None) -> int:
+        """Recalcula los totales desde FlightSegment con un solo UPDATE (sirve después de escrituras
+        en bloque que no disparan señales). Devuelve cuántos itinerarios se actualizaron."""
+        itineraries = Itinerary.objects.all()
+        if itinerary_ids is not None:
+            itineraries = itineraries.filter(id__in=set(itinerary_ids))
+        return itineraries.update(total_price=_segments_total())
+
+    @staticmethod
+    def rebuild(itinerary_ids: Iterable[int] = None) -> List[dict]:
+        """Corrige los totales que no coinciden con sus segmentos y devuelve
+        las diferencias encontradas [{itinerary_id, expected, stored}]."""
+        with transaction.atomic():
+            itineraries = Itinerary.objects.select_for_update()
+            if itinerary_ids is not None:
+                itineraries = itineraries.filter(id__in=set(itinerary_ids))
+            mismatches = [
+                {"itinerary_id": itinerary_id, "expected": expected, "stored": stored}
+                for itinerary_id, stored, expected in (itineraries
+                                                       .annotate(expected=_segments_total())
+                                                       .exclude(total_price=F("expected"))
+                                                       .values_list("id", "total_price", "expected"))
+            ]
+            if mismatches:
+                ItineraryTotalsService.recompute(m["itinerary_id"] for m in mismatches)
+        return mismatches
@@ -0,0 +1,94 @@
+STATUS_AVAILABLE = "available"
+STATUS_HELD = "held"
+STATUS_CONFIRMED = "confirmed"
+
+_HEADER_BYTES = 4
+
+
+class SeatOccupancy:
+    """Ocupación de un vuelo como dos mapas de bits indexados por posición en el layout del avión:
+    un plano de asientos retenidos (held) y otro de confirmados. Confirmado tiene prioridad."""
+
+    __slots__ = ("size", "held", "confirmed")
+
+    def __init__(self, size: int, held: int = 0, confirmed: int = 0):
+        self.size = size
+        self.held = held
+        self.confirmed = confirmed
+
+    def _bit(self, pos: int) -> int:
+        if not 0 <= pos < self.size:
+            raise IndexError(f"Posición de asiento fuera de rango: {pos}")
+        return 1 << pos
+
+    # -------------------- Escritura --------------------
+
+    def hold(self, pos: int) -> None:
+        self.held |= self._bit(pos)
+
+    def confirm(self, pos: int) -> None:
+        bit = self._bit(pos)
+        self.confirmed |= bit
+        self.held &= ~bit
+
+    def release(self, pos: int) -> None:
+        mask = ~self._bit(pos)
+        self.held &= mask
+        self.confirmed &= mask
+
+    # -------------------- Lectura --------------------
+
+    def status(self, pos: int) -> str:
+        bit = self._bit(pos)
+        if self.confirmed & bit:
+            return STATUS_CONFIRMED
+        if self.held & bit:
+            return STATUS_HELD
+        return STATUS_AVAILABLE
+
+    def is_free(self, pos: int) -> bool:
+        return not (self.held | self.confirmed) & self._bit(pos)
+
+    @property
+    def occupied(self) -> int:
+        return self.held | self.confirmed
+
+    @property
+    def held_count(self) -> int:
+        return (self.held & ~self.confirmed).bit_count()
+
+    @property
+    def confirmed_count(self) -> int:
+        return self.confirmed.bit_count()
+
+    @property
+    def free_count(self) -> int:
+        return self.size - self.occupied.bit_count()
+
+    def copy(self) -> "SeatOccupancy":
+        return SeatOccupancy(self.size, self.held, self.confirmed)
+
+    # -------------------- Serialización --------------------
+
+    def to_bytes(self) -> bytes:
+        """[tamaño (4 bytes)] + plano held + plano confirmed, ceil(size / 8) bytes cada uno."""
+        width = (self.size + 7) // 8
+        return (self.size.to_bytes(_HEADER_BYTES, "big")
+                + self.held.to_bytes(width, "little")
+                + self.confirmed.to_bytes(width, "little"))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SeatOccupancy":
+        size = int.from_bytes(data[:_HEADER_BYTES], "big")
+        width = (size + 7) // 8
+        planes = data[_HEADER_BYTES:]
+        return cls(size,
+                   held=int.from_bytes(planes[:width], "little"),
+                   confirmed=int.from_bytes(planes[width:2 * width], "little"))
+
+    def __eq__(self, other):
+        return (isinstance(other, SeatOccupancy)
+                and (self.size, self.held, self.confirmed) == (other.size, other.held, other.confirmed))
+
+    def __repr__(self):
+        return f"SeatOccupancy(size={self.size}, held={self.held_count}, confirmed={self.confirmed_count})"
@@ -1,22 +1,37 @@
-from typing import Optional, List, Tuple
+from typing import Iterator, Optional, List, Tuple
 from django.core.exceptions import ValidationError
-from django.db.models import OuterRef, Subquery, Value
+from django.db.models import OuterRef, Subquery, Value, F
 from django.db.models.functions import Coalesce
 from django.utils import timezone
-from datetime import timedelta
-from reservations.models import Passenger, Itinerary, FlightSegment, Ticket
-from flight.models import Flight, Route
+from datetime import timedelta, datetime, time
+from reservations.models import Passenger, Itinerary, FlightSegment, FlightInventory, Ticket
+from flight.models import Airport, Flight, Route
 from airplane.models import Seat
+from airplane.services.cabin_layout import get_cabin_geometry, seat_price
 from reservations.repositories.reservations import (
     PassengerRepository,
     ItineraryRepository,
     FlightSegmentRepository,
     TicketRepository
 )
-from reservations.services.route_finder import find_route_chain
+from reservations.services.route_finder import find_k_shortest_route_chains
+from reservations.services.route_graph import get_route_graph
+from reservations.services.connection_scan import (
+    cheapest_chains, find_connections, iter_connections, load_connections, search_window
+)
+from reservations.services.expiry import ExpirySweeper
+from reservations.services.inventory import FlightInventoryService
+from reservations.services.occupancy import STATUS_HELD, STATUS_CONFIRMED
+from reservations.services.seat_assignment import find_seat_block
+from reservations.services.seat_holds import SeatHoldRegistry
+from reservations.services.seat_read import SeatReadService
+from reservations.services.search_cache import SearchCache, bump_flights
+from bisect import bisect_left
 from collections import namedtuple
+from django.conf import settings
 import uuid
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.utils.crypto import get_random_string
 
 
 # NamedTuple para opciones de itinerario
@@ -79,36 +94,15 @@ class ItineraryService:
         return Itinerary.objects.create(passenger=passenger, reservation_code=reservation_code)
 
     @staticmethod
-    def create_auto(passenger: Passenger, origin_code: str, destination_code: str) -> Itinerary:
-        routes = find_route_chain(origin_code, destination_code)
-        if not routes:
+    def create_auto(passenger: Passenger, origin_code: str, destination_code: str, fecha=None) -> Itinerary:
+        # Los mismos vuelos que devolvería la búsqueda (fecha, conexiones y asientos ya validados)
+        itineraries, _ = RouteService.find_available_itineraries(
+            origin_code, destination_code, fecha or timezone.localdate(), 1
+        )
+        if not itineraries:
             raise ValidationError("No route found between selected airports.")
 
-        reservation_code = str(uuid.uuid4())[:8].upper()
-        itinerary = ItineraryService.create(passenger, reservation_code)
-
-        for route in routes:
-            flight = Flight.objects.filter(route=route).first()
-            if not flight:
-                raise ValidationError(f"No flight found for route {route}")
-
-            seat = Seat.objects.filter(airplane=flight.airplane, status='available').first()
-            if not seat:
-                raise ValidationError(f"No available seat for flight {flight}")
-
-            # Cambiás el estado del asiento si querés reservarlo
-            seat.status = 'reserved'
-            seat.save()
-
-            FlightSegmentRepository.create(
-                itinerary=itinerary,
-                flight=flight,
-                seat=seat,
-                price=flight.base_price,
-                status="confirmed"
-            )
-
-        return itinerary
+        return ReservationService.create_automatic_reservations([passenger.id], itineraries[0]["flight_ids"])[0]
 
     @staticmethod
     def update(itinerary_id: int, data: dict) -> Itinerary:
@@ -135,21 +129,34 @@ class ItineraryService:
 
 # -------------------- FlightSegment Service --------------------
 
+class SeatConflictError(ValidationError):
+    """El asiento ya tiene un segmento en ese vuelo (violación de unique_flight_seat)."""
+
+    def __init__(self, flight_id: int, seat_id: int):
+        super().__init__("The seat is already assigned.")
+        self.flight_id = flight_id
+        self.seat_id = seat_id
+
+
 class FlightSegmentService:
     @staticmethod
     def create(itinerary: Itinerary, flight: Flight, seat: Seat, price: float, status: str) -> FlightSegment:
-        # Validar que el asiento no esté asignado        
-        if FlightSegment.objects.filter(seat=seat, flight=flight).exists():
-            raise ValidationError("The seat is already assigned.")
-
         # Validar que el pasajero no tenga ya una reserva para ese vuelo
-        if FlightSegment.objects.filter(
+        if FlightSegment.objects.live().filter(
             flight=flight,
             itinerary__passenger=itinerary.passenger
         ).exists():
             raise ValidationError("This passenger already has a reservation for this flight.")
 
-        return FlightSegmentRepository.create(itinerary, flight, seat, price, status)
+        if seat is not None:
+            ExpirySweeper.reclaim([(flight.id, seat.id)])
+
+        # Insert primero: el asiento ocupado lo detecta la base (FlightSegment.save corre en un savepoint,
+        # así que la transacción de afuera sigue utilizable después del conflicto)
+        try:
+            return FlightSegmentRepository.create(itinerary, flight, seat, price, status)
+        except IntegrityError:
+            raise SeatConflictError(flight.id, seat.id)
 
 
     @staticmethod
@@ -158,11 +165,10 @@ class FlightSegmentService:
         if not segment:
             raise ValidationError("Flight segment not found.")
 
-        if "seat" in data:
-            if FlightSegment.objects.exclude(id=segment.id).filter(seat=data["seat"]).exists():
-                raise ValidationError("Seat already assigned.")
-
-        return FlightSegmentRepository.update(segment, **data)
+        try:
+            return FlightSegmentRepository.update(segment, **data)
+        except IntegrityError:
+            raise SeatConflictError(segment.flight_id, segment.seat_id)
 
     @staticmethod
     def delete(segment_id: int) -> bool:
@@ -222,76 +228,211 @@ class TicketService:
 
 class RouteService:
     @staticmethod
-    def find_available_routes(origin_code: str, destination_code: str, fecha, passenger_count: int) -> List[List[int]]:
-        """Encuentra rutas disponibles entre aeropuertos en una fecha específica,
-        validando que cada vuelo tenga suficientes asientos disponibles."""
-        route_chains = find_route_chain(origin_code, destination_code)
+    def find_available_itineraries(origin_code: str, destination_code: str, fecha, passenger_count: int,
+                                   max_legs: int = None, k: int = None,
+                                   min_connection_minutes: int = None) -> Tuple[List[dict], List[str]]:
+        """Como find_available_routes, pero devuelve también los vuelos elegidos por cadena:
+        [{route_ids, flight_ids, departure_time, arrival_time}].
+        Los vuelos salen de un único escaneo (connection scan) sobre los vuelos activos de la ventana.
+        Las búsquedas idénticas se sirven desde SearchCache mientras no cambien rutas, vuelos o asientos."""
+        cache_key = SearchCache.make_key(origin_code, destination_code, fecha, passenger_count,
+                                         max_legs, k, min_connection_minutes)
+        cached = SearchCache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        # Cada sello se toma antes de leer lo que cubre: red → rutas → vuelos → disponibilidad
+        stamps = SearchCache.stamps()
+        route_chains = find_k_shortest_route_chains(origin_code, destination_code, k=k, max_legs=max_legs)
 
         if not route_chains:
-            return [], ["No se encontraron rutas entre los aeropuertos seleccionados."]
+            result = [], ["No se encontraron rutas entre los aeropuertos seleccionados."]
+            SearchCache.set(cache_key, result, stamps)
+            return result
+
+        chains_ids = [[r.id for r in chain] for chain in route_chains]
+        SearchCache.stamps(route_ids={rid for chain in chains_ids for rid in chain}, into=stamps)
+        journeys, reached, connections, availability = find_connections(
+            chains_ids, fecha, min_connection_minutes, passenger_count=passenger_count,
+            on_loaded=lambda loaded: SearchCache.stamps(flight_ids=[c.flight_id for c in loaded], into=stamps),
+        )
+        routes_with_flights = {c.route_id for c in connections}
+        routes_with_seats = {c.route_id for c in connections
+                             if availability.get(c.flight_id, 0) >= passenger_count}
 
-        rutas_validas = []
+        itinerarios = []
         errores = []
 
-        for chain in route_chains:
-            vuelos = []
-            ruta_valida = True
-
-            for tramo in chain:
-                vuelo = Flight.objects.filter(
-                    route=tramo,
-                    departure_time__date=fecha,
-                    status="active"
-                ).first()
-
-                if not vuelo:
-                    errores.append(f"No hay vuelo activo para la ruta {tramo}")
-                    ruta_valida = False
-                    break
-
-                available_seats_count = Seat.objects.filter(
-                    airplane=vuelo.airplane
-                ).exclude(
-                    id__in=FlightSegment.objects.filter(flight=vuelo).values_list("seat_id", flat=True)
-                ).count()
-
-                if available_seats_count < passenger_count:
-                    errores.append(
-                        f"Vuelo {vuelo} no tiene suficientes asientos disponibles: se necesitan {passenger_count}, hay {available_seats_count}."
-                    )
-                    ruta_valida = False
-                    break
+        for chain_idx, (chain, journey) in enumerate(zip(route_chains, journeys)):
+            if not journey:
+                # Primer tramo al que no se pudo llegar, para explicar el motivo
+                pos = next(p for p in range(len(chain)) if (chain_idx, p) not in reached)
+                errores.append(RouteService._missing_leg_error(chain[pos], routes_with_flights,
+                                                               routes_with_seats, passenger_count))
+                continue
+
+            itinerarios.append({
+                "route_ids": [r.id for r in chain],
+                "flight_ids": [c.flight_id for c in journey],
+                "departure_time": journey[0].departure,
+                "arrival_time": journey[-1].arrival,
+            })
+
+        SearchCache.set(cache_key, (itinerarios, errores), stamps)
+        return itinerarios, errores
+
+    @staticmethod
+    def _missing_leg_error(tramo: Route, routes_with_flights: set, routes_with_seats: set,
+                           passenger_count: int) -> str:
+        if tramo.id not in routes_with_flights:
+            return f"No hay vuelo activo para la ruta {tramo}"
+        if tramo.id not in routes_with_seats:
+            return (f"Ningún vuelo de la ruta {tramo} tiene suficientes asientos disponibles: "
+                    f"se necesitan {passenger_count}.")
+        return f"No hay conexión a tiempo para la ruta {tramo}"
 
-                vuelos.append(vuelo)
+    @staticmethod
+    def iter_available_itineraries(origin_code: str, destination_code: str, fecha, passenger_count: int,
+                                   errores: List[str], max_legs: int = None, k: int = None,
+                                   min_connection_minutes: int = None) -> Iterator[dict]:
+        """Versión incremental de find_available_itineraries (para streaming): produce cada itinerario
+        apenas su cadena queda validada, en el mismo orden, y agrega los motivos de descarte a errores.
+        Si la búsqueda termina completa, el resultado queda en SearchCache igual que en la versión en bloque."""
+        cache_key = SearchCache.make_key(origin_code, destination_code, fecha, passenger_count,
+                                         max_legs, k, min_connection_minutes)
+        cached = SearchCache.get(cache_key)
+        if cached is not None:
+            yield from cached[0]
+            errores.extend(cached[1])
+            return
+
+        stamps = SearchCache.stamps()
+        route_chains = find_k_shortest_route_chains(origin_code, destination_code, k=k, max_legs=max_legs)
+        if not route_chains:
+            errores.append("No se encontraron rutas entre los aeropuertos seleccionados.")
+            SearchCache.set(cache_key, ([], list(errores)), stamps)
+            return
+
+        chains_ids = [[r.id for r in chain] for chain in route_chains]
+        SearchCache.stamps(route_ids={rid for chain in chains_ids for rid in chain}, into=stamps)
+        itinerarios, chain_errors = [], []
+        scans = iter_connections(
+            chains_ids, fecha, min_connection_minutes, passenger_count=passenger_count,
+            on_loaded=lambda loaded: SearchCache.stamps(flight_ids=[c.flight_id for c in loaded], into=stamps),
+        )
+
+        for chain, (journey, reached, connections, availability) in zip(route_chains, scans):
+            if not journey:
+                pos = next(p for p in range(len(chain)) if (0, p) not in reached)
+                routes_with_flights = {c.route_id for c in connections}
+                routes_with_seats = {c.route_id for c in connections
+                                     if availability.get(c.flight_id, 0) >= passenger_count}
+                chain_errors.append(RouteService._missing_leg_error(chain[pos], routes_with_flights,
+                                                                    routes_with_seats, passenger_count))
+                continue
 
-            if ruta_valida and len(vuelos) == len(chain):
-                rutas_validas.append([r.id for r in chain])
+            itinerary = {
+                "route_ids": [r.id for r in chain],
+                "flight_ids": [c.flight_id for c in journey],
+                "departure_time": journey[0].departure,
+                "arrival_time": journey[-1].arrival,
+            }
+            itinerarios.append(itinerary)
+            yield itinerary
 
-        return rutas_validas, errores
+        errores.extend(chain_errors)
+        SearchCache.set(cache_key, (itinerarios, chain_errors), stamps)
+
+    @staticmethod
+    def find_available_routes(origin_code: str, destination_code: str, fecha, passenger_count: int,
+                              max_legs: int = None, k: int = None) -> List[List[int]]:
+        """Encuentra rutas disponibles entre aeropuertos en una fecha específica,
+        validando que cada vuelo tenga suficientes asientos disponibles.
+        Solo evalúa las k cadenas más cortas de hasta max_legs tramos (por defecto, settings)."""
+        itinerarios, errores = RouteService.find_available_itineraries(
+            origin_code, destination_code, fecha, passenger_count, max_legs=max_legs, k=k
+        )
+        return [it["route_ids"] for it in itinerarios], errores
 
 
     @staticmethod
-    def get_itinerary_options(route_chains_ids: List[List[int]], search_date: str) -> Tuple[List[ItineraryOption], List]:
-        """Obtiene las opciones de itinerario con precios y duraciones"""
+    def reachable_destinations(origin_code: str) -> List[dict]:
+        """Aeropuertos alcanzables desde origin_code con la mínima cantidad de tramos,
+        leídos de la matriz de alcanzabilidad del grafo de rutas (una query para los datos de aeropuertos)."""
+        hops = get_route_graph().reachable_from(origin_code.strip().upper())
+        if not hops:
+            return []
+        airports = Airport.objects.filter(code__in=hops.keys()).order_by("code")
+        destinations = [
+            {"id": a.id, "code": a.code, "name": a.name, "city": a.city, "min_legs": hops[a.code]}
+            for a in airports
+        ]
+        destinations.sort(key=lambda d: d["min_legs"])
+        return destinations
+
+    @staticmethod
+    def fare_calendar(origin_code: str, destination_code: str, start_date, end_date, passenger_count: int,
+                      max_legs: int = None, k: int = None, min_connection_minutes: int = None) -> List[dict]:
+        """Precio del itinerario factible más barato por día entre start_date y end_date (inclusive).
+        Las cadenas de rutas se calculan una sola vez; los vuelos de todo el rango (con la ventana de
+        conexiones del último día) y su disponibilidad se cargan con una query cada uno, y cada día
+        se resuelve en memoria con las mismas reglas que la búsqueda (tiempo mínimo de conexión y
+        ventana incluidos), minimizando el precio total en vez de la hora de llegada."""
+        if min_connection_minutes is None:
+            min_connection_minutes = settings.MIN_CONNECTION_MINUTES
+        days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+        route_chains = find_k_shortest_route_chains(origin_code, destination_code, k=k, max_legs=max_legs)
+        if not route_chains or not days:
+            return [{"date": day, "lowest_price": None, "route_ids": None} for day in days]
+
+        chains_ids = [[r.id for r in chain] for chain in route_chains]
+        range_start, _, _ = search_window(days[0])
+        _, _, range_end = search_window(days[-1])
+        connections = load_connections({rid for chain in chains_ids for rid in chain}, range_start, range_end)
+        availability = FlightInventoryService.available_by_flight(c.flight_id for c in connections)
+        usable = [c for c in connections if availability.get(c.flight_id, 0) >= passenger_count]
+        departures = [c.departure for c in usable]
+        min_connection = timedelta(minutes=min_connection_minutes)
+
+        calendar = []
+        for day in days:
+            day_start, first_leg_deadline, day_end = search_window(day)
+            # usable viene ordenado por salida: la ventana del día es un tramo contiguo
+            window = usable[bisect_left(departures, day_start):bisect_left(departures, day_end)]
+            journeys = cheapest_chains(chains_ids, window, first_leg_deadline, min_connection)
+
+            best_price, best_chain = None, None
+            for chain, journey in zip(chains_ids, journeys):
+                if not journey:
+                    continue
+                total = sum(c.base_price for c in journey)
+                if best_price is None or total < best_price:
+                    best_price, best_chain = total, chain
+            calendar.append({"date": day, "lowest_price": best_price, "route_ids": best_chain})
+        return calendar
+
+    @staticmethod
+    def get_itinerary_options(route_chains_ids: List[List[int]],
+                              flight_chains_ids: List[List[int]]) -> Tuple[List[ItineraryOption], List]:
+        """Opciones de itinerario con el precio de los vuelos que eligió la búsqueda (uno por tramo)"""
+        routes = Route.objects.select_related("origin_airport", "destination_airport").in_bulk(
+            {rid for chain in route_chains_ids for rid in chain}
+        )
+        flights = Flight.objects.in_bulk({fid for chain in flight_chains_ids for fid in chain})
         options = []
         rutas_completas = []
 
-        for idx, chain_ids in enumerate(route_chains_ids, 1):
-            routes = Route.objects.filter(id__in=chain_ids).select_related(
-                "origin_airport", "destination_airport"
-            )
-            if not routes:
+        for idx, (chain_ids, flight_ids) in enumerate(zip(route_chains_ids, flight_chains_ids), 1):
+            chain = [routes[rid] for rid in chain_ids if rid in routes]
+            chain_flights = [flights.get(fid) for fid in flight_ids]
+            if not chain or len(chain) != len(chain_ids) or not all(chain_flights):
                 continue
-                
-            flights = Flight.objects.filter(route__in=chain_ids, status="active")
-           
-            rutas_completas.append(routes)
-
-            summary = " → ".join([r.origin_airport.code for r in routes] + 
-                               [routes.last().destination_airport.code])
-            
-            duration = sum(f.route.duration for f in flights)
-            total_price = sum(f.base_price for f in flights)
+
+            rutas_completas.append(chain)
+
+            summary = " → ".join([r.origin_airport.code for r in chain] + [chain[-1].destination_airport.code])
+            duration = sum(r.estimated_duration or 0 for r in chain)
+            total_price = sum(f.base_price for f in chain_flights)
             options.append(ItineraryOption(idx, summary, duration, total_price))
 
         return options, rutas_completas
@@ -301,30 +442,53 @@ class RouteService:
 
 class SeatService:
     @staticmethod
-    def _remove_expired_segments():
-        EXPIRATION_MINUTES = 5
-        expired_segments = FlightSegment.objects.filter(
-            status="reserved",
-            reserved_at__lt=timezone.now() - timedelta(minutes=EXPIRATION_MINUTES)
-        )
-        itinerary_ids = set()
-        for seg in expired_segments:
-            itinerary_ids.add(seg.itinerary_id)
-            seg.delete()
-        for itin_id in itinerary_ids:
-            if not FlightSegment.objects.filter(itinerary_id=itin_id).exists():
-                itinerary = ItineraryRepository.get_by_id(itin_id)
-                if itinerary:
-                    ItineraryRepository.delete(itinerary)
-
-    @staticmethod
-    def get_available_seats_for_passengers(passenger_ids: List[int], route_ids: List[int]) -> List[dict]:
-        """Obtiene asientos disponibles con su estado (disponible, reservado, ocupado)"""
-        SeatService._remove_expired_segments()
-            
+    def get_flights_in_order(flight_ids: List[int]) -> List[Optional[Flight]]:
+        """Exactamente los vuelos que eligió la búsqueda, en el orden del itinerario
+        (None si alguno ya no está activo), con una query."""
+        flights = (Flight.objects
+                   .filter(status="active")
+                   .select_related("airplane__cabin_layout", "route__origin_airport", "route__destination_airport")
+                   .in_bulk(flight_ids))
+        return [flights.get(fid) for fid in flight_ids]
+
+    @staticmethod
+    def _seats_by_flight(flights) -> dict:
+        """{flight_id: [asientos con segment_status]} para todos los vuelos en una sola query:
+        Seat × vuelos de su avión, con el estado del segmento (si existe) como subquery."""
+        flight_ids = [f.id for f in flights if f]
+        if not flight_ids:
+            return {}
+
+        seg_status_sq = (FlightSegment.objects
+            .live()
+            .filter(seat=OuterRef("pk"), flight=OuterRef("airplane__flights"))
+            .values("status")[:1])
+
+        rows = (Seat.objects
+            .filter(airplane__flights__in=flight_ids)
+            .active()
+            .annotate(
+                flight_id=F("airplane__flights"),
+                segment_status=Coalesce(Subquery(seg_status_sq), Value("available")),
+            )
+            .values("flight_id", "id", "row", "column", "number", "type", "segment_status")
+            .order_by("flight_id", "row", "column"))
+
+        seats_by_flight = {fid: [] for fid in flight_ids}
+        for seat in rows:
+            fid = seat.pop("flight_id")
+            # armamos un "code" legible tipo "12A"
+            seat["code"] = f"{seat['row']}{seat['column'] or ''}"
+            seats_by_flight[fid].append(seat)
+        return seats_by_flight
+
+    @staticmethod
+    def get_available_seats_for_passengers(passenger_ids: List[int], flight_ids: List[int]) -> List[dict]:
+        """Obtiene asientos disponibles con su estado (disponible, reservado, ocupado) en los vuelos elegidos.
+        El estado de cada vuelo se calcula una vez y todos los pasajeros comparten la misma lista."""
         passengers = Passenger.objects.filter(id__in=passenger_ids)
-        routes = Route.objects.filter(id__in=route_ids)
-        flights = [Flight.objects.filter(route=route, status="active").first() for route in routes]
+        flights = SeatService.get_flights_in_order(flight_ids)
+        seats_by_flight = SeatService._seats_by_flight(flights)
 
         seat_data = []
 
@@ -333,83 +497,60 @@ class SeatService:
                 if not flight:
                     continue
 
-                # Subquery para obtener el estado del segmento de vuelo (si existe) para ese asiento y vuelo
-                segment_status_subquery = FlightSegment.objects.filter(
-                    seat=OuterRef("pk"),
-                    flight=flight
-                ).values("status")[:1]
-
-                # Anotamos el estado, si no hay segmento asociado, es "available"
-                available_seats = Seat.objects.filter(
-                    airplane=flight.airplane
-                ).annotate(
-                    segment_status=Coalesce(
-                        Subquery(segment_status_subquery),
-                        Value("available")
-                    )
-                )
-
                 key = f"{p_index}_{f_index}"
                 seat_data.append({
                     "key": key,
                     "passenger": passenger,
                     "flight": flight,
-                    "seats": available_seats
+                    "seats": seats_by_flight[flight.id],
                 })
 
         return seat_data
-    
-    @staticmethod
-    def get_available_seats_for_passengers_docs(passenger_docs: List[str], route_ids: List[int]) -> List[dict]:
-        """Asientos por pasajero(DNI) × vuelo(route_ids). JSON-ready."""
-        SeatService._remove_expired_segments()
 
+    @staticmethod
+    def get_available_seats_for_passengers_docs(passenger_docs: List[str], route_ids: List[int]) -> dict:
+        """Asientos por pasajero(DNI) × vuelo(route_ids). JSON-ready.
+        Los asientos van una sola vez por vuelo en "flights"; cada entrada de "assignments"
+        referencia su vuelo por id en lugar de repetir la lista."""
         docs = [d for d in passenger_docs if d]
+        empty = {"flights": {}, "assignments": []}
         if not docs or not route_ids:
-            return []
+            return empty
 
-        routes = Route.objects.filter(id__in=route_ids)
         flights = list(
             Flight.objects
-            .filter(route__in=routes)                 # poné status="active" si existe en tu modelo
+            .filter(route_id__in=route_ids)                 # poné status="active" si existe en tu modelo
             .select_related("airplane", "route")
         )
         if not flights:
-            return []
+            return empty
 
-        out: List[dict] = []
+        seats_by_flight = SeatService._seats_by_flight(flights)
 
-        for p_idx, doc in enumerate(dict.fromkeys(docs)):  
+        flights_payload = {
+            flight.id: {
+                "id": flight.id,
+                "code": getattr(flight, "code", str(flight.id)),
+                "seats": seats_by_flight[flight.id],
+            }
+            for flight in flights
+        }
+
+        assignments: List[dict] = []
+        for p_idx, doc in enumerate(dict.fromkeys(docs)):
             for f_idx, flight in enumerate(flights):
-                seg_status_sq = (FlightSegment.objects
-                    .filter(seat=OuterRef("pk"), flight=flight)
-                    .values("status")[:1])
-
-                seats_qs = (Seat.objects
-                    .filter(airplane=flight.airplane)
-                    .annotate(segment_status=Coalesce(Subquery(seg_status_sq), Value("available")))
-                    .values("id", "row", "column", "number", "type", "segment_status")
-                    .order_by("row", "column"))
-
-                seats = list(seats_qs)
-                # armamos un "code" legible tipo "12A"
-                for s in seats:
-                    s["code"] = f"{s.get('row')}{s.get('column') or ''}"
-
-                out.append({
+                assignments.append({
                     "key": f"{p_idx}_{f_idx}",
                     "passenger_document": doc,
-                    "flight": {"id": flight.id, "code": getattr(flight, "code", str(flight.id))},
-                    "seats": seats,
+                    "flight_id": flight.id,
                 })
 
-        return out
-
+        return {"flights": flights_payload, "assignments": assignments}
 
     @staticmethod
     def is_seat_available(seat_id: int, flight: Flight) -> bool:
         """Verifica si un asiento está disponible para un vuelo"""
-        return not FlightSegment.objects.filter(
+        return not FlightSegment.objects.live().filter(
             seat_id=seat_id, 
             flight=flight
         ).exists()
@@ -427,20 +568,104 @@ class ReservationService:
         return reservation_code
     
     @staticmethod
-    def create_reservations_with_seats(passenger_ids: List[int], route_ids: List[int], post_data: dict, status:str) -> Itinerary:
-        """Crea reservas pudiendo elegir un asiento disponible"""
+    def _generate_unique_reservation_codes(count: int) -> List[str]:
+        """count códigos de reserva únicos con una sola consulta de colisiones por ronda"""
+        codes = set()
+        while len(codes) < count:
+            candidates = {str(uuid.uuid4())[:8].upper() for _ in range(count - len(codes))}
+            candidates -= set(Itinerary.objects.filter(reservation_code__in=candidates)
+                              .values_list("reservation_code", flat=True))
+            codes |= candidates
+        return list(codes)
+
+    @staticmethod
+    def create_automatic_reservations(passenger_ids: List[int], flight_ids: List[int],
+                                      status: str = "reserved") -> List[Itinerary]:
+        """Reserva un itinerario por pasajero asignando asientos automáticamente: en cada vuelo el grupo
+        se ubica junto (ver find_seat_block) sobre la grilla de ocupación en memoria, todo en una transacción."""
+        with transaction.atomic():
+            passengers = list(Passenger.objects.filter(id__in=passenger_ids))
+            if not passengers:
+                raise ValidationError("No hay pasajeros para reservar.")
+            passengers.sort(key=lambda p: passenger_ids.index(p.id))
+
+            flights = SeatService.get_flights_in_order(flight_ids)
+            if not flights or None in flights:
+                raise ValidationError("Alguno de los vuelos elegidos ya no está activo.")
+
+            # Serializa asignaciones concurrentes sobre los mismos vuelos hasta el commit
+            inventories = {inv.flight_id: inv for inv in
+                           FlightInventory.objects.select_for_update().filter(flight_id__in=[f.id for f in flights])}
+
+            occupancy_by_flight, _, _ = SeatReadService.get_occupancy_by_flight(flights,
+                                                                                inventory_by_flight=inventories)
+            layouts = SeatReadService.get_layouts_by_flight(flights)
+
+            # {flight_id: [Seat]} en el orden de los pasajeros
+            seats_by_flight = {}
+            for flight in flights:
+                layout = layouts[flight.id]
+                aisles = ()
+                if flight.airplane.cabin_layout_id:
+                    aisles = get_cabin_geometry(flight.airplane.cabin_layout).aisles
+                positions = find_seat_block(layout, occupancy_by_flight[flight.id], len(passengers), aisles)
+                if positions is None:
+                    raise ValidationError(f"No hay {len(passengers)} asientos libres en el vuelo {flight}.")
+                seats_by_flight[flight.id] = [
+                    Seat(id=seat_id, airplane=flight.airplane, row=row, column=column, number=number)
+                    for seat_id, row, column, number in (layout.cells[pos] for pos in positions)
+                ]
+
+            # La ocupación deja libres los reserved vencidos: se borran antes de ocupar su asiento
+            ExpirySweeper.reclaim((f.id, seat.id) for f in flights for seat in seats_by_flight[f.id])
+
+            reserved_at = timezone.now() if status == "reserved" else None
+            codes = ReservationService._generate_unique_reservation_codes(len(passengers))
+            itineraries = []
+            for i, passenger in enumerate(passengers):
+                total = sum(seat_price(f.base_price, f.airplane, seats_by_flight[f.id][i]) for f in flights)
+                itineraries.append(Itinerary(passenger=passenger, reservation_code=codes[i], total_price=total))
+            itineraries = Itinerary.objects.bulk_create(itineraries)
+
+            FlightSegment.objects.bulk_create([
+                FlightSegment(itinerary=itinerary, flight=flight, seat=seats_by_flight[flight.id][i],
+                              price=seat_price(flight.base_price, flight.airplane, seats_by_flight[flight.id][i]),
+                              status=status, reserved_at=reserved_at)
+                for i, itinerary in enumerate(itineraries)
+                for flight in flights
+            ])
+
+            # bulk_create no dispara post_save: el inventario se ajusta con un UPDATE por vuelo
+            bucket, seat_status = ("held", STATUS_HELD) if status == "reserved" else ("confirmed", STATUS_CONFIRMED)
+            FlightInventoryService.apply_deltas(
+                {f.id: {bucket: len(passengers)} for f in flights},
+                {f.id: {seat.id: seat_status for seat in seats_by_flight[f.id]} for f in flights},
+            )
+            bump_flights([f.id for f in flights])
+            return itineraries
+
+    @staticmethod
+    def create_reservations_with_seats(passenger_ids: List[int], flight_ids: List[int], post_data: dict, status:str) -> Itinerary:
+        """Crea reservas pudiendo elegir un asiento disponible en los vuelos elegidos"""
         with transaction.atomic():
             passengers = Passenger.objects.filter(id__in=passenger_ids)
-            routes = Route.objects.filter(id__in=route_ids)
-            flights = [
-                Flight.objects.filter(route=route, status="active").first()
-                for route in routes
-            ]
+            # mismo orden de vuelos que get_available_seats_for_passengers (las claves seat_{p}_{f} dependen de él)
+            flights = SeatService.get_flights_in_order(flight_ids)
 
             seat_assignments = {}  # { flight.id: set(seat_ids) }
             created_itineraries = []
             errores = []
 
+            # Los asientos retenidos desde la API (SeatHoldRegistry) tampoco se pueden tomar acá:
+            # una sola lectura del cache para todos los elegidos
+            chosen = {
+                flight.id: [int(post_data[f"seat_{p_index}_{f_index}"])
+                            for p_index in range(len(passengers))
+                            if str(post_data.get(f"seat_{p_index}_{f_index}", "")).isdigit()]
+                for f_index, flight in enumerate(flights) if flight
+            }
+            held = SeatHoldRegistry.holds_by_flight(chosen)
+
             for p_index, passenger in enumerate(passengers):
                 reservation_code = ReservationService._generate_unique_reservation_code()
 
@@ -452,7 +677,7 @@ class ReservationService:
 
                 for f_index, flight in enumerate(flights):
                     if not flight:
-                        errores.append(f"Vuelo no encontrado para la ruta {f_index}")
+                        errores.append(f"El vuelo {flight_ids[f_index]} ya no está activo")
                         continue
 
                     key = f"{p_index}_{f_index}"
@@ -468,27 +693,134 @@ class ReservationService:
                         continue
                     assigned.add(seat_id)
 
-                    seat = Seat.objects.filter(id=seat_id).first()
+                    seat = Seat.objects.active().filter(id=seat_id).first()
                     if not seat:
                         errores.append(f"Asiento no válido para {passenger.name}")
                         continue
-
-                    if FlightSegment.objects.filter(flight=flight, seat=seat).exists():
-                        errores.append(f"Asiento {seat.row}{seat.column} ya está ocupado.")
+                    if seat.id in held[flight.id]:
+                        errores.append(f"Asiento {seat.row}{seat.column} retenido por otro pasajero.")
                         continue
 
-                    FlightSegmentService.create(
-                        itinerary=itinerary,
-                        flight=flight,
-                        seat=seat,
-                        price=flight.base_price,
-                        status=status
-                    )
+                    try:
+                        FlightSegmentService.create(
+                            itinerary=itinerary,
+                            flight=flight,
+                            seat=seat,
+                            price=seat_price(flight.base_price, flight.airplane, seat),
+                            status=status
+                        )
+                    except SeatConflictError:
+                        errores.append(f"Asiento {seat.row}{seat.column} ya está ocupado.")
 
             if errores:
                 raise ValidationError(" | ".join(errores))
 
             return created_itineraries
+
+    @staticmethod
+    def confirm_group_reservations(passengers_data: List[dict], flights: List[Flight], seat_ids: dict,
+                                   status: str = "confirmed") -> List[Tuple[Itinerary, List[FlightSegment], Ticket]]:
+        """
+        Confirma un grupo de una vez: un itinerario con ticket por pasajero y un segmento por vuelo.
+          passengers_data: [{name, document, email, ...}] (los documentos ya registrados se reutilizan)
+          seat_ids: {(document, flight_id): seat_id}
+        Pasajeros, asientos y códigos se resuelven con una consulta cada uno y todo se escribe con
+        bulk_create: la cantidad de queries no depende del tamaño del grupo (salvo el UPDATE por vuelo).
+        Lanza ValidationError antes de escribir nada (documento repetido en el grupo, pasajero que ya
+        tiene reserva en alguno de los vuelos, asiento inválido o repetido), o SeatConflictError si un asiento ya está ocupado;
+        en ambos casos no queda nada escrito.
+        """
+        with transaction.atomic():
+            documents = [p.get("document") for p in passengers_data]
+            if not all(documents):
+                raise ValidationError("Pasajero sin documento.")
+            if len(set(documents)) != len(documents):
+                raise ValidationError("Documento duplicado dentro del grupo.")
+
+            # Mismo chequeo que FlightSegmentService.create, para todo el grupo en una sola query
+            if FlightSegment.objects.live().filter(itinerary__passenger__document__in=documents,
+                                                   flight_id__in=[f.id for f in flights]).exists():
+                raise ValidationError("This passenger already has a reservation for this flight.")
+
+            per_passenger = len(flights)
+            seats_by_id = Seat.objects.active().in_bulk(set(seat_ids.values()))
+            # [(documento, vuelo, asiento, precio)] agrupados por pasajero, en el orden de la respuesta
+            legs = []
+            for doc in documents:
+                for flight in flights:
+                    seat = seats_by_id.get(seat_ids.get((doc, flight.id)))
+                    if not seat or seat.airplane_id != flight.airplane_id:
+                        raise ValidationError(
+                            f"Asiento {seat_ids.get((doc, flight.id))} inválido para el vuelo {flight.id}.")
+                    legs.append((doc, flight, seat, seat_price(flight.base_price, flight.airplane, seat)))
+            pairs = {(flight.id, seat.id) for _, flight, seat, _ in legs}
+            if len(pairs) != len(legs):
+                raise ValidationError("Asiento duplicado en un mismo vuelo para distintos pasajeros.")
+
+            # Pasajeros por documento: los que faltan se insertan juntos (ignore_conflicts cubre
+            # un alta concurrente del mismo documento) y se releen en la misma consulta de ids
+            passengers = Passenger.objects.in_bulk(documents, field_name="document")
+            missing = {p["document"]: p for p in passengers_data if p["document"] not in passengers}
+            if missing:
+                Passenger.objects.bulk_create([
+                    Passenger(
+                        name=p.get("name"),
+                        document=doc,
+                        email=p.get("email"),
+                        phone=p.get("phone"),
+                        birth_date=p.get("birth_date"),
+                        document_type=p.get("document_type", "dni"),
+                    )
+                    for doc, p in missing.items()
+                ], ignore_conflicts=True)
+                passengers = Passenger.objects.in_bulk(documents, field_name="document")
+
+            codes = ReservationService._generate_unique_reservation_codes(len(documents))
+            itineraries = Itinerary.objects.bulk_create([
+                Itinerary(passenger=passengers[doc], reservation_code=codes[i],
+                          total_price=sum(leg[3] for leg in legs[i * per_passenger:(i + 1) * per_passenger]))
+                for i, doc in enumerate(documents)
+            ])
+
+            ExpirySweeper.reclaim(pairs)
+
+            reserved_at = timezone.now() if status == "reserved" else None
+            segments = [
+                FlightSegment(itinerary=itineraries[i // per_passenger], flight=flight, seat=seat,
+                              price=price, status=status, reserved_at=reserved_at)
+                for i, (_, flight, seat, price) in enumerate(legs)
+            ]
+            try:
+                # Insert primero (unique_flight_seat): el savepoint deja consultar cuál asiento chocó
+                with transaction.atomic():
+                    FlightSegment.objects.bulk_create(segments)
+            except IntegrityError:
+                taken = sorted(set(
+                    FlightSegment.objects
+                    .filter(flight_id__in={fid for fid, _ in pairs}, seat_id__in={sid for _, sid in pairs})
+                    .values_list("flight_id", "seat_id")
+                ) & pairs)
+                raise SeatConflictError(*(taken[0] if taken else (None, None)))
+
+            # El código de reserva es único, así que el código de barras también
+            tickets = Ticket.objects.bulk_create([
+                Ticket(itinerary=itinerary, barcode=f"{itinerary.reservation_code}-{get_random_string(6).upper()}",
+                       status="issued")
+                for itinerary in itineraries
+            ])
+
+            # bulk_create no dispara post_save: el inventario se ajusta con un UPDATE por vuelo
+            bucket, seat_status = ("held", STATUS_HELD) if status == "reserved" else ("confirmed", STATUS_CONFIRMED)
+            FlightInventoryService.apply_deltas(
+                {f.id: {bucket: len(documents)} for f in flights},
+                {f.id: {seat.id: seat_status for _, fl, seat, _ in legs if fl.id == f.id} for f in flights},
+            )
+            bump_flights([f.id for f in flights])
+
+            return [
+                (itinerary, segments[i * per_passenger:(i + 1) * per_passenger], tickets[i])
+                for i, itinerary in enumerate(itineraries)
+            ]
     
  
 
@@ -1,35 +1,133 @@
+import heapq
 from collections import deque
+from django.conf import settings
 from flight.models import Route
-from typing import List, Optional
+from typing import List, Optional, Tuple
+from reservations.services.route_graph import get_route_graph, RouteEdge
+
+# Topes duros para los parámetros que llegan desde la búsqueda (API / formulario)
+MAX_LEGS_LIMIT = 4
+MAX_RESULTS_LIMIT = 10
+
+
+def _load_routes(paths: List[List[int]]) -> List[List[Route]]:
+    """Materializa los caminos (IDs) en objetos Route con una sola query."""
+    route_ids = {rid for path in paths for rid in path}
+    routes = Route.objects.select_related('origin_airport', 'destination_airport').in_bulk(route_ids)
+    return [[routes[rid] for rid in path] for path in paths]
+
 
 def find_route_chain(origin_code: str, destination_code: str) -> Optional[List[List[Route]]]:
+    graph = get_route_graph()
+    if graph.min_hops(origin_code, destination_code) is None:
+        return None  # sin camino posible: no hace falta recorrer la componente
     queue = deque()
     all_paths = []
 
-    queue.append((origin_code, []))  # origen y ruta acumulada
+    # código actual, IDs de rutas acumuladas y aeropuertos ya visitados en este camino
+    queue.append((origin_code, [], (origin_code,)))
 
     while queue:
-        current_code, current_path = queue.popleft()
+        current_code, current_path, visited = queue.popleft()
 
         # Si llegamos al destino, guardamos el camino completo
         if current_code == destination_code:
             all_paths.append(current_path)
             continue  # ¡No cortamos! Queremos seguir buscando más rutas
 
-        # Buscamos todas las rutas que salen desde el aeropuerto actual
-        current_routes = Route.objects.select_related('origin_airport', 'destination_airport').filter(
-            origin_airport__code=current_code
-        )
-
-        for route in current_routes:
-            next_code = route.destination_airport.code
+        # Rutas salientes desde el índice en memoria (sin query por nodo)
+        for edge in graph.outgoing(current_code):
+            next_code = edge.destination
 
             # Prevenimos ciclos: no volver a pasar por el mismo aeropuerto del camino actual
-            if next_code in [r.origin_airport.code for r in current_path] or \
-               next_code in [r.destination_airport.code for r in current_path]:
+            if next_code in visited:
+                continue
+
+            queue.append((next_code, current_path + [edge.route_id], visited + (next_code,)))
+
+    return _load_routes(all_paths) if all_paths else None
+
+
+def _shortest_path(graph, source: str, target: str, max_legs: int,
+                   banned_nodes=frozenset(), banned_edges=frozenset()) -> Optional[Tuple[int, Tuple[RouteEdge, ...]]]:
+    """Camino más corto (por estimated_duration) con a lo sumo max_legs tramos.
+    Relajación por capas (Bellman-Ford acotado): cada capa agrega un tramo."""
+    best = {source: (0, ())}
+    frontier = {source: (0, ())}
+
+    for _ in range(max_legs):
+        next_frontier = {}
+        for code, (cost, path) in frontier.items():
+            if code == target:
                 continue
+            for edge in graph.outgoing(code):
+                next_code = edge.destination
+                if edge.route_id in banned_edges or next_code in banned_nodes or next_code == source:
+                    continue
+                # Sin ciclos dentro del camino
+                if any(e.destination == next_code for e in path):
+                    continue
+                new_cost = cost + edge.duration
+                current = best.get(next_code)
+                if current is None or new_cost < current[0]:
+                    best[next_code] = next_frontier[next_code] = (new_cost, path + (edge,))
+        if not next_frontier:
+            break
+        frontier = next_frontier
+
+    return best.get(target) if target != source else None
 
-            queue.append((next_code, current_path + [route]))
 
-    return all_paths if all_paths else None
+def find_k_shortest_route_chains(origin_code: str, destination_code: str, k: int = None,
+                                 max_legs: int = None) -> Optional[List[List[Route]]]:
+    """Devuelve las k mejores cadenas de rutas (sin ciclos) ordenadas por duración total,
+    con a lo sumo max_legs tramos (algoritmo de Yen sobre el grafo en memoria)."""
+    k = min(k or settings.ROUTE_SEARCH_MAX_RESULTS, MAX_RESULTS_LIMIT)
+    max_legs = min(max_legs or settings.ROUTE_SEARCH_MAX_LEGS, MAX_LEGS_LIMIT)
+
+    graph = get_route_graph()
+    min_hops = graph.min_hops(origin_code, destination_code)
+    if min_hops is None or min_hops > max_legs:
+        return None
+
+    first = _shortest_path(graph, origin_code, destination_code, max_legs)
+    if not first:
+        return None
+
+    accepted = [first[1]]
+    candidates = []  # heap de (costo, tramos, ids, camino)
+    seen = {tuple(e.route_id for e in first[1])}
+
+    while len(accepted) < k:
+        previous = accepted[-1]
+
+        for i in range(len(previous)):
+            spur_node = previous[i - 1].destination if i else origin_code
+            root = previous[:i]
+            root_ids = tuple(e.route_id for e in root)
+
+            # No repetir el tramo siguiente de caminos que comparten la misma raíz
+            banned_edges = {p[i].route_id for p in accepted
+                            if len(p) > i and tuple(e.route_id for e in p[:i]) == root_ids}
+            # Ni volver a pasar por los aeropuertos de la raíz
+            banned_nodes = {origin_code} | {e.destination for e in root}
+            banned_nodes.discard(spur_node)
+
+            spur = _shortest_path(graph, spur_node, destination_code, max_legs - i,
+                                  frozenset(banned_nodes), frozenset(banned_edges))
+            if not spur:
+                continue
+
+            path = root + spur[1]
+            ids = tuple(e.route_id for e in path)
+            if ids in seen:
+                continue
+            seen.add(ids)
+            cost = sum(e.duration for e in path)
+            heapq.heappush(candidates, (cost, len(path), ids, path))
+
+        if not candidates:
+            break
+        accepted.append(heapq.heappop(candidates)[3])
 
+    return _load_routes([[e.route_id for e in path] for path in accepted])
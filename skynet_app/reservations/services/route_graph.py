@@ -0,0 +1,146 @@
+import threading
+from collections import defaultdict, deque, namedtuple
+from typing import Dict, List, Optional
+
+from django.core.cache import cache
+
+from flight.models import Route
+
+# Arista del grafo: todo lo que necesita la búsqueda, sin tocar la base
+RouteEdge = namedtuple("RouteEdge", ["route_id", "origin", "destination", "duration"])
+
+GRAPH_VERSION_KEY = "route_graph:version"
+
+_lock = threading.Lock()
+_graph: Optional["RouteGraph"] = None
+
+
+class RouteGraph:
+    """Índice de adyacencia en memoria: código de aeropuerto → rutas salientes,
+    más una matriz de alcanzabilidad (mínima cantidad de tramos) que se calcula al primer uso."""
+
+    def __init__(self, edges: List[RouteEdge], version: int):
+        self.version = version
+        self.adjacency: Dict[str, List[RouteEdge]] = defaultdict(list)
+        for edge in edges:
+            self.adjacency[edge.origin].append(edge)
+        self._hops: Optional[Dict[str, Dict[str, int]]] = None
+
+    def outgoing(self, code: str) -> List[RouteEdge]:
+        return self.adjacency.get(code, [])
+
+    @classmethod
+    def build(cls, version: int) -> "RouteGraph":
+        # Una sola query para todo el grafo
+        rows = (Route.objects
+                .order_by("id")
+                .values_list("id", "origin_airport__code", "destination_airport__code", "estimated_duration"))
+        return cls([RouteEdge(*row) for row in rows], version)
+
+    # -------------------- Alcanzabilidad --------------------
+
+    @property
+    def hops(self) -> Dict[str, Dict[str, int]]:
+        """{origen: {destino: mínima cantidad de tramos}} (BFS desde cada aeropuerto con salidas)."""
+        if self._hops is None:
+            hops = {}
+            for source in list(self.adjacency):
+                dist = {source: 0}
+                queue = deque([source])
+                while queue:
+                    code = queue.popleft()
+                    for edge in self.outgoing(code):
+                        if edge.destination not in dist:
+                            dist[edge.destination] = dist[code] + 1
+                            queue.append(edge.destination)
+                hops[source] = dist
+            self._hops = hops
+        return self._hops
+
+    def min_hops(self, origin: str, destination: str) -> Optional[int]:
+        """Mínima cantidad de tramos entre dos aeropuertos, o None si no hay camino. O(1)."""
+        if origin == destination:
+            return 0
+        return self.hops.get(origin, {}).get(destination)
+
+    def reachable_from(self, origin: str) -> Dict[str, int]:
+        """{destino: mínima cantidad de tramos} alcanzables desde origin."""
+        return {code: n for code, n in self.hops.get(origin, {}).items() if code != origin}
+
+    def with_edge(self, edge: RouteEdge, version: int) -> "RouteGraph":
+        """Copia del grafo con una ruta nueva; la matriz se actualiza en forma incremental
+        (solo mejoran los pares x → y que pueden pasar por la nueva ruta)."""
+        graph = RouteGraph.__new__(RouteGraph)
+        graph.version = version
+        graph.adjacency = defaultdict(list, {code: list(edges) for code, edges in self.adjacency.items()})
+        graph.adjacency[edge.origin].append(edge)
+        graph._hops = None
+
+        if self._hops is not None:
+            hops = {source: dict(dist) for source, dist in self._hops.items()}
+            hops.setdefault(edge.origin, {edge.origin: 0})
+            # Copia: la fila del destino también puede mejorar dentro del ciclo
+            from_destination = dict(hops.get(edge.destination, {edge.destination: 0}))
+
+            for dist in hops.values():
+                if edge.origin not in dist:
+                    continue
+                via = dist[edge.origin] + 1
+                for target, tail in from_destination.items():
+                    if via + tail < dist.get(target, via + tail + 1):
+                        dist[target] = via + tail
+            graph._hops = hops
+        return graph
+
+
+def _current_version() -> int:
+    # La versión vive en el cache compartido para que otros procesos se enteren de los cambios
+    version = cache.get(GRAPH_VERSION_KEY)
+    if version is None:
+        cache.add(GRAPH_VERSION_KEY, 1, timeout=None)
+        version = cache.get(GRAPH_VERSION_KEY, 1)
+    return version
+
+
+def get_route_graph() -> RouteGraph:
+    """Devuelve el índice del proceso, reconstruyéndolo si quedó desactualizado."""
+    global _graph
+    version = _current_version()
+    graph = _graph
+    if graph is not None and graph.version == version:
+        return graph
+
+    with _lock:
+        if _graph is None or _graph.version != version:
+            _graph = RouteGraph.build(version)
+        return _graph
+
+
+def _bump_version() -> int:
+    try:
+        return cache.incr(GRAPH_VERSION_KEY)
+    except ValueError:
+        cache.set(GRAPH_VERSION_KEY, 2, timeout=None)
+        return 2
+
+
+def add_route_to_graph(route: Route) -> None:
+    """Alta de ruta: el proceso actual aplica la arista en forma incremental;
+    el resto de los procesos ve la nueva versión y reconstruye."""
+    global _graph
+    with _lock:
+        version = _bump_version()
+        if _graph is not None and _graph.version == version - 1:
+            edge = RouteEdge(route.id, route.origin_airport.code, route.destination_airport.code,
+                             route.estimated_duration)
+            _graph = _graph.with_edge(edge, version)
+        else:
+            _graph = None
+
+
+def invalidate_route_graph() -> None:
+    """Descarta el índice local y avisa al resto de los procesos."""
+    global _graph
+    with _lock:
+        _graph = None
+    _bump_version()
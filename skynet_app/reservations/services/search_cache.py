@@ -0,0 +1,114 @@
+import uuid
+from typing import Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+NETWORK_KEY = "search:network"
+HITS_KEY = "search:stats:hits"
+MISSES_KEY = "search:stats:misses"
+
+
+def _route_key(route_id) -> str:
+    return f"search:route:{route_id}"
+
+
+def _flight_key(flight_id) -> str:
+    return f"search:flight:{flight_id}"
+
+
+def _read_stamps(keys: List[str]) -> dict:
+    """Sellos actuales. Si alguno no existe (nuevo o desalojado) se crea uno al azar,
+    así una entrada vieja nunca coincide por casualidad."""
+    stamps = cache.get_many(keys)
+    for key in keys:
+        if key not in stamps:
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            stamps[key] = cache.get(key)
+    return stamps
+
+
+def _bump(keys: Iterable[str]) -> None:
+    # Recién al confirmar: antes, una búsqueda concurrente todavía lee los datos viejos
+    # y los guardaría con el sello nuevo
+    stamps = {key: uuid.uuid4().hex for key in keys}
+    transaction.on_commit(lambda: cache.set_many(stamps, timeout=None))
+
+
+def bump_network() -> None:
+    """Altas/bajas de rutas o aeropuertos: pueden aparecer cadenas que ninguna entrada evaluó."""
+    _bump([NETWORK_KEY])
+
+
+def bump_routes(route_ids: Iterable[int]) -> None:
+    _bump(_route_key(rid) for rid in route_ids)
+
+
+def bump_flights(flight_ids: Iterable[int]) -> None:
+    _bump(_flight_key(fid) for fid in flight_ids)
+
+
+def _count(key: str) -> None:
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+class SearchCache:
+    """Cache compartido de resultados de búsqueda, invalidado por sellos de versión
+    de la red de rutas, de cada ruta candidata y de cada vuelo evaluado."""
+
+    @staticmethod
+    def make_key(origin_code: str, destination_code: str, fecha, passenger_count: int,
+                 max_legs: int = None, k: int = None, min_connection_minutes: int = None) -> str:
+        max_legs = max_legs or settings.ROUTE_SEARCH_MAX_LEGS
+        k = k or settings.ROUTE_SEARCH_MAX_RESULTS
+        if min_connection_minutes is None:
+            min_connection_minutes = settings.MIN_CONNECTION_MINUTES
+        return (f"search:result:{origin_code.strip().upper()}:{destination_code.strip().upper()}:"
+                f"{fecha}:{int(passenger_count)}:{max_legs}:{k}:{min_connection_minutes}")
+
+    @staticmethod
+    def get(key: str) -> Optional[tuple]:
+        entry = cache.get(key)
+        if entry is not None:
+            stamps = entry["stamps"]
+            if _read_stamps(list(stamps)) == stamps:
+                _count(HITS_KEY)
+                return entry["result"]
+            cache.delete(key)
+        _count(MISSES_KEY)
+        return None
+
+    @staticmethod
+    def stamps(route_ids: Iterable[int] = (), flight_ids: Iterable[int] = (), into: dict = None) -> dict:
+        """Sellos de la red y de las rutas/vuelos indicados. Hay que tomarlos ANTES de leer los datos
+        que cubren: si cambian mientras se calcula, la entrada ya nace vencida.
+        Con into, agrega a esos sellos solo los que falten (vale siempre la primera lectura)."""
+        stamps = into if into is not None else {}
+        keys = [NETWORK_KEY]
+        keys += [_route_key(rid) for rid in set(route_ids)]
+        keys += [_flight_key(fid) for fid in set(flight_ids)]
+        missing = [key for key in keys if key not in stamps]
+        if missing:
+            stamps.update(_read_stamps(missing))
+        return stamps
+
+    @staticmethod
+    def set(key: str, result, stamps: dict) -> None:
+        """Guarda result con los sellos que se tomaron antes de calcularlo (ver SearchCache.stamps)."""
+        cache.set(key, {"result": result, "stamps": stamps}, timeout=settings.SEARCH_CACHE_TIMEOUT)
+
+    @staticmethod
+    def stats() -> dict:
+        counters = cache.get_many([HITS_KEY, MISSES_KEY])
+        hits, misses = counters.get(HITS_KEY, 0), counters.get(MISSES_KEY, 0)
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / total, 4) if total else None,
+        }
@@ -0,0 +1,95 @@
+from typing import Iterable, List, Optional
+
+from airplane.services.seat_layout import SeatLayout
+from reservations.services.occupancy import SeatOccupancy
+
+
+def _column_number(column) -> int:
+    # Seat.column guarda la letra (A, B, ...); la adyacencia se mide en números
+    return ord(column) - 64 if isinstance(column, str) else int(column)
+
+
+def _free_rows(layout: SeatLayout, occupancy: SeatOccupancy):
+    """[(índice de fila, [(posición, columna), ...])] solo con los asientos libres, en orden de lectura."""
+    taken = occupancy.occupied
+    rows = []
+    pos = 0
+    for row_idx, (_, seats) in enumerate(layout.rows):
+        free = []
+        for _, column, _ in seats:
+            if not taken >> pos & 1:
+                free.append((pos, _column_number(column)))
+            pos += 1
+        rows.append((row_idx, free))
+    return rows
+
+
+def _runs(free, aisles):
+    """Tramos de asientos libres lado a lado (columnas consecutivas sin pasillo en el medio)."""
+    run = []
+    for pos, col in free:
+        if run and (col != run[-1][1] + 1 or run[-1][1] in aisles):
+            yield run
+            run = []
+        run.append((pos, col))
+    if run:
+        yield run
+
+
+def _contiguous_block(rows, size, aisles) -> Optional[List[int]]:
+    # El tramo más ajustado (deja menos huecos sueltos) y, a igualdad, el más adelante
+    best = None
+    for row_idx, free in rows:
+        for run in _runs(free, aisles):
+            if len(run) >= size:
+                key = (len(run) - size, row_idx, run[0][1])
+                if best is None or key < best[0]:
+                    best = (key, run[:size])
+    return [pos for pos, _ in best[1]] if best else None
+
+
+def _same_row(rows, size) -> Optional[List[int]]:
+    # Misma fila aunque haya pasillo o asientos ocupados en el medio: la ventana de menor dispersión
+    best = None
+    for row_idx, free in rows:
+        for i in range(len(free) - size + 1):
+            window = free[i:i + size]
+            key = (window[-1][1] - window[0][1], row_idx)
+            if best is None or key < best[0]:
+                best = (key, window)
+    return [pos for pos, _ in best[1]] if best else None
+
+
+def _nearest_neighbours(rows, size) -> Optional[List[int]]:
+    """Para cada asiento libre como ancla, los size libres más cercanos; gana el grupo más compacto."""
+    cells = [(pos, row_idx, col) for row_idx, free in rows for pos, col in free]
+    if len(cells) < size:
+        return None
+    best = None
+    for _, anchor_row, anchor_col in cells:
+        ranked = sorted(cells, key=lambda c: ((c[1] - anchor_row) ** 2 + (c[2] - anchor_col) ** 2, c[0]))[:size]
+        cost = sum((c[1] - anchor_row) ** 2 + (c[2] - anchor_col) ** 2 for c in ranked)
+        if best is None or cost < best[0]:
+            best = (cost, ranked)
+    return [pos for pos, _, _ in best[1]]
+
+
+def find_seat_block(layout: SeatLayout, occupancy: SeatOccupancy, size: int,
+                    aisles: Iterable[int] = ()) -> Optional[List[int]]:
+    """
+    Posiciones del layout para un grupo de size pasajeros, o None si no entran.
+      1) bloque contiguo en una fila (sin cruzar pasillos)
+      2) todos en la misma fila
+      3) vecinos más cercanos (bloque compacto que puede ocupar varias filas)
+    aisles: columnas (1, 2, ...) después de las cuales hay un pasillo.
+    """
+    if size <= 0:
+        return []
+    if occupancy.free_count < size:
+        return None
+    rows = _free_rows(layout, occupancy)
+    aisles = set(aisles)
+    positions = (_contiguous_block(rows, size, aisles)
+                 or _same_row(rows, size)
+                 or _nearest_neighbours(rows, size))
+    return sorted(positions) if positions else None
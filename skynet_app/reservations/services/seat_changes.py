@@ -0,0 +1,45 @@
+from typing import Iterable, Optional, Set
+
+from django.core.cache import cache
+
+# Versiones que se recuerdan por vuelo; un cliente más atrasado recibe la grilla completa
+MAX_LOG_ENTRIES = 200
+
+_MISSING = object()
+
+
+def _log_key(flight_id: int) -> str:
+    return f"seatmap:changes:{flight_id}"
+
+
+class SeatChangeLog:
+    """Bitácora corta por vuelo: versión de la grilla → asientos que cambiaron en esa versión.
+    Si falta alguna versión (desalojo del cache, otro proceso, cambio de grilla) no se arma delta:
+    el cliente recibe la grilla completa, nunca un delta incompleto."""
+
+    @staticmethod
+    def record(flight_id: int, version: int, seat_ids: Optional[Iterable[int]]) -> None:
+        """seat_ids=None marca un cambio que no se puede expresar por asiento (ej. capacidad).
+        Acepta cualquier iterable de ids (incluido un dict {seat_id: estado})."""
+        key = _log_key(flight_id)
+        log = cache.get(key) or {}
+        log[version] = tuple(seat_ids) if seat_ids is not None else None
+        if len(log) > MAX_LOG_ENTRIES:
+            log = {v: log[v] for v in sorted(log)[-MAX_LOG_ENTRIES:]}
+        cache.set(key, log, timeout=None)
+
+    @staticmethod
+    def changed_since(flight_id: int, since: int, current: int) -> Optional[Set[int]]:
+        """Asientos que cambiaron entre since (exclusive) y current, o None si no se puede saber."""
+        if since > current or current - since > MAX_LOG_ENTRIES:
+            return None
+        if since == current:
+            return set()
+        log = cache.get(_log_key(flight_id)) or {}
+        changed = set()
+        for version in range(since + 1, current + 1):
+            entry = log.get(version, _MISSING)
+            if entry is _MISSING or entry is None:
+                return None
+            changed.update(entry)
+        return changed
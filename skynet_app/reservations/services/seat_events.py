@@ -0,0 +1,107 @@
+import json
+import queue
+import threading
+from collections import defaultdict
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+# Eventos pendientes por suscriptor; uno lento pierde los más nuevos y recibe un "reset"
+SUBSCRIBER_QUEUE_SIZE = 256
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+class Subscription:
+    """Cola de un suscriptor. Usar como context manager para darse de baja al cerrar el stream."""
+
+    def __init__(self, broker, flight_id: int):
+        self.broker = broker
+        self.flight_id = flight_id
+        self.queue: "queue.Queue[dict]" = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def get(self, timeout: float) -> Optional[dict]:
+        """Próximo evento o None si no llegó ninguno en timeout segundos."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def put(self, event: dict) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.broker.unsubscribe(self)
+
+
+class InProcessSeatBroker:
+    """Fan-out en memoria del proceso: cada cambio se serializa una vez y se encola a cada suscriptor.
+    Solo ve los cambios hechos en el mismo proceso; con varios procesos usar un broker compartido
+    con la misma interfaz (publish / subscribe / unsubscribe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[int, set] = defaultdict(set)
+
+    def publish(self, flight_id: int, event: dict) -> None:
+        event = dict(event, data=json.dumps(event["data"], cls=DjangoJSONEncoder))
+        with self._lock:
+            subscribers = list(self._subscribers.get(flight_id, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+
+    def subscribe(self, flight_id: int) -> Subscription:
+        subscription = Subscription(self, flight_id)
+        with self._lock:
+            self._subscribers[flight_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.flight_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.flight_id]
+
+    def subscriber_count(self, flight_id: int) -> int:
+        with self._lock:
+            return len(self._subscribers.get(flight_id, ()))
+
+
+def get_broker():
+    """Broker configurado en settings.SEAT_EVENTS_BROKER (uno por proceso)."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.SEAT_EVENTS_BROKER)()
+    return _broker
+
+
+def publish_seat_changes(flight_id: int, version: int, seats: Optional[Dict[int, str]]) -> None:
+    """Evento "seats" con el nuevo estado de cada asiento, o "reset" si el cambio no es por asiento
+    (ej. cambió la capacidad): el cliente vuelve a pedir la grilla completa."""
+    if seats is None:
+        event = {"event": "reset", "id": version, "data": {"flight_id": flight_id, "version": version}}
+    else:
+        event = {
+            "event": "seats",
+            "id": version,
+            "data": {
+                "flight_id": flight_id,
+                "version": version,
+                "seats": [{"id": sid, "status": status} for sid, status in sorted(seats.items())],
+            },
+        }
+    get_broker().publish(flight_id, event)
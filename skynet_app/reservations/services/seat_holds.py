@@ -0,0 +1,141 @@
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from reservations.services.inventory import FlightInventoryService
+from reservations.services.occupancy import STATUS_AVAILABLE, STATUS_HELD
+
+
+def _hold_key(flight_id: int, seat_id: int) -> str:
+    return f"seathold:{flight_id}:{seat_id}"
+
+
+def _lock_key(flight_id: int, seat_id: int) -> str:
+    return f"seathold-lock:{flight_id}:{seat_id}"
+
+
+_LOCK_TIMEOUT = 5       # segundos; cota de la sección crítica si el proceso muere con el lock tomado
+_LOCK_ATTEMPTS = 20
+_LOCK_WAIT = 0.005
+
+
+@contextmanager
+def _seat_lock(flight_id: int, seat_id: int):
+    """Sección crítica entre procesos por (vuelo, asiento): add-if-absent sobre una clave aparte.
+    Toda escritura de una retención pasa por acá, así que leer-comparar-escribir queda atómico.
+    Produce False si no se pudo tomar a tiempo."""
+    key = _lock_key(flight_id, seat_id)
+    nonce = uuid.uuid4().hex
+    for _ in range(_LOCK_ATTEMPTS):
+        if cache.add(key, nonce, timeout=_LOCK_TIMEOUT):
+            break
+        time.sleep(_LOCK_WAIT)
+    else:
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        if cache.get(key) == nonce:
+            cache.delete(key)
+
+
+class SeatHoldRegistry:
+    """Retenciones de asientos compartidas entre procesos, una clave por (vuelo, asiento) en el cache.
+    El dueño es un pasajero de un token (owner(token, document)): dos pasajeros del mismo grupo no
+    pueden retener el mismo asiento, y cambiar de asiento solo suelta la retención propia.
+    Tomar, renovar y soltar comparan el dueño y escriben dentro de _seat_lock: nunca se pisa ni se
+    borra la retención de otro, aunque la propia venza en el medio.
+    Cada cambio sube la versión de la grilla del vuelo (deltas y eventos SSE lo ven como held/available)."""
+
+    @staticmethod
+    def ttl() -> int:
+        return settings.SEAT_HOLD_TTL_SECONDS
+
+    @staticmethod
+    def owner(token: str, document: str) -> str:
+        return f"{token}:{document}"
+
+    @staticmethod
+    def _entry(owner: str) -> dict:
+        return {"owner": owner, "until": timezone.now() + timedelta(seconds=SeatHoldRegistry.ttl())}
+
+    @staticmethod
+    def acquire(flight_id: int, seat_id: int, owner: str) -> bool:
+        """Retiene el asiento para owner. Si ya era suyo, renueva; si es de otro, devuelve False."""
+        with _seat_lock(flight_id, seat_id) as locked:
+            if not locked:
+                return False
+            key = _hold_key(flight_id, seat_id)
+            current = cache.get(key)
+            if current and current["owner"] != owner:
+                return False
+            cache.set(key, SeatHoldRegistry._entry(owner), timeout=SeatHoldRegistry.ttl())
+        if not current:
+            SeatHoldRegistry._publish(flight_id, {seat_id: STATUS_HELD})
+        return True
+
+    @staticmethod
+    def renew(flight_id: int, seat_id: int, owner: str) -> bool:
+        """Extiende el TTL de una retención propia."""
+        with _seat_lock(flight_id, seat_id) as locked:
+            if not locked:
+                return False
+            key = _hold_key(flight_id, seat_id)
+            current = cache.get(key)
+            if not current or current["owner"] != owner:
+                return False
+            cache.set(key, SeatHoldRegistry._entry(owner), timeout=SeatHoldRegistry.ttl())
+        return True
+
+    @staticmethod
+    def release(flight_id: int, seat_id: int, owner: str, publish: bool = True) -> bool:
+        """Libera una retención propia (las ajenas no se tocan)."""
+        with _seat_lock(flight_id, seat_id) as locked:
+            if not locked:
+                return False
+            key = _hold_key(flight_id, seat_id)
+            current = cache.get(key)
+            if not current or current["owner"] != owner:
+                return False
+            cache.delete(key)
+        if publish:
+            SeatHoldRegistry._publish(flight_id, {seat_id: STATUS_AVAILABLE})
+        return True
+
+    @staticmethod
+    def release_many(token: str, selections: Iterable[Tuple[str, int, int]]) -> None:
+        """Libera sin publicar las retenciones de (documento, vuelo, asiento) del token
+        (ej. al confirmar: el segmento ya publica el asiento como confirmado)."""
+        for document, flight_id, seat_id in selections:
+            SeatHoldRegistry.release(flight_id, seat_id, SeatHoldRegistry.owner(token, document), publish=False)
+
+    @staticmethod
+    def holds_by_flight(seat_ids_by_flight: Dict[int, Iterable[int]]) -> Dict[int, Dict[int, dict]]:
+        """{flight_id: {seat_id: {owner, until}}} con las retenciones vigentes, en una sola lectura del cache."""
+        keys = {_hold_key(fid, sid): (fid, sid) for fid, seat_ids in seat_ids_by_flight.items() for sid in seat_ids}
+        holds = {fid: {} for fid in seat_ids_by_flight}
+        for key, hold in cache.get_many(keys).items():
+            fid, sid = keys[key]
+            holds[fid][sid] = hold
+        return holds
+
+    @staticmethod
+    def not_held_by(token: str, selections: Iterable[Tuple[str, int, int]]) -> List[Tuple[int, int]]:
+        """(vuelo, asiento) de las selecciones (documento, vuelo, asiento) que el pasajero del token
+        ya no retiene (vencidos o nunca tomados), en una sola lectura del cache."""
+        selections = list(selections)
+        holds = cache.get_many([_hold_key(fid, sid) for _, fid, sid in selections])
+        return [(fid, sid) for doc, fid, sid in selections
+                if holds.get(_hold_key(fid, sid), {}).get("owner") != SeatHoldRegistry.owner(token, doc)]
+
+    @staticmethod
+    def _publish(flight_id: int, seats: Dict[int, str]) -> None:
+        # Sin cambio de contadores: solo versión nueva de la grilla, bitácora de cambios y evento
+        FlightInventoryService.apply_deltas({}, {flight_id: seats})
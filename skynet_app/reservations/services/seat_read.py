@@ -1,88 +1,212 @@
 from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
 from datetime import timedelta
+from django.db.models import Min
 from django.utils import timezone
 
-from airplane.models import Seat
+from airplane.services.seat_layout import get_seat_layout, get_seat_layouts
 from reservations.models import FlightSegment
-
-STATUS_AVAILABLE = "available"
-STATUS_HELD = "held"
-STATUS_CONFIRMED = "confirmed"
+from reservations.services.inventory import FlightInventoryService
+from reservations.services.occupancy import SeatOccupancy, STATUS_AVAILABLE, STATUS_HELD, STATUS_CONFIRMED
+from reservations.services.seat_holds import SeatHoldRegistry
 
 class SeatReadService:
     """Solo lectura/adaptación para armar seat_map normalizado desde tus modelos."""
 
-    HOLD_TTL_MIN = 5  # debe coincidir con _remove_expired_segments()
+    HOLD_TTL_MIN = settings.RESERVATION_HOLD_MINUTES  # mismo vencimiento que usa ExpirySweeper
+    OCCUPANCY_CACHE_SECONDS = 3600  # las entradas no quedan viejas (van por versión); esto solo acota el cache
 
     @staticmethod
-    def get_status_sets_by_flight(flights):
+    def get_occupancy_by_flight(flights, registry_holds=None, inventory_by_flight=None):
         """
         Devuelve, por vuelo:
-          - confirmed_ids: seats con FlightSegment (cualquier status != reserved vigente)
-          - held: { seat_id: held_until } para reserved no vencidos
+          - occupancy: SeatOccupancy sobre el layout del avión
+              · held: reserved no vencidos y retenciones vigentes del SeatHoldRegistry
+              · confirmed: cualquier otro segmento existente
+              · libres: los reserved vencidos, aunque el barredor todavía no los haya borrado
+          - held: { seat_id: held_until } para los held (para locks)
+          - lapsed: { seat_ids } reserved vencidos que siguen en la base (cambian de estado sin cambiar la versión)
+        registry_holds / inventory_by_flight: si ya se leyeron (si no, se leen acá).
         """
         now = timezone.now()
-        flight_ids = [f.id for f in flights]
-        segs = (FlightSegment.objects
-                .filter(flight_id__in=flight_ids)
-                .values("flight_id", "seat_id", "status", "reserved_at"))
-
-        confirmed_by_flight = defaultdict(set)
+        layouts = SeatReadService.get_layouts_by_flight(flights)
+        if inventory_by_flight is None:
+            inventory_by_flight = SeatReadService.get_inventory_by_flight(flights)
+        stored = SeatReadService.get_stored_occupancy(flights, layouts, inventory_by_flight)
+        occupancy_by_flight = {}
         held_by_flight = defaultdict(dict)
+        lapsed_by_flight = defaultdict(set)
 
-        for s in segs:
-            fid = s["flight_id"]
-            sid = s["seat_id"]
-            status = s["status"]
-            if status == "reserved" and s["reserved_at"]:
-                held_until = s["reserved_at"] + timedelta(minutes=SeatReadService.HOLD_TTL_MIN)
+        for fid, (base, reserved) in stored.items():
+            occupancy = base.copy()
+            for pos, reserved_at in reserved.items():
+                sid = layouts[fid].seat_ids[pos]
+                held_until = reserved_at + timedelta(minutes=SeatReadService.HOLD_TTL_MIN)
                 if held_until > now:
                     held_by_flight[fid][sid] = held_until
-                    continue  # mientras está held, no lo marcamos confirmed
-            # cualquier otro caso con segmento existente = ocupado
-            confirmed_by_flight[fid].add(sid)
+                    continue
+                # vencido: se puede volver a vender (al reservarlo se borra, ver ExpirySweeper.reclaim)
+                lapsed_by_flight[fid].add(sid)
+                occupancy.release(pos)
+            occupancy_by_flight[fid] = occupancy
+
+        if registry_holds is None:
+            registry_holds = SeatReadService.get_registry_holds(flights, layouts)
+        for fid, holds in registry_holds.items():
+            for sid, hold in holds.items():
+                pos = layouts[fid].index.get(sid)
+                if pos is not None and occupancy_by_flight[fid].is_free(pos):
+                    occupancy_by_flight[fid].hold(pos)
+                    held_by_flight[fid][sid] = hold["until"]
+
+        return occupancy_by_flight, held_by_flight, lapsed_by_flight
 
-        return confirmed_by_flight, held_by_flight
+    @staticmethod
+    def _occupancy_key(flight_id, inventory, layout):
+        return f"seat_occupancy:{flight_id}:{inventory.version}:{layout.airplane_id}:{layout.version}"
 
     @staticmethod
-    def build_seat_map(flight, confirmed_ids, held_ids):
+    def get_stored_occupancy(flights, layouts, inventory_by_flight):
         """
-        Construye la grilla por vuelo:
-          - rows: [{row, seats:[{id,col,num,status}]}]
-          - version/updated_at: usamos campos del Flight si existen, si no los “simulamos”
+        {flight_id: (SeatOccupancy, {pos: reserved_at})} de los segmentos guardados:
+        held = todos los reserved (vigentes o no), confirmed = el resto.
+        Se cachea serializado (to_bytes) por versión del inventario y del layout: cualquier alta, cambio
+        o baja de un segmento sube la versión, así que una entrada nunca queda vieja. Si vence o no
+        un reserved depende de la hora, por eso se guarda su reserved_at y se decide al leer.
         """
-        seats = (Seat.objects
-                 .filter(airplane=flight.airplane)
-                 .values("id", "row", "column", "number")
-                 .order_by("row", "column"))
-
-        rows_dict = defaultdict(list)
-        for s in seats:
-            sid = s["id"]
-            if sid in confirmed_ids:
-                st = STATUS_CONFIRMED
-            elif sid in held_ids:
-                st = STATUS_HELD
+        keys = {
+            SeatReadService._occupancy_key(fid, inventory_by_flight[fid], layout): fid
+            for fid, layout in layouts.items() if fid in inventory_by_flight
+        }
+        stored = {keys[key]: (SeatOccupancy.from_bytes(data), reserved)
+                  for key, (data, reserved) in cache.get_many(keys).items()}
+
+        missing = [fid for fid in layouts if fid not in stored]
+        if not missing:
+            return stored
+        built = {fid: (SeatOccupancy(len(layouts[fid])), {}) for fid in missing}
+        segs = (FlightSegment.objects
+                .filter(flight_id__in=missing, seat__isnull=False)
+                .values_list("flight_id", "seat_id", "status", "reserved_at"))
+        for fid, sid, status, reserved_at in segs:
+            pos = layouts[fid].index.get(sid)
+            if pos is None:
+                continue  # asiento que ya no está en la grilla del avión
+            occupancy, reserved = built[fid]
+            if status == "reserved" and reserved_at:
+                occupancy.hold(pos)
+                reserved[pos] = reserved_at
             else:
-                st = STATUS_AVAILABLE
-            rows_dict[s["row"]].append({
-                "id": sid,
-                "col": s["column"],
-                "num": s["number"],
-                "status": st,
-            })
+                occupancy.confirm(pos)
+
+        cache.set_many({key: (built[fid][0].to_bytes(), built[fid][1])
+                        for key, fid in keys.items() if fid in built},
+                       timeout=SeatReadService.OCCUPANCY_CACHE_SECONDS)
+        stored.update(built)
+        return stored
+
+    @staticmethod
+    def get_registry_holds(flights, layouts=None):
+        """{flight_id: {seat_id: {owner, until}}} retenidos en el SeatHoldRegistry (sin tocar la base)."""
+        layouts = layouts or SeatReadService.get_layouts_by_flight(flights)
+        return SeatHoldRegistry.holds_by_flight({fid: layout.seat_ids for fid, layout in layouts.items()})
+
+    @staticmethod
+    def get_live_hold_marks(flights):
+        """{flight_id: reserved_at del hold vigente más antiguo}. Cuando ese hold vence, la grilla cambia
+        sin que cambie la versión: por eso forma parte del ETag junto con la versión."""
+        since = timezone.now() - timedelta(minutes=SeatReadService.HOLD_TTL_MIN)
+        rows = (FlightSegment.objects
+                .filter(flight_id__in=[f.id for f in flights], status="reserved",
+                        seat__isnull=False, reserved_at__gt=since)
+                .values("flight_id")
+                .annotate(oldest=Min("reserved_at"))
+                .order_by())
+        return {row["flight_id"]: row["oldest"] for row in rows}
+
+    @staticmethod
+    def get_inventory_by_flight(flights):
+        """Contadores por vuelo (FlightInventory): disponibilidad en O(1), sin contar filas."""
+        return FlightInventoryService.get_by_flight(f.id for f in flights)
+
+    @staticmethod
+    def get_layouts_by_flight(flights):
+        """{flight_id: SeatLayout}: una sola query de Seat para todos los aviones que no estén cacheados."""
+        layouts = get_seat_layouts(f.airplane for f in flights)
+        return {f.id: layouts[f.airplane_id] for f in flights}
+
+    @staticmethod
+    def build_seat_map(flight, occupancy, inventory=None, layout=None):
+        """
+        Construye la grilla por vuelo:
+          - rows: [{row, seats:[{id,col,num,status}]}] sobre el layout cacheado del avión (sin leer Seat);
+            el estado de cada asiento sale del bit de su posición en occupancy
+          - version/updated_at: los del inventario del vuelo
+        """
+        if layout is None:
+            layout = get_seat_layout(flight.airplane)
 
         rows = []
-        for r in sorted(rows_dict.keys()):
-            rows.append({"row": r, "seats": sorted(rows_dict[r], key=lambda x: x["col"])})
+        pos = 0
+        for row, seats in layout.rows:
+            cells = []
+            for sid, col, num in seats:
+                cells.append({"id": sid, "col": col, "num": num, "status": occupancy.status(pos)})
+                pos += 1
+            rows.append({"row": row, "seats": cells})
 
-        version = getattr(flight, "seatmap_version", 1)
-        updated_at = getattr(flight, "seatmap_updated_at", timezone.now())
-        return {
+        seat_map = {
             "rows": rows,
             "legend": {STATUS_AVAILABLE: "#", STATUS_CONFIRMED: "#", STATUS_HELD: "#"},
-            "version": version,
-            "updated_at": updated_at.isoformat().replace("+00:00", "Z"),
+        }
+        seat_map.update(SeatReadService._seat_map_meta(occupancy, inventory))
+        return seat_map
+
+    @staticmethod
+    def build_seat_maps(flights, occupancy_by_flight, inventory_by_flight=None):
+        """{flight_id: seat_map} de todo el itinerario: los layouts se cargan juntos
+        y el estado sale del mismo pase de ocupación (get_occupancy_by_flight)."""
+        inventory_by_flight = inventory_by_flight or {}
+        layouts = SeatReadService.get_layouts_by_flight(flights)
+        return {
+            f.id: SeatReadService.build_seat_map(
+                f, occupancy_by_flight[f.id], inventory_by_flight.get(f.id), layout=layouts[f.id]
+            )
+            for f in flights
+        }
+
+    @staticmethod
+    def build_seat_map_delta(flight, occupancy, changed_ids, since_version, inventory):
+        """
+        Solo los asientos que cambiaron desde since_version:
+          - changes: [{id,row,col,num,status}]
+        """
+        layout = get_seat_layout(flight.airplane)
+        changes = []
+        for pos in sorted(layout.index[sid] for sid in changed_ids if sid in layout.index):
+            sid, row, col, num = layout.cells[pos]
+            changes.append({"id": sid, "row": row, "col": col, "num": num, "status": occupancy.status(pos)})
+
+        seat_map = {"delta": True, "since_version": since_version, "changes": changes}
+        seat_map.update(SeatReadService._seat_map_meta(occupancy, inventory))
+        return seat_map
+
+    @staticmethod
+    def _seat_map_meta(occupancy, inventory):
+        """version/updated_at persistidos en FlightInventory (suben con cada hold, confirmación o liberación)."""
+        if inventory is None:
+            return {
+                "version": None,
+                "updated_at": None,
+                "available": occupancy.free_count,
+                "capacity": occupancy.size,
+            }
+        return {
+            "version": inventory.version,
+            "updated_at": inventory.updated_at.isoformat().replace("+00:00", "Z"),
+            "available": inventory.available,
+            "capacity": inventory.capacity,
         }
 
     @staticmethod
@@ -95,6 +219,7 @@ class SeatReadService:
             return []
 
         qs = (FlightSegment.objects
+              .live()
               .filter(flight__in=flights,
                       itinerary__passenger__document__in=passenger_docs)
               .values("flight_id", "seat_id",
@@ -0,0 +1,114 @@
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from airplane.models import Airplane
+from airplane.services.airplane_service import ensure_airplane_seats
+from flight.models import Airport, Route, Flight
+from reservations.models import Passenger, Itinerary, FlightSegment
+from reservations.services.inventory import FlightInventoryService
+from reservations.services.itinerary_totals import ItineraryTotalsService
+from reservations.services.route_graph import add_route_to_graph, invalidate_route_graph
+from reservations.services import search_cache
+
+
+# -------------------- Índice de rutas --------------------
+
+@receiver(post_save, sender=Route)
+def update_route_graph_on_route_save(sender, instance, created, **kwargs):
+    """Las altas se aplican en forma incremental; una edición puede mover la ruta, se reconstruye.
+    Todo recién al confirmar: una ruta revertida no puede quedar como arista fantasma en el grafo."""
+    if created:
+        transaction.on_commit(lambda: add_route_to_graph(instance))
+    else:
+        transaction.on_commit(invalidate_route_graph)
+
+
+@receiver(post_delete, sender=Route)
+@receiver([post_save, post_delete], sender=Airport)
+def invalidate_route_graph_on_change(sender, **kwargs):
+    """Bajas de rutas o cambios de aeropuertos (ej. código) invalidan el grafo en memoria.
+    Recién al confirmar: si otro proceso reconstruyera antes, guardaría los datos viejos con la versión nueva."""
+    transaction.on_commit(invalidate_route_graph)
+
+
+# -------------------- Inventario por vuelo --------------------
+
+@receiver(post_save, sender=Flight)
+def sync_inventory_capacity_on_flight_save(sender, instance, created, **kwargs):
+    """Alta del inventario o recálculo de capacidad si cambió el avión
+    (un cambio de estado o de precio no toca los asientos)."""
+    if created or instance.airplane_changed():
+        # Un avión con cabina compartida recién tiene asientos cuando vuela
+        if instance.airplane.cabin_layout_id:
+            ensure_airplane_seats(instance.airplane)
+        FlightInventoryService.sync_capacity([instance.id])
+    instance._loaded_airplane_id = instance.airplane_id
+
+
+@receiver(post_save, sender=FlightSegment)
+def sync_inventory_on_segment_save(sender, instance, **kwargs):
+    new_state = instance.inventory_state()
+    FlightInventoryService.apply_transition(getattr(instance, "_inventory_state", None), new_state)
+    instance._inventory_state = new_state
+
+
+def _deletes_flights(origin) -> bool:
+    """El borrado en cascada viene de un vuelo (o de algo que se lleva sus vuelos): el inventario
+    se borra con el vuelo, no hay contadores que mantener."""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model in (Flight, Route, Airport, Airplane)
+
+
+@receiver(post_delete, sender=FlightSegment)
+def sync_inventory_on_segment_delete(sender, instance, origin=None, **kwargs):
+    # Los borrados en bloque (FlightInventoryService.delete_segments) ya descontaron por vuelo
+    if getattr(origin, "_inventory_synced", False) or _deletes_flights(origin):
+        return
+    state = getattr(instance, "_inventory_state", None) or instance.inventory_state()
+    FlightInventoryService.apply_transition(state, None)
+
+
+# -------------------- Totales de itinerario --------------------
+
+@receiver(post_save, sender=FlightSegment)
+def sync_itinerary_total_on_segment_save(sender, instance, **kwargs):
+    new_state = instance.total_state()
+    ItineraryTotalsService.apply_transition(getattr(instance, "_total_state", None), new_state)
+    instance._total_state = new_state
+
+
+@receiver(post_delete, sender=FlightSegment)
+def sync_itinerary_total_on_segment_delete(sender, instance, origin=None, **kwargs):
+    # Los borrados en bloque recalculan con un UPDATE; si se borra el itinerario (o su pasajero)
+    # en cascada, no hay total que mantener
+    if getattr(origin, "_totals_synced", False):
+        return
+    if isinstance(origin, (Itinerary, Passenger)) or getattr(origin, "model", None) in (Itinerary, Passenger):
+        return
+    state = getattr(instance, "_total_state", None) or instance.total_state()
+    ItineraryTotalsService.apply_transition(state, None)
+
+
+# -------------------- Cache de búsquedas --------------------
+
+@receiver([post_save, post_delete], sender=Route)
+@receiver([post_save, post_delete], sender=Airport)
+def bump_search_network_on_change(sender, instance, **kwargs):
+    search_cache.bump_network()
+    if sender is Route:
+        search_cache.bump_routes([instance.id])
+
+
+@receiver([post_save, post_delete], sender=Flight)
+def bump_search_versions_on_flight_change(sender, instance, **kwargs):
+    # Un vuelo nuevo en una ruta candidata también invalida (por eso se sella la ruta)
+    search_cache.bump_routes([instance.route_id])
+    search_cache.bump_flights([instance.id])
+
+
+@receiver([post_save, post_delete], sender=FlightSegment)
+def bump_search_versions_on_segment_change(sender, instance, **kwargs):
+    # Corre también en los borrados en bloque: la disponibilidad del vuelo cambió
+    search_cache.bump_flights([instance.flight_id])
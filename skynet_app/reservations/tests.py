@@ -1,3 +1,1080 @@
-from django.test import TestCase
+import random
+from contextlib import redirect_stdout
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from airplane.models import Airplane, Seat
+from flight.models import Airport, Route, Flight
+from airplane.services import cabin_layout, seat_layout
+from airplane.services.seat_layout import get_seat_layout
+from services.calculate_data_route_chain import calc_route_chain
+from reservations.models import FlightInventory, FlightSegment, Itinerary, Passenger
+from reservations.services.expiry import ExpirySweeper
+from reservations.services.inventory import FlightInventoryService
+from reservations.services.itinerary_totals import ItineraryTotalsService
+from reservations.services.occupancy import SeatOccupancy
+from reservations.services.reservations import (
+    FlightSegmentService, ItineraryService, ReservationService, RouteService, SeatConflictError, SeatService,
+)
+from reservations.services.route_finder import find_route_chain, find_k_shortest_route_chains
+from reservations.services.route_graph import (
+    GRAPH_VERSION_KEY, RouteEdge, RouteGraph, get_route_graph, invalidate_route_graph,
+)
+from reservations.services.search_cache import SearchCache, bump_flights
+from reservations.services.seat_assignment import find_seat_block
+from reservations.services.seat_holds import SeatHoldRegistry
+from reservations.services.seat_read import SeatReadService
+
+
+class FindAvailableRoutesQueryCountTest(TestCase):
+    SEARCH_DATE = date(2030, 1, 10)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.airplane = Airplane.objects.create(model="E190", rows=3, columns=2)
+        Seat.objects.bulk_create([
+            Seat(airplane=cls.airplane, number=f"{row}{col}", row=row, column=col)
+            for row in range(1, 4) for col in "AB"
+        ])
+        cls.airports = {
+            code: Airport.objects.create(name=code, code=code, city=code, country="AR")
+            for code in ["AEP", "COR", "MDZ", "ROS", "BRC"]
+        }
+
+    def setUp(self):
+        invalidate_route_graph()  # el grafo del proceso puede venir de otro test
+
+    def _route(self, origin, destination, duration):
+        # El grafo se actualiza en on_commit, que TestCase no ejecuta por su cuenta
+        with self.captureOnCommitCallbacks(execute=True):
+            return Route.objects.create(
+                origin_airport=self.airports[origin],
+                destination_airport=self.airports[destination],
+                estimated_duration=duration,
+            )
+
+    def _flight(self, route, hour):
+        departure = timezone.make_aware(datetime.combine(self.SEARCH_DATE, time(hour)))
+        return Flight.objects.create(
+            airplane=self.airplane, route=route, status="active", base_price=Decimal("100.00"),
+            departure_time=departure,
+            arrival_time=departure + timedelta(minutes=route.estimated_duration),
+        )
+
+    def _search(self):
+        get_route_graph()  # el índice de rutas se arma una vez por proceso, no por búsqueda
+        with self.assertNumQueries(3):
+            chains, _ = RouteService.find_available_routes("AEP", "BRC", self.SEARCH_DATE, 2, max_legs=3, k=10)
+        return chains
+
+    def test_search_cost_does_not_grow_with_chains_and_legs(self):
+        self._flight(self._route("AEP", "BRC", 120), 8)
+        self.assertEqual(len(self._search()), 1)
+
+        for hub in ["COR", "MDZ", "ROS"]:
+            self._flight(self._route("AEP", hub, 60), 6)
+            self._flight(self._route(hub, "BRC", 60), 11)
+        self._flight(self._route("COR", "MDZ", 30), 8)
+        self._flight(self._route("MDZ", "ROS", 30), 9)
+
+        self.assertGreater(len(self._search()), 4)
+
+
+class NetworkTestCase(TestCase):
+    """Red chica de aeropuertos y rutas con un avión de 3x2; cada test arranca con caches y grafo limpios."""
+    SEARCH_DATE = date(2030, 1, 10)
+    ROUTES = [
+        ("AEP", "COR", 75), ("COR", "BRC", 90), ("AEP", "BRC", 140), ("AEP", "MDZ", 100),
+        ("MDZ", "BRC", 80), ("COR", "MDZ", 60), ("BRC", "USH", 120), ("NQN", "AEP", 110),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.airplane = Airplane.objects.create(model="E190", rows=3, columns=2)
+        Seat.objects.bulk_create([
+            Seat(airplane=cls.airplane, number=f"{row}{col}", row=row, column=col)
+            for row in range(1, 4) for col in "AB"
+        ])
+        codes = {code for origin, destination, _ in cls.ROUTES for code in (origin, destination)}
+        cls.airports = {
+            code: Airport.objects.create(name=code, code=code, city=code, country="AR") for code in sorted(codes)
+        }
+        cls.routes = {
+            (origin, destination): Route.objects.create(
+                origin_airport=cls.airports[origin],
+                destination_airport=cls.airports[destination],
+                estimated_duration=duration,
+            )
+            for origin, destination, duration in cls.ROUTES
+        }
+
+    def setUp(self):
+        # Cache compartido, caches del proceso y grafo de rutas pueden venir de otro test
+        cache.clear()
+        seat_layout._layouts.clear()
+        cabin_layout._geometries.clear()
+        invalidate_route_graph()
+
+    def _at(self, hour, minute=0, day=None):
+        return timezone.make_aware(datetime.combine(day or self.SEARCH_DATE, time(hour, minute)))
+
+    def _flight(self, origin, destination, hour, minute=0, day=None, price="100.00", airplane=None):
+        route = self.routes[(origin, destination)]
+        departure = self._at(hour, minute, day)
+        return Flight.objects.create(
+            airplane=airplane or self.airplane, route=route, status="active", base_price=Decimal(price),
+            departure_time=departure,
+            arrival_time=departure + timedelta(minutes=route.estimated_duration),
+        )
+
+
+class RouteGraphTest(NetworkTestCase):
+    @staticmethod
+    def _edges(graph):
+        return {(e.origin, e.destination): (e.route_id, e.duration) for edges in graph.adjacency.values() for e in edges}
+
+    def test_build_indexes_every_route_in_one_query(self):
+        with self.assertNumQueries(1):
+            graph = RouteGraph.build(version=1)
+
+        self.assertEqual(self._edges(graph), {
+            key: (route.id, route.estimated_duration) for key, route in self.routes.items()
+        })
+        self.assertEqual({e.destination for e in graph.outgoing("AEP")}, {"COR", "BRC", "MDZ"})
+        self.assertEqual(graph.outgoing("USH"), [])
+
+    def test_graph_is_reused_until_the_version_changes(self):
+        graph = get_route_graph()
+        with self.assertNumQueries(0):
+            self.assertIs(get_route_graph(), graph)
+
+        # Otro proceso cambió las rutas: sube la versión compartida y este proceso reconstruye
+        cache.incr(GRAPH_VERSION_KEY)
+        with self.assertNumQueries(1):
+            rebuilt = get_route_graph()
+        self.assertIsNot(rebuilt, graph)
+        self.assertEqual(rebuilt.version, graph.version + 1)
+
+    def test_new_route_is_added_without_rebuilding(self):
+        graph = get_route_graph()
+        graph.hops
+        with self.captureOnCommitCallbacks(execute=True):
+            route = Route.objects.create(origin_airport=self.airports["USH"], destination_airport=self.airports["NQN"],
+                                         estimated_duration=200)
+
+        with self.assertNumQueries(0):
+            updated = get_route_graph()
+        self.assertEqual(self._edges(updated)[("USH", "NQN")], (route.id, 200))
+        self.assertNotIn(("USH", "NQN"), self._edges(graph))  # el grafo anterior no se modifica
+        self.assertEqual(updated.min_hops("BRC", "COR"), 4)  # BRC → USH → NQN → AEP → COR
+
+    def test_route_edit_and_delete_rebuild_the_graph(self):
+        get_route_graph()
+        route = self.routes[("AEP", "COR")]
+        with self.captureOnCommitCallbacks(execute=True):
+            route.destination_airport = self.airports["USH"]
+            route.save()
+        self.assertEqual(self._edges(get_route_graph())[("AEP", "USH")], (route.id, 75))
+        self.assertNotIn(("AEP", "COR"), self._edges(get_route_graph()))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            route.delete()
+        self.assertNotIn(("AEP", "USH"), self._edges(get_route_graph()))
+
+    def test_airport_changes_rebuild_the_graph(self):
+        get_route_graph()
+        airport = self.airports["NQN"]
+        with self.captureOnCommitCallbacks(execute=True):
+            airport.code = "NEU"
+            airport.save()
+        self.assertEqual({e.destination for e in get_route_graph().outgoing("NEU")}, {"AEP"})
+        self.assertEqual(get_route_graph().outgoing("NQN"), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            airport.delete()  # se lleva sus rutas en cascada
+        self.assertEqual(get_route_graph().outgoing("NEU"), [])
+
+
+class KShortestRouteChainsTest(NetworkTestCase):
+    @staticmethod
+    def _durations(chains):
+        return [sum(route.estimated_duration for route in chain) for chain in chains]
+
+    def test_chains_are_ranked_by_total_duration(self):
+        chains = find_k_shortest_route_chains("AEP", "BRC", k=10, max_legs=3)
+        self.assertEqual(self._durations(chains), [140, 165, 180, 215])
+
+    def test_max_legs_and_k_bound_the_search(self):
+        self.assertEqual(self._durations(find_k_shortest_route_chains("AEP", "BRC", k=10, max_legs=2)), [140, 165, 180])
+        self.assertEqual(self._durations(find_k_shortest_route_chains("AEP", "BRC", k=2, max_legs=3)), [140, 165])
+        self.assertIsNone(find_k_shortest_route_chains("AEP", "USH", k=5, max_legs=1))
+
+    def test_matches_exhaustive_enumeration(self):
+        for origin, destination in [("AEP", "BRC"), ("NQN", "USH"), ("COR", "BRC")]:
+            for max_legs in (1, 2, 3, 4):
+                every = [c for c in find_route_chain(origin, destination) or [] if len(c) <= max_legs]
+                found = find_k_shortest_route_chains(origin, destination, k=3, max_legs=max_legs) or []
+                self.assertEqual(self._durations(found), sorted(self._durations(every))[:3])
+                self.assertEqual(len({tuple(r.id for r in c) for c in found}), len(found))
+
+
+class ConnectionScanTest(NetworkTestCase):
+    def _itinerary(self, route_keys, **kwargs):
+        itineraries, _ = RouteService.find_available_itineraries("AEP", "BRC", self.SEARCH_DATE, 1, **kwargs)
+        route_ids = [self.routes[key].id for key in route_keys]
+        return next((i for i in itineraries if i["route_ids"] == route_ids), None)
+
+    def test_connection_respects_minimum_connection_time(self):
+        first = self._flight("AEP", "COR", 8)       # llega 9:15
+        tight = self._flight("COR", "BRC", 9, 40)   # 25 minutos de conexión
+        ok = self._flight("COR", "BRC", 10, 30)
+        self._flight("COR", "BRC", 12)
+
+        itinerary = self._itinerary([("AEP", "COR"), ("COR", "BRC")])
+        self.assertEqual(itinerary["flight_ids"], [first.id, ok.id])
+        self.assertEqual(itinerary["departure_time"], first.departure_time)
+        self.assertEqual(itinerary["arrival_time"], ok.arrival_time)
+
+        itinerary = self._itinerary([("AEP", "COR"), ("COR", "BRC")], min_connection_minutes=10)
+        self.assertEqual(itinerary["flight_ids"], [first.id, tight.id])
+
+    def test_first_leg_must_leave_on_the_search_day(self):
+        self._flight("AEP", "COR", 8, day=self.SEARCH_DATE - timedelta(days=1))
+        self._flight("COR", "BRC", 11)
+        itineraries, errors = RouteService.find_available_itineraries("AEP", "BRC", self.SEARCH_DATE, 1)
+        self.assertEqual(itineraries, [])
+        self.assertTrue(errors)
+
+    def test_connection_can_leave_the_next_day(self):
+        first = self._flight("AEP", "COR", 22)
+        next_day = self._flight("COR", "BRC", 7, day=self.SEARCH_DATE + timedelta(days=1))
+        itinerary = self._itinerary([("AEP", "COR"), ("COR", "BRC")])
+        self.assertEqual(itinerary["flight_ids"], [first.id, next_day.id])
+
+    def test_booking_uses_the_flights_the_search_chose(self):
+        # Mismo recorrido otro día, con id menor: antes se reservaba el primer vuelo activo de la ruta
+        self._flight("AEP", "BRC", 8, day=self.SEARCH_DATE - timedelta(days=7))
+        chosen = self._flight("AEP", "BRC", 8)
+        passenger = Passenger.objects.create(name="Ana", document="30111222", email="ana@example.com")
+
+        itinerary = ItineraryService.create_auto(passenger, "AEP", "BRC", self.SEARCH_DATE)
+        self.assertEqual(list(FlightSegment.objects.filter(itinerary=itinerary).values_list("flight_id", flat=True)),
+                         [chosen.id])
+
+
+class FlightInventoryCountersTest(NetworkTestCase):
+    def setUp(self):
+        super().setUp()
+        self.flight = self._flight("AEP", "COR", 8)
+        self.seats = list(self.airplane.seats.order_by("id"))
+        passenger = Passenger.objects.create(name="Ana", document="30111222", email="ana@example.com")
+        self.itinerary = Itinerary.objects.create(passenger=passenger, reservation_code="INV001")
+
+    def _segment(self, seat, status):
+        return FlightSegment.objects.create(itinerary=self.itinerary, flight=self.flight, seat=seat,
+                                            price=Decimal("100.00"), status=status)
+
+    def _counters(self):
+        inventory = FlightInventory.objects.get(flight=self.flight)
+        return inventory.capacity, inventory.held, inventory.confirmed, inventory.available
+
+    def test_counters_follow_segment_changes(self):
+        self.assertEqual(self._counters(), (6, 0, 0, 6))
+        reserved = self._segment(self.seats[0], "reserved")
+        confirmed = self._segment(self.seats[1], "confirmed")
+        self.assertEqual(self._counters(), (6, 1, 1, 4))
+
+        reserved = FlightSegment.objects.get(pk=reserved.pk)
+        reserved.status = "confirmed"
+        reserved.save()
+        self.assertEqual(self._counters(), (6, 0, 2, 4))
+
+        confirmed.delete()
+        self.assertEqual(self._counters(), (6, 0, 1, 5))
+        self.itinerary.delete()
+        self.assertEqual(self._counters(), (6, 0, 0, 6))
+
+    def _assert_no_orphan_inventory(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA foreign_key_check")
+            self.assertEqual(cursor.fetchall(), [])
+        self.assertFalse(FlightInventory.objects.exists())
+
+    def test_deleting_a_flight_takes_its_inventory(self):
+        self._segment(self.seats[0], "reserved")
+        self._segment(self.seats[1], "confirmed")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Flight.objects.filter(pk=self.flight.pk).delete()
+
+        self._assert_no_orphan_inventory()
+        self.assertFalse(FlightSegment.objects.exists())
+
+    def test_deleting_a_route_takes_its_flights_inventory(self):
+        self._segment(self.seats[0], "reserved")
+        self._segment(self.seats[1], "confirmed")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.flight.route.delete()
+
+        self._assert_no_orphan_inventory()
+
+    def test_capacity_resyncs_only_when_the_airplane_changes(self):
+        flight = Flight.objects.get(pk=self.flight.pk)
+        with CaptureQueriesContext(connection) as ctx:
+            flight.base_price = Decimal("150.00")
+            flight.save()
+        self.assertFalse(any("flightinventory" in q["sql"] for q in ctx.captured_queries))
+
+        smaller = Airplane.objects.create(model="ATR", rows=2, columns=2)
+        Seat.objects.bulk_create([Seat(airplane=smaller, number=f"{r}{c}", row=r, column=c)
+                                  for r in (1, 2) for c in "AB"])
+        flight.airplane = smaller
+        flight.save()
+        self.assertEqual(self._counters()[0], 4)
+
+    def test_rebuild_command_detects_and_fixes_drift(self):
+        self._segment(self.seats[0], "reserved")
+        FlightInventory.objects.filter(flight=self.flight).update(held=5)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_flight_inventory", "--check", stdout=StringIO())
+        call_command("rebuild_flight_inventory", stdout=StringIO())
+        self.assertEqual(self._counters(), (6, 1, 0, 5))
+        call_command("rebuild_flight_inventory", "--check", stdout=StringIO())
+
+
+class CalcRouteChainTest(NetworkTestCase):
+    def test_two_queries_and_chain_order_preserved(self):
+        first = self._flight("AEP", "COR", 8, price="50")
+        self._flight("AEP", "COR", 12, price="70")
+        second = self._flight("COR", "BRC", 11, price="30")
+        direct = self._flight("AEP", "BRC", 11, price="300")
+        two_legs = [self.routes[("AEP", "COR")].id, self.routes[("COR", "BRC")].id]
+        chains = [two_legs, [self.routes[("AEP", "BRC")].id]]
+
+        with self.assertNumQueries(2):
+            data = calc_route_chain(chains, Route.objects, Flight.objects, search_date=self.SEARCH_DATE,
+                                    flight_chains_ids=[[first.id, second.id], [direct.id]])
+
+        self.assertEqual([i["route_ids"] for i in data["itineraries"]], chains)
+        self.assertEqual(data["itineraries"][0]["route_summary"], "AEP → COR → BRC")
+        self.assertEqual(data["itineraries"][0]["flight_ids"], [first.id, second.id])
+        self.assertEqual(data["itineraries"][0]["total_price"], "80.00")
+        self.assertEqual(data["itineraries"][1]["total_price"], "300.00")
+        self.assertEqual((data["origin"], data["destination"]), ("AEP", "BRC"))
+
+    def test_without_flight_ids_uses_first_active_flight_of_the_day(self):
+        first = self._flight("AEP", "COR", 8, price="50")
+        self._flight("AEP", "COR", 12, price="70")
+        self._flight("AEP", "COR", 6, day=self.SEARCH_DATE + timedelta(days=1), price="10")
+        with self.assertNumQueries(2):
+            data = calc_route_chain([[self.routes[("AEP", "COR")].id]], Route.objects, Flight.objects,
+                                    search_date=self.SEARCH_DATE)
+        self.assertEqual(data["itineraries"][0]["flight_ids"], [first.id])
+        self.assertEqual(data["itineraries"][0]["total_price"], "50.00")
+
+
+class SearchCacheInvalidationTest(NetworkTestCase):
+    def setUp(self):
+        super().setUp()
+        self.small = Airplane.objects.create(model="ATR", rows=1, columns=2)
+        Seat.objects.bulk_create([Seat(airplane=self.small, number=f"1{c}", row=1, column=c) for c in "AB"])
+
+    def _search(self):
+        found, _ = RouteService.find_available_itineraries("AEP", "BRC", self.SEARCH_DATE, 2)
+        return found
+
+    def test_repeated_search_is_served_from_cache(self):
+        self._flight("AEP", "BRC", 8, airplane=self.small)
+        self.assertEqual(len(self._search()), 1)
+        with self.assertNumQueries(0):
+            found, _ = RouteService.find_available_itineraries(" aep", "brc ", self.SEARCH_DATE, 2)
+        self.assertEqual(len(found), 1)
+
+    def test_committed_changes_invalidate_results(self):
+        flight = self._flight("AEP", "BRC", 8, airplane=self.small)
+        self.assertEqual(len(self._search()), 1)
+
+        passenger = Passenger.objects.create(name="Ana", document="30111222", email="ana@example.com")
+        itinerary = Itinerary.objects.create(passenger=passenger, reservation_code="SRC001")
+        with self.captureOnCommitCallbacks(execute=True):
+            FlightSegment.objects.create(itinerary=itinerary, flight=flight, seat=self.small.seats.first(),
+                                         price=Decimal("100.00"), status="reserved")
+        self.assertEqual(self._search(), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._flight("AEP", "BRC", 12, airplane=self.small)
+        self.assertEqual(len(self._search()), 1)
+
+    def test_bumps_are_published_only_on_commit(self):
+        flight = self._flight("AEP", "BRC", 8, airplane=self.small)
+        stamps = SearchCache.stamps(flight_ids=[flight.id])
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            bump_flights([flight.id])
+        self.assertEqual(SearchCache.stamps(flight_ids=[flight.id]), stamps)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(SearchCache.stamps(flight_ids=[flight.id]), stamps)
+
+    def test_entry_stamped_before_a_change_is_born_stale(self):
+        flight = self._flight("AEP", "BRC", 8, airplane=self.small)
+        stamps = SearchCache.stamps(flight_ids=[flight.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_flights([flight.id])  # cambio que llega mientras se calcula el resultado
+        SearchCache.set("search:result:test", ([], []), stamps)
+        self.assertIsNone(SearchCache.get("search:result:test"))
+
+
+class FareCalendarTest(NetworkTestCase):
+    def test_lowest_price_per_day_only_counts_feasible_itineraries(self):
+        self._flight("AEP", "COR", 8, price="50")          # llega 9:15
+        self._flight("COR", "BRC", 9, 30, price="10")      # conexión de 15 minutos
+        self._flight("COR", "BRC", 7, price="5")           # sale antes de llegar
+        self._flight("COR", "BRC", 11, price="90")
+        self._flight("COR", "BRC", 13, price="40")
+        self._flight("AEP", "BRC", 12, price="200")
+        next_day = self.SEARCH_DATE + timedelta(days=1)
+        self._flight("AEP", "BRC", 9, day=next_day, price="120")
+
+        calendar = RouteService.fare_calendar("AEP", "BRC", self.SEARCH_DATE, next_day + timedelta(days=1), 1)
+
+        self.assertEqual([day["date"] for day in calendar],
+                         [self.SEARCH_DATE, next_day, next_day + timedelta(days=1)])
+        self.assertEqual(calendar[0]["lowest_price"], Decimal("90.00"))
+        self.assertEqual(calendar[0]["route_ids"], [self.routes[("AEP", "COR")].id, self.routes[("COR", "BRC")].id])
+        self.assertEqual(calendar[1]["lowest_price"], Decimal("120.00"))
+        self.assertEqual(calendar[1]["route_ids"], [self.routes[("AEP", "BRC")].id])
+        self.assertIsNone(calendar[2]["lowest_price"])
+
+    def test_flights_without_enough_seats_are_skipped(self):
+        self._flight("AEP", "BRC", 8, price="100")
+        calendar = RouteService.fare_calendar("AEP", "BRC", self.SEARCH_DATE, self.SEARCH_DATE, 7)
+        self.assertIsNone(calendar[0]["lowest_price"])
+
+    def test_query_count_does_not_grow_with_the_range(self):
+        for offset in range(5):
+            self._flight("AEP", "BRC", 8, day=self.SEARCH_DATE + timedelta(days=offset))
+        get_route_graph()
+        with self.assertNumQueries(3):  # rutas de las cadenas, vuelos del rango, inventario
+            RouteService.fare_calendar("AEP", "BRC", self.SEARCH_DATE, self.SEARCH_DATE + timedelta(days=6), 2)
+
+    def test_api_formats_prices(self):
+        self._flight("AEP", "BRC", 8, price="100")
+        response = self.client.get("/api/reservations/itineraries/calendar/", {
+            "origin": "AEP", "destination": "BRC", "date": str(self.SEARCH_DATE), "passengers": 1, "days": 1,
+        })
+        self.assertEqual(response.status_code, 200)
+        days = {day["date"]: day["lowest_price"] for day in response.json()["days"]}
+        self.assertEqual(days[str(self.SEARCH_DATE)], "100.00")
+        self.assertIsNone(days[str(self.SEARCH_DATE + timedelta(days=1))])
+
+
+class ReachabilityMatrixTest(NetworkTestCase):
+    def test_min_hops_and_reachable_destinations(self):
+        graph = get_route_graph()
+        self.assertEqual(graph.min_hops("AEP", "BRC"), 1)
+        self.assertEqual(graph.min_hops("NQN", "USH"), 3)
+        self.assertIsNone(graph.min_hops("USH", "AEP"))
+        self.assertEqual(graph.reachable_from("AEP"), {"COR": 1, "MDZ": 1, "BRC": 1, "USH": 2})
+
+    def test_incremental_edge_matches_full_rebuild(self):
+        nodes = ["A", "B", "C", "D", "E"]
+        pairs = [("A", "B"), ("B", "C"), ("D", "E"), ("C", "D"), ("E", "A"), ("A", "C"), ("B", "E")]
+        edges = []
+        graph = RouteGraph([], 1)
+        graph.hops  # matriz ya calculada: with_edge la actualiza en lugar de descartarla
+        for route_id, (origin, destination) in enumerate(pairs, start=1):
+            edge = RouteEdge(route_id, origin, destination, 10)
+            edges.append(edge)
+            graph = graph.with_edge(edge, route_id + 1)
+            full = RouteGraph(edges, 0)
+            for a in nodes:
+                for b in nodes:
+                    self.assertEqual(graph.min_hops(a, b), full.min_hops(a, b), (a, b))
+
+    def test_new_route_reaches_the_graph_only_after_commit(self):
+        get_route_graph().hops
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Route.objects.create(origin_airport=self.airports["USH"], destination_airport=self.airports["NQN"],
+                                 estimated_duration=200)
+        self.assertIsNone(get_route_graph().min_hops("USH", "NQN"))
+        for callback in callbacks:
+            callback()
+        self.assertEqual(get_route_graph().min_hops("BRC", "NQN"), 2)
+
+    def test_destinations_endpoint(self):
+        response = self.client.get("/api/reservations/airports/aep/destinations/")
+        self.assertEqual(response.status_code, 200)
+        destinations = {d["code"]: d["min_legs"] for d in response.json()["destinations"]}
+        self.assertEqual(destinations, {"COR": 1, "MDZ": 1, "BRC": 1, "USH": 2})
+
+
+class SeatOccupancyTest(NetworkTestCase):
+    def test_bit_planes(self):
+        occupancy = SeatOccupancy(5)
+        occupancy.hold(1)
+        occupancy.hold(3)
+        occupancy.confirm(3)
+        occupancy.confirm(4)
+        self.assertEqual([occupancy.status(pos) for pos in range(5)],
+                         ["available", "held", "available", "confirmed", "confirmed"])
+        self.assertEqual([occupancy.is_free(pos) for pos in range(5)], [True, False, True, False, False])
+        self.assertEqual(occupancy.free_count, 2)
+        with self.assertRaises(IndexError):
+            occupancy.status(5)
+
+        self.assertEqual((occupancy.held_count, occupancy.confirmed_count), (1, 2))
+        occupancy.release(3)
+        occupancy.release(1)
+        self.assertEqual((occupancy.held_count, occupancy.confirmed_count, occupancy.free_count), (0, 1, 4))
+
+    def test_bytes_round_trip(self):
+        occupancy = SeatOccupancy(300)
+        for pos in range(0, 300, 3):
+            occupancy.confirm(pos)
+        occupancy.hold(298)
+
+        data = occupancy.to_bytes()
+
+        self.assertEqual(len(data), 4 + 2 * 38)
+        self.assertEqual(SeatOccupancy.from_bytes(data), occupancy)
+        self.assertEqual(SeatOccupancy.from_bytes(SeatOccupancy(0).to_bytes()), SeatOccupancy(0))
+
+    def test_occupancy_from_segments_and_registry_holds(self):
+        flight = self._flight("AEP", "BRC", 8)
+        seats = list(self.airplane.seats.order_by("row", "column"))
+        passenger = Passenger.objects.create(name="Ana", document="30111222", email="ana@example.com")
+        itinerary = Itinerary.objects.create(passenger=passenger, reservation_code="OCC001")
+        for seat, status in [(seats[0], "confirmed"), (seats[1], "reserved"), (seats[2], "reserved")]:
+            FlightSegment.objects.create(itinerary=itinerary, flight=flight, seat=seat,
+                                         price=Decimal("100.00"), status=status)
+        FlightSegment.objects.filter(seat=seats[2]).update(reserved_at=timezone.now() - timedelta(hours=1))
+        SeatHoldRegistry.acquire(flight.id, seats[3].id, "token:D0")
+
+        occupancy_by_flight, held_by_flight, lapsed_by_flight = SeatReadService.get_occupancy_by_flight([flight])
+        layout = SeatReadService.get_layouts_by_flight([flight])[flight.id]
+        statuses = [occupancy_by_flight[flight.id].status(layout.index[seat.id]) for seat in seats]
+        # el reserved vencido queda libre aunque siga en la base
+        self.assertEqual(statuses, ["confirmed", "held", "available", "held", "available", "available"])
+        self.assertEqual(set(held_by_flight[flight.id]), {seats[1].id, seats[3].id})
+        self.assertEqual(lapsed_by_flight[flight.id], {seats[2].id})
+
+    def test_stored_occupancy_is_cached_per_inventory_version(self):
+        flight = self._flight("AEP", "BRC", 8)
+        flights = list(Flight.objects.select_related("airplane").filter(pk=flight.pk))
+        seats = list(self.airplane.seats.order_by("row", "column"))
+        passenger = Passenger.objects.create(name="Ana", document="30111222", email="ana@example.com")
+        itinerary = Itinerary.objects.create(passenger=passenger, reservation_code="OCC002")
+        FlightSegment.objects.create(itinerary=itinerary, flight=flight, seat=seats[0],
+                                     price=Decimal("100.00"), status="confirmed")
+        SeatReadService.get_occupancy_by_flight(flights)
+
+        with self.assertNumQueries(1):  # solo el inventario: la ocupación sale del cache
+            occupancy_by_flight, _, _ = SeatReadService.get_occupancy_by_flight(flights)
+        self.assertEqual(occupancy_by_flight[flight.id].confirmed_count, 1)
+
+        # El segmento nuevo sube la versión del inventario: la entrada anterior deja de usarse
+        FlightSegment.objects.create(itinerary=Itinerary.objects.create(passenger=passenger, reservation_code="OCC003"),
+                                     flight=flight, seat=seats[1], price=Decimal("100.00"), status="reserved")
+        occupancy_by_flight, held_by_flight, _ = SeatReadService.get_occupancy_by_flight(flights)
+        self.assertEqual((occupancy_by_flight[flight.id].held_count, occupancy_by_flight[flight.id].confirmed_count),
+                         (1, 1))
+        self.assertEqual(set(held_by_flight[flight.id]), {seats[1].id})
+
+
+class PassengerSeatPayloadTest(NetworkTestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = self._flight("AEP", "COR", 8)
+        self.second = self._flight("COR", "BRC", 11)
+        self.passengers = [
+            Passenger.objects.create(name=f"P{i}", document=f"D{i}", email=f"p{i}@example.com") for i in range(4)
+        ]
+        itinerary = Itinerary.objects.create(passenger=self.passengers[0], reservation_code="PAY001")
+        FlightSegment.objects.create(itinerary=itinerary, flight=self.first, price=Decimal("100.00"),
+                                     seat=self.airplane.seats.order_by("row", "column").first(), status="confirmed")
+
+    def test_seat_lists_are_built_once_per_flight(self):
+        with self.assertNumQueries(3):  # vuelos, asientos de todos los vuelos, pasajeros
+            data = SeatService.get_available_seats_for_passengers([p.id for p in self.passengers],
+                                                                  [self.first.id, self.second.id])
+        self.assertEqual(len(data), 8)
+        self.assertEqual([entry["flight"].id for entry in data[:2]], [self.first.id, self.second.id])
+        self.assertIs(data[0]["seats"], data[2]["seats"])
+        self.assertEqual([seat["segment_status"] for seat in data[0]["seats"]][:2], ["confirmed", "available"])
+
+    def test_docs_payload_references_flights_by_id(self):
+        data = SeatService.get_available_seats_for_passengers_docs(
+            [p.document for p in self.passengers], [self.routes[("AEP", "COR")].id, self.routes[("COR", "BRC")].id])
+        self.assertEqual(set(data["flights"]), {self.first.id, self.second.id})
+        self.assertEqual(len(data["flights"][self.first.id]["seats"]), 6)
+        self.assertEqual({(a["passenger_document"], a["flight_id"]) for a in data["assignments"]},
+                         {(p.document, f.id) for p in self.passengers for f in (self.first, self.second)})
+        self.assertEqual(set(data["assignments"][0]), {"key", "passenger_document", "flight_id"})
+
+
+class GroupSeatAssignmentTest(NetworkTestCase):
+    def setUp(self):
+        super().setUp()
+        self.wide = Airplane.objects.create(model="A320", rows=10, columns=6)
+        Seat.objects.bulk_create([
+            Seat(airplane=self.wide, number=f"{row}{col}", row=row, column=col)
+            for row in range(1, 11) for col in "ABCDEF"
+        ])
+        self.layout = get_seat_layout(self.wide)
+
+    def _numbers(self, positions):
+        return [self.layout.cells[pos][3] for pos in positions]
+
+    def test_block_preferences(self):
+        occupancy = SeatOccupancy(len(self.layout))
+        self.assertEqual(self._numbers(find_seat_block(self.layout, occupancy, 3, aisles=[3])), ["1A", "1B", "1C"])
+        for pos in range(4):
+            occupancy.confirm(pos)
+        # contiguo sin cruzar el pasillo
+        self.assertEqual(self._numbers(find_seat_block(self.layout, occupancy, 2, aisles=[3])), ["1E", "1F"])
+        # 4 no entran de un lado del pasillo: misma fila
+        self.assertEqual(self._numbers(find_seat_block(self.layout, occupancy, 4, aisles=[3])),
+                         ["2A", "2B", "2C", "2D"])
+        # más que una fila: bloque compacto en filas vecinas
+        self.assertEqual(self._numbers(find_seat_block(self.layout, occupancy, 9, aisles=[3])),
+                         ["2A", "2B", "2C", "3A", "3B", "3C", "4A", "4B", "4C"])
+
+    def test_never_picks_occupied_seats(self):
+        rnd = random.Random(7)
+        for _ in range(100):
+            occupancy = SeatOccupancy(len(self.layout))
+            for pos in range(len(self.layout)):
+                if rnd.random() < 0.5:
+                    occupancy.confirm(pos)
+            size = rnd.randint(1, 12)
+            block = find_seat_block(self.layout, occupancy, size)
+            if occupancy.free_count < size:
+                self.assertIsNone(block)
+            else:
+                self.assertEqual(len(set(block)), size)
+                self.assertTrue(all(occupancy.is_free(pos) for pos in block))
+
+    def test_group_is_seated_together_on_every_leg(self):
+        first = self._flight("AEP", "COR", 8, airplane=self.wide)
+        second = self._flight("COR", "BRC", 11, airplane=self.wide)
+        passengers = [Passenger.objects.create(name=f"P{i}", document=f"D{i}", email=f"p{i}@example.com")
+                      for i in range(9)]
+        taken = Itinerary.objects.create(passenger=passengers[0], reservation_code="GRP000")
+        FlightSegment.objects.create(itinerary=taken, flight=first, seat=Seat.objects.get(airplane=self.wide, number="1C"),
+                                     price=Decimal("100.00"), status="confirmed")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            itineraries = ReservationService.create_automatic_reservations([p.id for p in passengers],
+                                                                           [first.id, second.id])
+
+        self.assertEqual(len(itineraries), 9)
+        seated = sorted(FlightSegment.objects.filter(flight=first, itinerary__in=itineraries)
+                        .values_list("seat__number", flat=True))
+        self.assertEqual(seated, ["1D", "1E", "1F", "2D", "2E", "2F", "3D", "3E", "3F"])
+        self.assertEqual(FlightSegment.objects.filter(flight=second, itinerary__in=itineraries).count(), 9)
+        self.assertEqual({i.total_price for i in itineraries}, {Decimal("200.00")})
+        self.assertEqual(FlightInventoryService.rebuild([first.id, second.id]), [])
+
+
+class BatchSeatMapsTest(NetworkTestCase):
+    def test_multi_leg_maps_cost_a_fixed_number_of_queries(self):
+        airplanes = []
+        for rows, columns in [(4, 4), (2, 2)]:
+            airplane = Airplane.objects.create(model=f"{rows}x{columns}", rows=rows, columns=columns)
+            Seat.objects.bulk_create([
+                Seat(airplane=airplane, number=f"{row}{chr(64 + col)}", row=row, column=chr(64 + col))
+                for row in range(1, rows + 1) for col in range(1, columns + 1)
+            ])
+            airplanes.append(airplane)
+        legs = [self._flight("AEP", "COR", 8), self._flight("COR", "MDZ", 10, airplane=airplanes[0]),
+                self._flight("MDZ", "BRC", 12, airplane=airplanes[1])]
+        flights = list(Flight.objects.select_related("airplane").filter(id__in=[f.id for f in legs]))
+
+        with self.assertNumQueries(3):  # asientos de todos los aviones + inventario + segmentos de todos los vuelos
+            occupancy_by_flight, _, _ = SeatReadService.get_occupancy_by_flight(flights)
+            seat_maps = SeatReadService.build_seat_maps(flights, occupancy_by_flight)
+        self.assertEqual({fid: sum(len(row["seats"]) for row in m["rows"]) for fid, m in seat_maps.items()},
+                         {legs[0].id: 6, legs[1].id: 16, legs[2].id: 4})
+
+        seat_layout._layouts.clear()
+        with self.assertNumQueries(1):  # layouts y ocupación desde el cache compartido: solo el inventario
+            occupancy_by_flight, _, _ = SeatReadService.get_occupancy_by_flight(flights)
+            SeatReadService.build_seat_maps(flights, occupancy_by_flight)
+
+
+class SeatHoldRegistryTest(NetworkTestCase):
+    def setUp(self):
+        super().setUp()
+        self.flight = self._flight("AEP", "BRC", 8)
+        self.seat = self.airplane.seats.order_by("row", "column").first()
+        self.key = f"seathold:{self.flight.id}:{self.seat.id}"
+
+    def test_only_one_owner_at_a_time(self):
+        self.assertTrue(SeatHoldRegistry.acquire(self.flight.id, self.seat.id, "t1:D0"))
+        self.assertTrue(SeatHoldRegistry.acquire(self.flight.id, self.seat.id, "t1:D0"))  # propia: renueva
+        self.assertFalse(SeatHoldRegistry.acquire(self.flight.id, self.seat.id, "t1:D1"))
+        self.assertFalse(SeatHoldRegistry.release(self.flight.id, self.seat.id, "t2:D0"))
+        self.assertEqual(cache.get(self.key)["owner"], "t1:D0")
+
+        self.assertTrue(SeatHoldRegistry.release(self.flight.id, self.seat.id, "t1:D0"))
+        self.assertTrue(SeatHoldRegistry.acquire(self.flight.id, self.seat.id, "t2:D0"))
+
+    def test_expired_owner_cannot_touch_the_next_hold(self):
+        SeatHoldRegistry.acquire(self.flight.id, self.seat.id, "t1:D0")
+        cache.delete(self.key)  # venció el TTL
+        SeatHoldRegistry.acquire(self.flight.id, self.seat.id, "t2:D0")
+
+        self.assertFalse(SeatHoldRegistry.renew(self.flight.id, self.seat.id, "t1:D0"))
+        self.assertFalse(SeatHoldRegistry.release(self.flight.id, self.seat.id, "t1:D0"))
+        self.assertEqual(cache.get(self.key)["owner"], "t2:D0")
+
+    def test_busy_seat_lock_fails_closed(self):
+        cache.set(f"seathold-lock:{self.flight.id}:{self.seat.id}", "other", timeout=5)
+        self.assertFalse(SeatHoldRegistry.acquire(self.flight.id, self.seat.id, "t1:D0"))
+        self.assertIsNone(cache.get(self.key))
+
+    def test_holds_are_scoped_per_passenger(self):
+        SeatHoldRegistry.acquire(self.flight.id, self.seat.id, SeatHoldRegistry.owner("t1", "D0"))
+        selections = [("D0", self.flight.id, self.seat.id), ("D1", self.flight.id, self.seat.id)]
+        self.assertEqual(SeatHoldRegistry.not_held_by("t1", selections), [(self.flight.id, self.seat.id)])
+
+        SeatHoldRegistry.release_many("t1", selections)
+        self.assertIsNone(cache.get(self.key))
+
+    def test_web_reservation_rejects_seats_held_from_the_api(self):
+        passenger = Passenger.objects.create(name="Ana", document="30111222", email="ana@example.com")
+        post_data = {"seat_0_0": str(self.seat.id)}
+        SeatHoldRegistry.acquire(self.flight.id, self.seat.id, "t1:D0")
+        with self.assertRaisesMessage(ValidationError, "retenido"):
+            ReservationService.create_reservations_with_seats([passenger.id], [self.flight.id], post_data, "reserved")
+        self.assertFalse(FlightSegment.objects.exists())
+
+        SeatHoldRegistry.release(self.flight.id, self.seat.id, "t1:D0")
+        ReservationService.create_reservations_with_seats([passenger.id], [self.flight.id], post_data, "reserved")
+        self.assertEqual(FlightSegment.objects.get().seat_id, self.seat.id)
+
+
+class ExpirySweeperTest(NetworkTestCase):
+    def setUp(self):
+        super().setUp()
+        self.flight = self._flight("AEP", "COR", 8)
+        self.seats = list(self.airplane.seats.order_by("row", "column"))
+        self.passenger = Passenger.objects.create(name="Ana", document="30111222", email="ana@example.com")
+        self.expired_at = timezone.now() - timedelta(minutes=settings.RESERVATION_HOLD_MINUTES + 1)
+
+    def _segment(self, seat, reserved_at, status="reserved", itinerary=None):
+        itinerary = itinerary or Itinerary.objects.create(passenger=self.passenger,
+                                                          reservation_code=f"EXP{seat.id}")
+        return FlightSegment.objects.create(itinerary=itinerary, flight=self.flight, seat=seat,
+                                            price=Decimal("100.00"), status=status, reserved_at=reserved_at)
+
+    def test_sweep_deletes_expired_reservations_in_batches(self):
+        for seat in self.seats[:3]:
+            self._segment(seat, self.expired_at)
+        live = self._segment(self.seats[3], timezone.now())
+        # Itinerario con un tramo vencido y otro vigente: se queda con el vigente
+        self._segment(self.seats[4], self.expired_at, itinerary=live.itinerary)
+        confirmed = self._segment(self.seats[5], self.expired_at, status="confirmed")
+
+        self.assertEqual(ExpirySweeper.stats()["pending"], 4)
+        stats = ExpirySweeper.sweep(batch_size=2)
+
+        self.assertEqual((stats["segments"], stats["itineraries"], stats["batches"]), (4, 3, 2))
+        self.assertEqual(set(FlightSegment.objects.values_list("id", flat=True)), {live.id, confirmed.id})
+        self.assertTrue(Itinerary.objects.filter(pk=live.itinerary_id).exists())
+        inventory = FlightInventory.objects.get(flight=self.flight)
+        self.assertEqual((inventory.held, inventory.confirmed), (1, 1))
+        self.assertEqual(FlightInventoryService.rebuild([self.flight.id]), [])
+
+        self.assertEqual(ExpirySweeper.stats()["pending"], 0)
+        self.assertEqual(ExpirySweeper.stats()["total_segments"], 4)
+
+    def test_max_batches_leaves_the_rest_for_the_next_pass(self):
+        for seat in self.seats[:3]:
+            self._segment(seat, self.expired_at)
+
+        self.assertEqual(ExpirySweeper.sweep(batch_size=2, max_batches=1)["segments"], 2)
+        self.assertEqual(ExpirySweeper.stats()["pending"], 1)
+        self.assertEqual(ExpirySweeper.sweep(batch_size=2)["segments"], 1)
+
+    def test_seat_reads_do_not_delete_expired_reservations(self):
+        expired = self._segment(self.seats[0], self.expired_at)
+
+        occupancy, held, lapsed = SeatReadService.get_occupancy_by_flight([self.flight])
+
+        self.assertTrue(FlightSegment.objects.filter(pk=expired.pk).exists())
+        self.assertEqual(lapsed[self.flight.id], {self.seats[0].id})
+        self.assertEqual(held[self.flight.id], {})
+
+    def test_lapsed_reservations_count_as_available(self):
+        self._segment(self.seats[0], self.expired_at)
+        self._segment(self.seats[1], timezone.now())
+
+        self.assertEqual(FlightInventoryService.available_by_flight([self.flight.id]), {self.flight.id: 5})
+        self.assertTrue(SeatService.is_seat_available(self.seats[0].id, self.flight))
+        self.assertFalse(SeatService.is_seat_available(self.seats[1].id, self.flight))
+
+    def test_booking_a_lapsed_seat_reclaims_it(self):
+        expired = self._segment(self.seats[0], self.expired_at)
+        other = Passenger.objects.create(name="Beto", document="30999888", email="beto@example.com")
+        itinerary = Itinerary.objects.create(passenger=other, reservation_code="EXPNEW")
+
+        segment = FlightSegmentService.create(itinerary, self.flight, self.seats[0], 100, "confirmed")
+
+        self.assertFalse(FlightSegment.objects.filter(pk=expired.pk).exists())
+        self.assertFalse(Itinerary.objects.filter(pk=expired.itinerary_id).exists())
+        self.assertEqual(FlightSegment.objects.get(flight=self.flight, seat=self.seats[0]).pk, segment.pk)
+        self.assertEqual(FlightInventoryService.rebuild([self.flight.id]), [])
+
+    def test_group_and_automatic_bookings_reclaim_lapsed_seats(self):
+        for seat in self.seats:
+            self._segment(seat, self.expired_at)
+
+        ReservationService.confirm_group_reservations(
+            [{"name": "Beto", "document": "30999888", "email": "beto@example.com"}],
+            [self.flight], {("30999888", self.flight.id): self.seats[0].id})
+        passengers = [Passenger.objects.create(name=f"P{i}", document=f"D{i}", email=f"p{i}@example.com")
+                      for i in range(5)]
+        ReservationService.create_automatic_reservations([p.id for p in passengers], [self.flight.id])
+
+        self.assertFalse(FlightSegment.objects.lapsed().exists())
+        self.assertEqual(FlightSegment.objects.filter(flight=self.flight).count(), 6)
+        self.assertEqual(FlightInventoryService.rebuild([self.flight.id]), [])
+
+    def test_command_sweeps_and_reports(self):
+        self._segment(self.seats[0], self.expired_at)
+        out = StringIO()
+        call_command("sweep_expired_reservations", stdout=out)
+        self.assertIn("1 segmento(s), 1 itinerario(s)", out.getvalue())
+
+        out = StringIO()
+        call_command("sweep_expired_reservations", "--stats", stdout=out)
+        self.assertIn("pending: 0", out.getvalue())
+        self.assertIn("total_segments: 1", out.getvalue())
+
+
+class SeatUniquenessTest(NetworkTestCase):
+    def setUp(self):
+        super().setUp()
+        self.flight = self._flight("AEP", "COR", 8)
+        self.seats = list(self.airplane.seats.order_by("row", "column"))
+
+    def _itinerary(self, document):
+        passenger = Passenger.objects.create(name=document, document=document, email=f"{document}@example.com")
+        return Itinerary.objects.create(passenger=passenger, reservation_code=f"U{document}")
+
+    def test_second_segment_on_a_seat_is_a_conflict(self):
+        FlightSegmentService.create(self._itinerary("A1"), self.flight, self.seats[0], 100, "confirmed")
+
+        with self.assertRaises(SeatConflictError) as ctx:
+            FlightSegmentService.create(self._itinerary("B2"), self.flight, self.seats[0], 100, "confirmed")
+        self.assertEqual((ctx.exception.flight_id, ctx.exception.seat_id), (self.flight.id, self.seats[0].id))
+
+        # El conflicto no rompe la transacción de afuera ni toca los contadores
+        inventory = FlightInventory.objects.get(flight=self.flight)
+        self.assertEqual((inventory.held, inventory.confirmed), (0, 1))
+        self.assertEqual(FlightSegment.objects.count(), 1)
+
+    def test_moving_a_segment_onto_a_taken_seat_is_a_conflict(self):
+        FlightSegmentService.create(self._itinerary("A1"), self.flight, self.seats[0], 100, "confirmed")
+        other = FlightSegmentService.create(self._itinerary("B2"), self.flight, self.seats[1], 100, "reserved")
+
+        with self.assertRaises(SeatConflictError):
+            FlightSegmentService.update(other.id, {"seat": self.seats[0]})
+        self.assertEqual(FlightSegment.objects.get(pk=other.pk).seat_id, self.seats[1].id)
+
+    def test_segments_without_seat_do_not_conflict(self):
+        FlightSegmentService.create(self._itinerary("A1"), self.flight, None, 100, "reserved")
+        FlightSegmentService.create(self._itinerary("B2"), self.flight, None, 100, "reserved")
+        self.assertEqual(FlightSegment.objects.filter(flight=self.flight, seat__isnull=True).count(), 2)
+
+
+class DuplicateSeatMigrationTest(TransactionTestCase):
+    before = [("reservations", "0006_flightsegment_status_reserved_idx")]
+    after = [("reservations", "0007_flightsegment_unique_flight_seat")]
+
+    def _migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        with redirect_stdout(StringIO()) as out:
+            executor.migrate(targets)
+        return executor, out.getvalue()
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        self._migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicates_keep_the_oldest_confirmed_seat(self):
+        executor, _ = self._migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        Airport = apps.get_model("flight", "Airport")
+        Route = apps.get_model("flight", "Route")
+        Flight = apps.get_model("flight", "Flight")
+        Airplane = apps.get_model("airplane", "Airplane")
+        Seat = apps.get_model("airplane", "Seat")
+        Passenger = apps.get_model("reservations", "Passenger")
+        Itinerary = apps.get_model("reservations", "Itinerary")
+        FlightSegment = apps.get_model("reservations", "FlightSegment")
+        FlightInventory = apps.get_model("reservations", "FlightInventory")
+
+        origin = Airport.objects.create(name="Aeroparque", code="AEP", city="Buenos Aires", country="AR")
+        destination = Airport.objects.create(name="Córdoba", code="COR", city="Córdoba", country="AR")
+        route = Route.objects.create(origin_airport=origin, destination_airport=destination, estimated_duration=75)
+        airplane = Airplane.objects.create(model="E190", rows=1, columns=2)
+        seat = Seat.objects.create(airplane=airplane, number="1A", row=1, column="A")
+        now = timezone.now()
+        flight = Flight.objects.create(airplane=airplane, route=route, departure_time=now, arrival_time=now,
+                                       base_price=100, status="active")
+        FlightInventory.objects.create(flight=flight, capacity=2, held=1, confirmed=2)
+        segments = []
+        for i, status in enumerate(["reserved", "confirmed", "confirmed"]):
+            passenger = Passenger.objects.create(name=f"P{i}", document=f"D{i}", email=f"p{i}@example.com")
+            itinerary = Itinerary.objects.create(passenger=passenger, reservation_code=f"DUP{i}")
+            segments.append(FlightSegment.objects.create(itinerary=itinerary, flight=flight, seat=seat,
+                                                         price=100, status=status))
+
+        _, report = self._migrate(self.after)
+
+        self.assertEqual(list(FlightSegment.objects.filter(seat__isnull=False).values_list("id", flat=True)),
+                         [segments[1].id])
+        self.assertEqual(FlightSegment.objects.count(), 3)  # las reservas se conservan, sin asiento
+        inventory = FlightInventory.objects.get(flight=flight)
+        self.assertEqual((inventory.held, inventory.confirmed), (0, 1))
+        self.assertIn(f"se conserva el segmento {segments[1].id}", report)
+
+
+class GroupConfirmTest(NetworkTestCase):
+    def setUp(self):
+        super().setUp()
+        self.wide = Airplane.objects.create(model="A320", rows=4, columns=3)
+        Seat.objects.bulk_create([
+            Seat(airplane=self.wide, number=f"{row}{col}", row=row, column=col)
+            for row in range(1, 5) for col in "ABC"
+        ])
+        self.flights = [self._flight("NQN", "AEP", 6, airplane=self.wide),
+                        self._flight("AEP", "BRC", 10, airplane=self.wide)]
+        self.seats = list(self.wide.seats.order_by("row", "column"))
+
+    def _group(self, size, first=0):
+        passengers = [{"name": f"P{i}", "document": f"D{i}", "email": f"p{i}@example.com"}
+                      for i in range(first, first + size)]
+        seat_ids = {(p["document"], flight.id): self.seats[i].id
+                    for i, p in enumerate(passengers, start=first) for flight in self.flights}
+        return passengers, seat_ids
+
+    def _confirm_queries(self, size, first=0):
+        passengers, seat_ids = self._group(size, first)
+        with CaptureQueriesContext(connection) as ctx:
+            ReservationService.confirm_group_reservations(passengers, self.flights, seat_ids)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_the_group(self):
+        self.assertEqual(self._confirm_queries(2), self._confirm_queries(6, first=2))
+        self.assertEqual(FlightSegment.objects.count(), 16)
+        for flight in self.flights:
+            self.assertEqual(FlightInventory.objects.get(flight=flight).confirmed, 8)
+
+    def test_existing_passengers_are_reused(self):
+        Passenger.objects.create(name="Old", document="D1", email="old@example.com")
+        passengers, seat_ids = self._group(2)
+
+        confirmed = ReservationService.confirm_group_reservations(passengers, self.flights, seat_ids)
+
+        self.assertEqual(Passenger.objects.count(), 2)
+        itinerary, segments, ticket = confirmed[1]
+        self.assertEqual(itinerary.passenger.name, "Old")
+        self.assertEqual([seg.seat_id for seg in segments], [self.seats[1].id] * 2)
+        self.assertEqual(Itinerary.objects.get(pk=itinerary.pk).total_price, Decimal("200.00"))
+
+    def test_invalid_groups_are_rejected_before_writing(self):
+        passengers, seat_ids = self._group(1)
+        ReservationService.confirm_group_reservations(passengers, self.flights[:1], seat_ids)
+
+        passengers, seat_ids = self._group(2)
+        with self.assertRaisesMessage(ValidationError, "already has a reservation"):
+            ReservationService.confirm_group_reservations(passengers, self.flights, seat_ids)
+        passengers, seat_ids = self._group(1, first=1)
+        with self.assertRaisesMessage(ValidationError, "duplicado"):
+            ReservationService.confirm_group_reservations(passengers * 2, self.flights, seat_ids)
+
+        self.assertEqual(FlightSegment.objects.count(), 1)
+        self.assertFalse(Passenger.objects.filter(document="D1").exists())
+
+
+class ItineraryTotalsTest(NetworkTestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = self._flight("AEP", "COR", 8)
+        self.second = self._flight("COR", "BRC", 11)
+        self.seats = list(self.airplane.seats.order_by("row", "column"))
+        passenger = Passenger.objects.create(name="Ana", document="30111222", email="ana@example.com")
+        self.itinerary = Itinerary.objects.create(passenger=passenger, reservation_code="TOT001")
+        self.other = Itinerary.objects.create(passenger=passenger, reservation_code="TOT002")
+
+    def _segment(self, flight, seat, price, itinerary=None):
+        return FlightSegment.objects.create(itinerary=itinerary or self.itinerary, flight=flight, seat=seat,
+                                            price=Decimal(price), status="reserved")
+
+    def _totals(self):
+        return tuple(Itinerary.objects.get(pk=it.pk).total_price for it in (self.itinerary, self.other))
+
+    def test_totals_follow_segment_changes(self):
+        outbound = self._segment(self.first, self.seats[0], "120.50")
+        connection_leg = self._segment(self.second, self.seats[0], "80.00")
+        self.assertEqual(self._totals(), (Decimal("200.50"), Decimal("0")))
+
+        outbound.price = Decimal("100.00")
+        outbound.save()
+        self.assertEqual(self._totals(), (Decimal("180.00"), Decimal("0")))
+
+        connection_leg.itinerary = self.other
+        connection_leg.save()
+        self.assertEqual(self._totals(), (Decimal("100.00"), Decimal("80.00")))
+
+        outbound.delete()
+        self.assertEqual(self._totals(), (Decimal("0"), Decimal("80.00")))
+
+    def test_bulk_deletes_recompute_once(self):
+        self._segment(self.first, self.seats[0], "120.00")
+        self._segment(self.second, self.seats[0], "80.00")
+        self._segment(self.first, self.seats[1], "50.00", itinerary=self.other)
+
+        FlightInventoryService.delete_segments(FlightSegment.objects.filter(flight=self.first))
+
+        self.assertEqual(self._totals(), (Decimal("80.00"), Decimal("0")))
+
+    def test_rebuild_fixes_drift(self):
+        self._segment(self.first, self.seats[0], "120.00")
+        Itinerary.objects.filter(pk=self.itinerary.pk).update(total_price=Decimal("1.00"))
+
+        mismatches = ItineraryTotalsService.rebuild()
+
+        self.assertEqual(mismatches, [{"itinerary_id": self.itinerary.id,
+                                       "expected": Decimal("120.00"), "stored": Decimal("1.00")}])
+        self.assertEqual(self._totals(), (Decimal("120.00"), Decimal("0")))
+        self.assertEqual(ItineraryTotalsService.rebuild(), [])
+
+    def test_command_check_reports_without_fixing(self):
+        self._segment(self.first, self.seats[0], "120.00")
+        Itinerary.objects.filter(pk=self.itinerary.pk).update(total_price=Decimal("1.00"))
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_itinerary_totals", "--check", stdout=StringIO())
+        self.assertEqual(self._totals()[0], Decimal("1.00"))
+
+        out = StringIO()
+        call_command("rebuild_itinerary_totals", "--itinerary", str(self.itinerary.id), stdout=out)
+        self.assertIn(f"Itinerario {self.itinerary.id}: guardado=1.00", out.getvalue())
+        self.assertEqual(self._totals()[0], Decimal("120.00"))
@@ -1,6 +1,7 @@
 from django.urls import path
 from reservations.views import (
     SearchAndCreateItineraryView,
+    ReachableDestinationsView,
     ChooseItineraryView,
     SelectItineraryView,
     CreateTicketView,
@@ -20,6 +21,13 @@ urlpatterns = [
         name='create_itinerary'
     ),
 
+    #  Destinos alcanzables desde un origen (JSON para el formulario de búsqueda)
+    path(
+        route='itinerary/destinations/',
+        view=ReachableDestinationsView.as_view(),
+        name='reachable_destinations'
+    ),
+
     #  Mostrar opciones de itinerario (basado en la cadena de rutas)
     path(
         route='itinerary/choose/',
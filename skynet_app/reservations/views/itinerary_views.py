@@ -1,12 +1,12 @@
 from django.views.generic import FormView, TemplateView, View
-from django.shortcuts import redirect
+from django.shortcuts import redirect, get_object_or_404
+from django.http import JsonResponse
 from django.contrib import messages
 from reservations.forms import SearchRouteForm
 from reservations.services.reservations import RouteService
-from collections import namedtuple
 
 # Modelos
-from flight.models import Flight, Route
+from flight.models import Airport
 
 #busca rutas posibles y guardar los datos en sesión
 class SearchAndCreateItineraryView(FormView):
@@ -20,21 +20,25 @@ class SearchAndCreateItineraryView(FormView):
         passenger_count = form.cleaned_data['passengers']
 
         try:
-            # Buscar posibles rutas usando el servicio find_available_routes
-            route_chains, errores = RouteService.find_available_routes(
+            # Buscar itinerarios: cada cadena de rutas con los vuelos que validó la búsqueda
+            itineraries, errores = RouteService.find_available_itineraries(
                 origin.code,
                 destination.code,
                 fecha,
-                passenger_count
+                passenger_count,
+                max_legs=form.cleaned_data.get('max_legs'),
+                k=form.cleaned_data.get('k'),
             )
 
-            if not route_chains:
+            if not itineraries:
                 for e in errores:
                     messages.warning(self.request, e)  # Mostramos todos los errores
                 return self.form_invalid(form)
 
             # Guardar en sesión
-            self.request.session["route_chain_ids_list"] = route_chains
+            self.request.session["route_chain_ids_list"] = [it["route_ids"] for it in itineraries]
+            # Los vuelos concretos (fecha, conexión y asientos ya chequeados) se usan en el resto del flujo
+            self.request.session["flight_chain_ids_list"] = [it["flight_ids"] for it in itineraries]
             self.request.session["search_date"] = str(fecha)
             self.request.session["passenger_count"] = passenger_count
 
@@ -49,6 +53,15 @@ class SearchAndCreateItineraryView(FormView):
         messages.error(self.request, "Por favor corregí los errores del formulario.")
         return super().form_invalid(form)
     
+# Destinos alcanzables desde un origen (lo usa el formulario de búsqueda para filtrar el select)
+class ReachableDestinationsView(View):
+    def get(self, request):
+        origin_id = request.GET.get("origin", "")
+        origin = get_object_or_404(Airport, pk=origin_id if origin_id.isdigit() else 0)
+        destinations = RouteService.reachable_destinations(origin.code)
+        return JsonResponse({"origin": origin.code, "destinations": destinations})
+
+
 # Muestra las opciones de itinerario posibles
 class ChooseItineraryView(TemplateView):
     template_name = "choose_itinerary.html"
@@ -56,28 +69,9 @@ class ChooseItineraryView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         route_chains_ids = self.request.session.get("route_chain_ids_list", []) #Este valor es una lista de listas con IDs de rutas posibles, por ejemplo:[[12], [4, 7], [5, 9, 11]]
-        options = []
-        route_full = []
-
-        for idx, chain_ids in enumerate(route_chains_ids, 1): 
-            #route_chains_ids = [["A", "B", "C"], ["D", "E"]]  resultado 1: ['A', 'B', 'C'] - 2: ['D', 'E']
-
-            duration = 0
-            total_price = 0
-            routes = Route.objects.filter(id__in=chain_ids).select_related("origin_airport", "destination_airport")
-            #Busca los objetos Route reales para los IDs de la cadena.
-            if not routes:
-                continue
-            flight = Flight.objects.filter(route__in=chain_ids)
-            #Busca los vuelos asociados a esas rutas (cada vuelo tiene duración y precio).        
-            route_full.append(routes)  # Guardamos todas las rutas reales
-
-            summary = " → ".join([r.origin_airport.code for r in routes] + [routes.last().destination_airport.code])
-            
-            duration = sum(r.route.estimated_duration for r in flight)
-            total_price = sum(a.base_price for a in flight)
-            options.append(ItineraryOption(idx, summary, duration, total_price))
-         
+        flight_chains_ids = self.request.session.get("flight_chain_ids_list", []) # y los vuelos elegidos para cada una
+        # Duración y precio salen de los vuelos que eligió la búsqueda, no de todos los vuelos de las rutas
+        options, route_full = RouteService.get_itinerary_options(route_chains_ids, flight_chains_ids)
 
         context["itineraries"] = options
         context["route_options"] = route_chains_ids
@@ -96,12 +90,7 @@ class SelectItineraryView(View):
         
     def post(self, request):
         option_idx = int(request.POST.get("option_idx", 0))
-        select_route = self.request.session["route_chain_ids_list"]
-        
-        request.session["route_chain"] = select_route[option_idx]
-        return redirect("load_passengers")  # Paso siguiente: cargar pasajeros
+        select_flights = self.request.session["flight_chain_ids_list"]
 
-
-
-ItineraryOption = namedtuple("ItineraryOption", ["id", "route_summary", "duration", "total_price"])
-#Para no crear un classe nueva, y esto guardaria ej: opcion = ItineraryOption(id=1, route_summary="EZE → COR → MDZ", duration=180, total_price=15000.0)
\ No newline at end of file
+        request.session["flight_chain"] = select_flights[option_idx]
+        return redirect("load_passengers")  # Paso siguiente: cargar pasajeros
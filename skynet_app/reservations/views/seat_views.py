@@ -11,12 +11,12 @@ class ChooseSeatView(View):
 
     def get(self, request):
         passenger_ids = request.session.get("passenger_ids", [])
-        route_ids = request.session.get("route_chain", [])
+        flight_ids = request.session.get("flight_chain", [])
 
         try:
             seat_data = SeatService.get_available_seats_for_passengers(
                 passenger_ids, 
-                route_ids
+                flight_ids
             )
             return render(request, self.template_name, {"seat_data": seat_data})
             
@@ -26,12 +26,12 @@ class ChooseSeatView(View):
 
     def post(self, request):
         passenger_ids = request.session.get("passenger_ids", [])
-        route_ids = request.session.get("route_chain", [])
+        flight_ids = request.session.get("flight_chain", [])
 
         try:
             itineraries = ReservationService.create_reservations_with_seats(
                 passenger_ids, 
-                route_ids, 
+                flight_ids,
                 request.POST,
                 status="reserved"  
             )
@@ -49,16 +49,18 @@ class ChooseSeatView(View):
 # Vista que genera itinerarios automáticamente sin selección manual de asientos
 class GenerateItineraryView(View):
     def get(self, request):
-        route_ids = request.session.get("route_chain", [])
+        flight_ids = request.session.get("flight_chain", [])
         passenger_ids = request.session.get("passenger_ids", [])
 
         try:
-            last_itinerary = ReservationService.create_automatic_reservations(
+            itineraries = ReservationService.create_automatic_reservations(
                 passenger_ids, 
-                route_ids
+                flight_ids
             )
             
-            return redirect("view_summary", itinerary_id=last_itinerary.id)
+            # Mismo resumen grupal que la selección manual
+            request.session["created_itineraries"] = [i.id for i in itineraries]
+            return redirect("group_summary")
             
         except Exception as e:
             messages.error(request, f"Error generando itinerario: {str(e)}")
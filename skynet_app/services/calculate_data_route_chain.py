@@ -1,69 +1,84 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from decimal import Decimal
 
+def _to_decimal(price) -> Decimal:
+    if price is None:
+        return Decimal(0)
+    if not isinstance(price, Decimal):
+        return Decimal(str(price))
+    return price
+
+
+def _load_flights_by_route(route_ids, flight_manager, search_date) -> Dict[int, Any]:
+    """Un vuelo por ruta (el primero activo que sale en la fecha), en una sola query."""
+    flights_qs = flight_manager.filter(route_id__in=route_ids, status="active")
+    if search_date is not None:
+        flights_qs = flights_qs.filter(departure_time__date=search_date)
+
+    flights_by_route = {}
+    for f in flights_qs.order_by("departure_time", "id"):
+        flights_by_route.setdefault(f.route_id, f)
+    return flights_by_route
+
+
 def calc_route_chain(
     route_chains_ids: List[List[int]],
     route_manager,   # Route.objects
-    flight_manager   # Flight.objects
+    flight_manager,  # Flight.objects
+    search_date=None,
+    flight_chains_ids: Optional[List[List[int]]] = None,
 ) -> Dict[str, Any]:
-    
+    """
+    Arma resumen, duración y precio de cada cadena con dos queries en total:
+      1) todas las rutas de todas las cadenas (por id)
+      2) los vuelos: los de flight_chains_ids (mismo orden que las rutas) si vienen,
+         si no, el primer vuelo activo de cada ruta en search_date.
+    """
+    all_route_ids = {rid for chain in route_chains_ids for rid in chain}
+
+    # 1) Rutas, indexadas por id (el orden lo da cada cadena)
+    route_map = (
+        route_manager
+        .select_related("origin_airport", "destination_airport")
+        .in_bulk(all_route_ids)
+    ) if all_route_ids else {}
+
+    # 2) Vuelos, indexados por id o por ruta
+    if flight_chains_ids is not None:
+        all_flight_ids = {fid for chain in flight_chains_ids for fid in chain}
+        flight_map = flight_manager.in_bulk(all_flight_ids) if all_flight_ids else {}
+        flights_by_route = {}
+    else:
+        flight_map = {}
+        flights_by_route = _load_flights_by_route(all_route_ids, flight_manager, search_date) if all_route_ids else {}
+
     itineraries: List[Dict[str, Any]] = []
 
     for idx, chain_ids in enumerate(route_chains_ids, start=1):
         if not chain_ids:
             continue
 
-        # 1) Traer rutas (no preserva orden)
-        routes_qs = (
-            route_manager
-            .filter(id__in=chain_ids)
-            .select_related("origin_airport", "destination_airport")
-        )
-        # Guardia: si no hay rutas, saltar
-        if not routes_qs.exists():
-            continue
+        ordered_routes = [route_map[rid] for rid in chain_ids if rid in route_map]
 
-        # 2) Reordenar según chain_ids (forma “tradicional”)
-        route_map = {}
-        for r in routes_qs:
-            route_map[r.id] = r
-
-        ordered_routes = []
-        for rid in chain_ids:
-            if rid in route_map:
-                ordered_routes.append(route_map[rid])
-
-        # Guardia: si no se pudo reconstruir el orden, saltar
-        if not ordered_routes:
+        # Guardia: si no se pudo reconstruir la cadena completa, saltar
+        if len(ordered_routes) != len(chain_ids):
             continue
 
-        # 3) Resumen (códigos IATA)
+        if flight_chains_ids is not None:
+            chain_flights = [flight_map.get(fid) for fid in flight_chains_ids[idx - 1]]
+        else:
+            chain_flights = [flights_by_route.get(rid) for rid in chain_ids]
+
+        # Resumen (códigos IATA)
         codes = [r.origin_airport.code for r in ordered_routes]
         codes.append(ordered_routes[-1].destination_airport.code)
         route_summary = " → ".join(codes)
 
-        # 4) Vuelos asociados y sumas
-        flights_qs = (
-            flight_manager
-            .filter(route_id__in=chain_ids)
-            .select_related("route")
-        )
-
-        duration = 0
-        total_price = Decimal(0)  
-
-        for f in flights_qs:
-            # Ajustá estos campos a tus modelos reales si difieren
-            duration += getattr(getattr(f, "route", None), "estimated_duration", 0) or 0
-
-            price = getattr(f, "base_price", None)
-            if price is None:
-                price = Decimal(0)
-            elif not isinstance(price, Decimal):
-                price = Decimal(str(price))
-            total_price += price
+        # Duración por ruta y precio del vuelo efectivamente elegido para cada tramo
+        duration = sum(r.estimated_duration or 0 for r in ordered_routes)
+        total_price = sum((_to_decimal(getattr(f, "base_price", None)) for f in chain_flights if f), Decimal(0))
 
-        itineraries.append({
+        itinerary = {
             "id": idx,
             "route_summary": route_summary,
             "duration": int(duration or 0),
@@ -71,7 +86,10 @@ def calc_route_chain(
             "total_price": str(total_price),  # <-- seguro para JSON (evitás binarios)
 
             "route_ids": chain_ids,
-        })
+        }
+        if all(chain_flights):
+            itinerary["flight_ids"] = [f.id for f in chain_flights]
+        itineraries.append(itinerary)
 
     origin = itineraries[0]["route_summary"].split(" → ")[0] if itineraries else None
     destination = itineraries[0]["route_summary"].split(" → ")[-1] if itineraries else None